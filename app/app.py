@@ -14,10 +14,25 @@ import plotly.io as pio
 from datetime import datetime
 
 from dash import Dash, html, dcc, callback, Output, Input, Patch
+from flask import Response
 
 import dash_bootstrap_components as dbc
 from dash_bootstrap_templates import load_figure_template
 
+import metrics
+import callback_timing
+import callback_recorder
+from datasets import load_all, start_scheduler
+from listener import start_listener
+from migrate import run_migrations, check_migrations
+from status_history import start_capture
+from settings import (
+    DATASET_LISTEN_FOR_CHANGES,
+    APPLY_MIGRATIONS_ON_STARTUP,
+    DATASET_WARMUP,
+    CALLBACK_RECORD_PATH,
+)
+
 # adds  templates to plotly.io
 load_figure_template(["darkly", "sandstone"])
 
@@ -104,5 +119,36 @@ def update_figure_template(switch_on):
     patched_figure["layout"]["template"] = template
     return patched_figure
 
+# Server-Timing headers on page callback responses
+callback_timing.install(app.server)
+
+# opt in record of callback requests for benchmarks/replay_callbacks.py
+if CALLBACK_RECORD_PATH:
+    callback_recorder.install(app.server, CALLBACK_RECORD_PATH)
+
+@app.server.route("/metrics")
+def metrics_endpoint():
+    """
+    Query, callback and connection pool metrics in the Prometheus text format
+    """
+    return Response(metrics.render(), mimetype=metrics.CONTENT_TYPE)
+
+# the datasets read tables and the change listener relies on triggers
+# created by the migrations, stop here rather than fail every load
+if APPLY_MIGRATIONS_ON_STARTUP:
+    run_migrations()
+check_migrations()
+
+# pages registered their datasets on import, they load on first use apart
+# from the warm up list
+load_all(DATASET_WARMUP)
+start_scheduler()
+
+# daily status snapshots for the burn down page
+start_capture()
+
+if DATASET_LISTEN_FOR_CHANGES:
+    start_listener()
+
 if __name__ == "__main__":
     app.run(debug=False, port=80, host="0.0.0.0")
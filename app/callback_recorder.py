@@ -0,0 +1,46 @@
+# -*- coding: utf-8 -*-
+
+# Records the page callback requests a running instance receives, so real
+# multi-user filter traffic can be replayed against a server without a
+# browser (see benchmarks/replay_callbacks.py). Each line of the record
+# file is one request:
+#
+#   {"at": 1718000000.123, "path": "/_dash-update-component", "body": {...}}
+import json
+import time
+import threading
+
+import logging
+log = logging.getLogger(__name__)
+
+import flask
+
+CALLBACK_PATH = "/_dash-update-component"
+
+_lock = threading.Lock()
+
+
+def _recorder(path):
+    def _before_request():
+        request = flask.request
+        if request.method != "POST" or not request.path.endswith(CALLBACK_PATH):
+            return
+
+        body = request.get_json(silent=True)
+        if body is None:
+            return
+
+        line = json.dumps({"at": time.time(), "path": request.path, "body": body})
+        with _lock:
+            with open(path, "a") as file:
+                file.write(line + "\n")
+
+    return _before_request
+
+
+def install(server, path):
+    """
+    Append the callback requests server receives to path
+    """
+    log.info(f"recording callback requests to {path}")
+    server.before_request(_recorder(path))
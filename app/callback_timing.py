@@ -0,0 +1,120 @@
+# -*- coding: utf-8 -*-
+
+# Phase timings for the Dash page callbacks. A callback wrapped with
+# @timed_callback marks the end of each phase with lap("filter"),
+# lap("serialise"), lap("figure"); the timings go to the /metrics
+# histograms and, for the request that ran the callback, into a
+# Server-Timing response header along with the response size.
+import time
+import functools
+import threading
+
+import flask
+
+import metrics
+
+SIZE_BUCKETS = (1e3, 1e4, 5e4, 1e5, 2.5e5, 5e5, 1e6, 2.5e6, 5e6, 1e7, 2.5e7, 5e7)
+
+CALLBACK_SECONDS = metrics.histogram(
+    "swing_stats_callback_seconds",
+    "Wall time of page callbacks",
+    ["callback"],
+)
+PHASE_SECONDS = metrics.histogram(
+    "swing_stats_callback_phase_seconds",
+    "Wall time of page callback phases: filter, serialise, figure, and response (Dash handling around the callback)",
+    ["callback", "phase"],
+)
+RESPONSE_BYTES = metrics.histogram(
+    "swing_stats_callback_response_bytes",
+    "Size of page callback responses",
+    ["callback"],
+    buckets=SIZE_BUCKETS,
+)
+
+# the callback running on this thread: [name, {phase: seconds}, last lap]
+_local = threading.local()
+
+
+def timed_callback(func):
+    """
+    Time a page callback; put it below @callback so Dash registers the
+    wrapped function
+    """
+    name = f"{func.__module__.rsplit('.', 1)[-1]}.{func.__name__}"
+
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        started = time.perf_counter()
+        previous = getattr(_local, "current", None)
+        _local.current = [name, {}, started]
+        try:
+            return func(*args, **kwargs)
+        finally:
+            _, phases, _ = _local.current
+            _local.current = previous
+
+            elapsed = time.perf_counter() - started
+            CALLBACK_SECONDS.observe(elapsed, callback=name)
+            for phase, seconds in phases.items():
+                PHASE_SECONDS.observe(seconds, callback=name, phase=phase)
+
+            if flask.has_request_context():
+                flask.g.callback_timing = (name, elapsed, phases)
+
+    return wrapper
+
+
+def lap(phase):
+    """
+    Record the time since the callback started, or since the last lap, as
+    phase. Does nothing outside a timed callback.
+    """
+    current = getattr(_local, "current", None)
+    if current is None:
+        return
+
+    now = time.perf_counter()
+    phases = current[1]
+    phases[phase] = phases.get(phase, 0.0) + now - current[2]
+    current[2] = now
+
+
+def _before_request():
+    flask.g.request_started = time.perf_counter()
+
+
+def _after_request(response):
+    timing = flask.g.pop("callback_timing", None)
+    if timing is None:
+        return response
+
+    name, elapsed, phases = timing
+    size = response.calculate_content_length()
+    if size is None and not response.is_streamed:
+        size = len(response.get_data())
+    if size is not None:
+        RESPONSE_BYTES.observe(size, callback=name)
+
+    entries = [f"{phase};dur={seconds * 1000:.1f}" for phase, seconds in phases.items()]
+    entries.append(f"callback;dur={elapsed * 1000:.1f}")
+
+    started = flask.g.pop("request_started", None)
+    if started is not None:
+        # Dash decoding the request and encoding the callback result
+        response_seconds = max(time.perf_counter() - started - elapsed, 0.0)
+        PHASE_SECONDS.observe(response_seconds, callback=name, phase="response")
+        entries.append(f"response;dur={response_seconds * 1000:.1f}")
+    if size is not None:
+        entries.append(f'size;desc="{size} bytes"')
+
+    response.headers.add("Server-Timing", ", ".join(entries))
+    return response
+
+
+def install(server):
+    """
+    Add the Server-Timing header to callback responses from server
+    """
+    server.before_request(_before_request)
+    server.after_request(_after_request)
@@ -1,25 +1,86 @@
 # -*- coding: utf-8 -*-
 
 # Utility function to connect to Treehouse / Kitsu Database
+import io
 import sys
+import json
+import time
+import uuid
+import random
 import psycopg2
+import threading
 import traceback
 
+import pandas as pd
+
+from contextlib import contextmanager
+
 import logging
 log = logging.getLogger(__name__)
 
-from settings import PROD_DATABASE
+import metrics
+import queries
+import query_cache
+from settings import (
+    PROD_DATABASE,
+    DATABASE_POOL,
+    DATABASE_REPLICA_CHECK_INTERVAL,
+    DATABASE_REPLICA_MAX_LAG,
+    STREAMING_CHUNK_SIZE,
+    SQL_LOADER,
+)
+
+CONNECT_KEYS = ("host", "port", "database", "user", "password")
+
+# seconds a replica has been replaying behind its primary; 0 on a primary
+# and on a replica with nothing left to replay
+REPLICA_LAG_SQL = """
+select case
+    when not pg_is_in_recovery() then 0
+    when pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() then 0
+    else coalesce(extract(epoch from now() - pg_last_xact_replay_timestamp()), 0)
+end
+"""
+
+
+class PoolTimeout(Exception):
+    """
+    Raised when no pooled connection became available in time
+    """
+
+
+def get_connect_kwargs():
+    """
+    Connection arguments for the primary reporting host
+    """
+    return dict(
+        host = PROD_DATABASE['reporting']['host'],
+        port = PROD_DATABASE['reporting']['port'],
+        database = PROD_DATABASE['reporting']['database'],
+        user = PROD_DATABASE['reporting']['user'],
+        password = PROD_DATABASE['reporting']['password']
+    )
+
+
+def get_targets():
+    """
+    (name, connect kwargs, weight) of the primary, then each replica
+    """
+    config = PROD_DATABASE['reporting']
+    primary = get_connect_kwargs()
+    targets = [(config.get('name', f"{primary['host']}:{primary['port']}"), primary, config.get('weight', 1))]
+
+    for replica in config.get('replicas') or []:
+        kwargs = {**primary, **{key: replica[key] for key in CONNECT_KEYS if key in replica}}
+        name = replica.get('name', f"{kwargs['host']}:{kwargs['port']}")
+        targets.append((name, kwargs, replica.get('weight', 1)))
+    return targets
+
 
 def connect():
     connection = None
     try:
-        connection = psycopg2.connect(
-            host = PROD_DATABASE['reporting']['host'],
-            port = PROD_DATABASE['reporting']['port'],
-            database = PROD_DATABASE['reporting']['database'],
-            user = PROD_DATABASE['reporting']['user'],
-            password = PROD_DATABASE['reporting']['password']
-        )
+        connection = psycopg2.connect(**get_connect_kwargs())
         return connection, connection.cursor()
 
     except Exception:
@@ -36,6 +97,827 @@ def close(connection):
         log.error("Connection is already closed")
     return None
 
+
+class ConnectionPool:
+    """
+    Thread safe pool of connections to the reporting database.
+
+    Connections are health checked on checkout, rolled back on return and
+    closed by a background reaper once they have been idle for longer than
+    idle_timeout (the pool never shrinks below min_size).
+    """
+
+    def __init__(
+        self,
+        min_size=1,
+        max_size=8,
+        idle_timeout=300,
+        checkout_timeout=30,
+        health_check_after=30,
+        connect_kwargs=None,
+    ):
+        if min_size < 0 or max_size < 1 or min_size > max_size:
+            raise ValueError(f"invalid pool size: min={min_size} max={max_size}")
+
+        self.min_size = min_size
+        self.max_size = max_size
+        self.idle_timeout = idle_timeout
+        self.checkout_timeout = checkout_timeout
+        self.health_check_after = health_check_after
+        self.connect_kwargs = connect_kwargs or get_connect_kwargs()
+
+        self._lock = threading.Condition()
+        self._idle = []  # [(connection, last_used)] most recently used last
+        self._in_use = set()
+        self._opening = 0
+        self._closed = False
+
+        self._stats = {
+            "checkouts": 0,
+            "waits": 0,
+            "timeouts": 0,
+            "created": 0,
+            "discarded": 0,
+            "reaped": 0,
+            "checkout_seconds_total": 0.0,
+            "checkout_seconds_max": 0.0,
+        }
+
+        for _ in range(min_size):
+            self._idle.append((self._open(), time.monotonic()))
+            self._stats["created"] += 1
+
+        self._stop = threading.Event()
+        self._reaper = threading.Thread(
+            target=self._reap_loop, name="db-pool-reaper", daemon=True
+        )
+        self._reaper.start()
+
+    def _open(self):
+        return psycopg2.connect(**self.connect_kwargs)
+
+    def _discard(self, connection):
+        self._stats["discarded"] += 1
+        try:
+            connection.close()
+        except Exception:
+            log.debug("error closing discarded connection", exc_info=True)
+
+    def _is_healthy(self, connection, last_used):
+        if connection.closed:
+            return False
+
+        if time.monotonic() - last_used < self.health_check_after:
+            return True
+
+        try:
+            with connection.cursor() as cursor:
+                cursor.execute("select 1")
+            connection.rollback()
+            return True
+        except Exception:
+            log.warning("Discarding unhealthy pooled connection")
+            return False
+
+    def getconn(self, timeout=None):
+        """
+        Check a connection out of the pool, waiting up to timeout seconds
+        """
+        timeout = self.checkout_timeout if timeout is None else timeout
+        started = time.monotonic()
+        deadline = started + timeout
+        waited = False
+
+        with self._lock:
+            while True:
+                if self._closed:
+                    raise PoolTimeout("connection pool is closed")
+
+                if self._idle:
+                    connection, last_used = self._idle.pop()
+                    self._in_use.add(connection)
+                    break
+
+                if len(self._in_use) + self._opening < self.max_size:
+                    # reserve the slot so other threads see it while we connect
+                    connection, last_used = None, None
+                    self._opening += 1
+                    break
+
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    self._stats["timeouts"] += 1
+                    raise PoolTimeout(
+                        f"no database connection available after {timeout}s"
+                    )
+
+                if not waited:
+                    waited = True
+                    self._stats["waits"] += 1
+                self._lock.wait(remaining)
+
+        if connection is not None and not self._is_healthy(connection, last_used):
+            with self._lock:
+                self._in_use.discard(connection)
+                self._discard(connection)
+                self._opening += 1
+            connection = None
+
+        if connection is None:
+            try:
+                connection = self._open()
+            finally:
+                with self._lock:
+                    self._opening -= 1
+                    if connection is not None:
+                        self._in_use.add(connection)
+                        self._stats["created"] += 1
+                    self._lock.notify()
+
+        elapsed = time.monotonic() - started
+        with self._lock:
+            self._stats["checkouts"] += 1
+            self._stats["checkout_seconds_total"] += elapsed
+            self._stats["checkout_seconds_max"] = max(
+                self._stats["checkout_seconds_max"], elapsed
+            )
+        return connection
+
+    def putconn(self, connection, discard=False):
+        """
+        Return a connection to the pool
+        """
+        if not discard and not connection.closed:
+            try:
+                connection.rollback()
+            except Exception:
+                discard = True
+
+        with self._lock:
+            self._in_use.discard(connection)
+            if discard or connection.closed or self._closed:
+                self._discard(connection)
+            else:
+                self._idle.append((connection, time.monotonic()))
+            self._lock.notify()
+
+    @contextmanager
+    def connection(self, timeout=None):
+        """
+        Context manager returning a pooled connection
+
+            with pool.connection() as connection:
+                df = pd.read_sql_query(sql, con=connection)
+        """
+        connection = self.getconn(timeout)
+        discard = False
+        try:
+            yield connection
+        except psycopg2.OperationalError:
+            discard = True
+            raise
+        finally:
+            self.putconn(connection, discard=discard)
+
+    def reap(self):
+        """
+        Close connections idle for longer than idle_timeout
+        """
+        now = time.monotonic()
+        with self._lock:
+            keep = []
+            expired = []
+            size = len(self._idle) + len(self._in_use) + self._opening
+            # oldest first, so the most recently used connections survive
+            for connection, last_used in self._idle:
+                if now - last_used > self.idle_timeout and size > self.min_size:
+                    expired.append(connection)
+                    size -= 1
+                else:
+                    keep.append((connection, last_used))
+            self._idle = keep
+            self._stats["reaped"] += len(expired)
+
+        for connection in expired:
+            try:
+                connection.close()
+            except Exception:
+                log.debug("error closing idle connection", exc_info=True)
+
+        if expired:
+            log.debug(f"Reaped {len(expired)} idle connection(s)")
+
+    def _reap_loop(self):
+        interval = max(1, min(60, self.idle_timeout / 2))
+        while not self._stop.wait(interval):
+            self.reap()
+
+    def stats(self):
+        """
+        Snapshot of pool usage counters
+        """
+        with self._lock:
+            stats = dict(self._stats)
+            stats["in_use"] = len(self._in_use) + self._opening
+            stats["idle"] = len(self._idle)
+            stats["size"] = stats["in_use"] + stats["idle"]
+            stats["max_size"] = self.max_size
+            stats["checkout_seconds_avg"] = (
+                stats["checkout_seconds_total"] / stats["checkouts"]
+                if stats["checkouts"]
+                else 0.0
+            )
+        return stats
+
+    def close(self):
+        """
+        Close every idle connection and refuse further checkouts
+        """
+        self._stop.set()
+        with self._lock:
+            self._closed = True
+            idle, self._idle = self._idle, []
+            self._lock.notify_all()
+
+        for connection, _ in idle:
+            connection.close()
+        log.info("Connection pool closed")
+
+
+class Target:
+    """
+    One reporting host, its pool and its last known health
+    """
+
+    def __init__(self, name, pool, weight, is_primary=False):
+        self.name = name
+        self.pool = pool
+        self.weight = weight
+        self.is_primary = is_primary
+
+        self.healthy = True
+        self.lag = 0.0
+        self.error = None
+
+    def mark_down(self, error):
+        if self.healthy:
+            log.warning(f"Database host down, failing over: {self.name}: {error}")
+        self.healthy = False
+        self.error = error
+
+
+class ReplicaRouter:
+    """
+    Connection pools for the primary reporting host and its replicas.
+
+    Reads are spread across the healthy hosts by weight; a host that
+    refuses a connection is marked down and the next one tried, and a
+    replica replaying more than max_lag seconds behind is skipped until it
+    catches up. A background thread re-checks every host each
+    check_interval. With no replicas configured everything goes to the
+    primary, as with a single pool.
+    """
+
+    def __init__(self, targets, pool_options=None, max_lag=30, check_interval=10):
+        pool_options = pool_options or {}
+        self.max_lag = max_lag
+        self.check_interval = check_interval
+        self.targets = []
+        for index, (name, connect_kwargs, weight) in enumerate(targets):
+            # replicas open their connections lazily, so a host that is down
+            # at startup does not stop the app
+            options = dict(pool_options, connect_kwargs=connect_kwargs)
+            if index:
+                options["min_size"] = 0
+            self.targets.append(Target(name, ConnectionPool(**options), weight, is_primary=index == 0))
+        self.primary = self.targets[0]
+
+        # target of each checked out connection
+        self._owners = {}
+        self._lock = threading.Lock()
+
+        self._stop = threading.Event()
+        self._checker = None
+        if len(self.targets) > 1:
+            self._checker = threading.Thread(target=self._check_loop, name="db-replica-check", daemon=True)
+            self._checker.start()
+
+    @property
+    def min_size(self):
+        return sum(target.pool.min_size for target in self.targets)
+
+    @property
+    def max_size(self):
+        return sum(target.pool.max_size for target in self.targets)
+
+    def readable(self):
+        """
+        Hosts reads can go to now
+        """
+        return [
+            target for target in self.targets
+            if target.healthy and target.weight > 0 and target.lag <= self.max_lag
+        ]
+
+    def _choose(self, exclude):
+        candidates = [target for target in self.readable() if target not in exclude]
+        if candidates:
+            return random.choices(candidates, weights=[target.weight for target in candidates])[0]
+
+        # nothing healthy left to read from: the primary, down or not
+        if self.primary not in exclude:
+            return self.primary
+        return None
+
+    def getconn(self, timeout=None, primary=False, target=None):
+        """
+        Check a connection out of the primary, the named target, or the
+        read host chosen by weight, failing over to the others
+        """
+        if primary:
+            choices = [self.primary]
+        elif target is not None:
+            choices = [target]
+        else:
+            choices = None
+
+        tried = []
+        while True:
+            chosen = choices.pop(0) if choices is not None else self._choose(tried)
+            if chosen is None:
+                raise tried[-1].error
+            tried.append(chosen)
+
+            try:
+                connection = chosen.pool.getconn(timeout)
+            except psycopg2.OperationalError as error:
+                chosen.mark_down(error)
+                if choices is not None and not choices:
+                    raise
+                continue
+
+            with self._lock:
+                self._owners[id(connection)] = chosen
+            return connection
+
+    def target_of(self, connection):
+        with self._lock:
+            return self._owners.get(id(connection))
+
+    def putconn(self, connection, discard=False):
+        with self._lock:
+            target = self._owners.pop(id(connection), self.primary)
+        target.pool.putconn(connection, discard=discard)
+
+    @contextmanager
+    def connection(self, timeout=None, primary=False, target=None):
+        """
+        Context manager returning a pooled connection, see getconn
+        """
+        connection = self.getconn(timeout, primary, target)
+        discard = False
+        try:
+            yield connection
+        except psycopg2.OperationalError:
+            discard = True
+            raise
+        finally:
+            self.putconn(connection, discard=discard)
+
+    def check(self):
+        """
+        Refresh the health and replication lag of every host
+        """
+        for target in self.targets:
+            try:
+                with target.pool.connection(timeout=self.check_interval) as connection:
+                    with connection.cursor() as cursor:
+                        cursor.execute(REPLICA_LAG_SQL)
+                        lag = float(cursor.fetchone()[0] or 0)
+            except Exception as error:
+                target.mark_down(error)
+                continue
+
+            if not target.healthy:
+                log.info(f"Database host back up: {target.name}")
+            if lag > self.max_lag >= target.lag:
+                log.warning(f"Database replica lagging {lag:.0f}s, skipping it: {target.name}")
+            target.healthy = True
+            target.error = None
+            target.lag = lag
+
+    def _check_loop(self):
+        while not self._stop.wait(self.check_interval):
+            try:
+                self.check()
+            except Exception:
+                log.error("Error checking database hosts")
+                traceback.print_exc()
+
+    def stats(self):
+        """
+        Usage counters summed over the host pools
+        """
+        stats = {}
+        for target in self.targets:
+            for key, value in target.pool.stats().items():
+                if key == "checkout_seconds_max":
+                    stats[key] = max(stats.get(key, 0.0), value)
+                else:
+                    stats[key] = stats.get(key, 0) + value
+        stats["checkout_seconds_avg"] = (
+            stats["checkout_seconds_total"] / stats["checkouts"] if stats["checkouts"] else 0.0
+        )
+        return stats
+
+    def close(self):
+        self._stop.set()
+        for target in self.targets:
+            target.pool.close()
+
+
+_pool = None
+_pool_lock = threading.Lock()
+
+# snapshot imported by every pooled connection borrowed on this thread, the
+# page its queries are labelled with and the wait for the last checkout
+_local = threading.local()
+
+# host each exported snapshot lives on, it cannot be imported elsewhere
+_snapshot_targets = {}
+
+QUERY_SECONDS = metrics.histogram(
+    "swing_stats_query_seconds",
+    "Wall time of queries run through read_sql",
+    ["page", "query", "loader"],
+)
+QUERY_ROWS = metrics.counter(
+    "swing_stats_query_rows_total",
+    "Rows returned by queries run through read_sql",
+    ["page", "query"],
+)
+QUERY_LAST_ROWS = metrics.gauge(
+    "swing_stats_query_last_rows",
+    "Rows returned by the latest run of each query",
+    ["page", "query"],
+)
+QUERY_BYTES = metrics.counter(
+    "swing_stats_query_bytes_total",
+    "Bytes received for queries: the COPY text for the copy loader, the frame size otherwise",
+    ["page", "query"],
+)
+CONNECTION_WAIT = metrics.histogram(
+    "swing_stats_connection_wait_seconds",
+    "Time waiting for a pooled connection before running a query",
+    ["page", "query"],
+)
+POOL_CONNECTIONS = metrics.gauge(
+    "swing_stats_pool_connections",
+    "Connections in the shared pool by state",
+    ["state"],
+)
+POOL_EVENTS = metrics.gauge(
+    "swing_stats_pool_events",
+    "Cumulative connection pool checkouts, waits, timeouts, created, discarded and reaped",
+    ["event"],
+)
+HOST_HEALTHY = metrics.gauge(
+    "swing_stats_database_host_healthy",
+    "1 while a reporting host is taking connections, 0 once it failed over",
+    ["host", "role"],
+)
+HOST_LAG = metrics.gauge(
+    "swing_stats_database_host_lag_seconds",
+    "Replication lag of each reporting host at the last check",
+    ["host", "role"],
+)
+
+
+def _collect_pool_metrics():
+    if _pool is None:
+        return
+
+    stats = _pool.stats()
+    for state in ("in_use", "idle", "max_size"):
+        POOL_CONNECTIONS.set(stats[state], state=state)
+    for event in ("checkouts", "waits", "timeouts", "created", "discarded", "reaped"):
+        POOL_EVENTS.set(stats[event], event=event)
+    for target in _pool.targets:
+        role = "primary" if target.is_primary else "replica"
+        HOST_HEALTHY.set(int(target.healthy), host=target.name, role=role)
+        HOST_LAG.set(target.lag, host=target.name, role=role)
+
+
+metrics.register_collector(_collect_pool_metrics)
+
+
+def get_pool():
+    """
+    Shared pools for the reporting hosts, created on first use
+    """
+    global _pool
+
+    with _pool_lock:
+        if _pool is None:
+            _pool = ReplicaRouter(
+                get_targets(),
+                DATABASE_POOL,
+                max_lag=DATABASE_REPLICA_MAX_LAG,
+                check_interval=DATABASE_REPLICA_CHECK_INTERVAL,
+            )
+            log.info(
+                f"Connection pool created: hosts={len(_pool.targets)} "
+                f"min={_pool.min_size} max={_pool.max_size}"
+            )
+        return _pool
+
+
+@contextmanager
+def pooled_connection(timeout=None, primary=False):
+    """
+    Borrow a connection from the shared pool for the duration of a with block.
+
+    Reads go to any healthy reporting host; pass primary=True for anything
+    that writes. Inside use_snapshot() the connection comes from the host
+    that exported the snapshot and its transaction imports it, so it sees
+    exactly the same data as the exporting transaction.
+    """
+    started = time.monotonic()
+    snapshot_id = getattr(_local, "snapshot", None)
+    target = _snapshot_targets.get(snapshot_id) if snapshot_id else None
+
+    with get_pool().connection(timeout, primary=primary, target=target) as connection:
+        # reported against the first query run on the connection
+        _local.connection_wait = time.monotonic() - started
+
+        if snapshot_id:
+            with connection.cursor() as cursor:
+                cursor.execute("SET TRANSACTION ISOLATION LEVEL REPEATABLE READ, READ ONLY")
+                cursor.execute("SET TRANSACTION SNAPSHOT %s", (snapshot_id,))
+        yield connection
+
+
+@contextmanager
+def exported_snapshot():
+    """
+    Open a REPEATABLE READ transaction and export its snapshot.
+
+    Yields the snapshot id; it stays importable by other connections until
+    the with block exits and the exporting transaction is rolled back.
+    """
+    with pooled_connection() as connection:
+        with connection.cursor() as cursor:
+            cursor.execute("SET TRANSACTION ISOLATION LEVEL REPEATABLE READ, READ ONLY")
+            cursor.execute("select pg_export_snapshot()")
+            snapshot_id = cursor.fetchone()[0]
+
+        log.debug(f"exported snapshot: {snapshot_id}")
+        _snapshot_targets[snapshot_id] = get_pool().target_of(connection)
+        try:
+            yield snapshot_id
+        finally:
+            _snapshot_targets.pop(snapshot_id, None)
+
+
+@contextmanager
+def query_labels(page):
+    """
+    Label the queries run on this thread with page in the query metrics
+    """
+    previous = getattr(_local, "page", None)
+    _local.page = page
+    try:
+        yield
+    finally:
+        _local.page = previous
+
+
+@contextmanager
+def use_snapshot(snapshot_id):
+    """
+    Make pooled connections borrowed on this thread import snapshot_id
+    """
+    previous = getattr(_local, "snapshot", None)
+    _local.snapshot = snapshot_id
+    try:
+        yield
+    finally:
+        _local.snapshot = previous
+
+
+def read_sql_streaming(sql, connection, params=None, chunk_size=None):
+    """
+    Load a query into a DataFrame through a named (server side) cursor.
+
+    Rows are fetched chunk_size at a time and each chunk is converted to typed
+    column arrays straight away, so the raw row tuples for the full result set
+    are never held in memory next to the finished frame.
+    """
+    chunk_size = chunk_size or STREAMING_CHUNK_SIZE
+    columns = None
+    chunks = []
+
+    cursor = connection.cursor(name=f"stream_{uuid.uuid4().hex}")
+    cursor.itersize = chunk_size
+    try:
+        cursor.execute(sql, params)
+        while True:
+            rows = cursor.fetchmany(chunk_size)
+
+            if columns is None:
+                columns = [column[0] for column in cursor.description]
+                chunks = [[] for _ in columns]
+
+            if not rows:
+                break
+
+            # same conversions read_sql_query applies (Decimal -> float etc)
+            frame = pd.DataFrame.from_records(rows, columns=columns, coerce_float=True)
+            del rows
+
+            for index in range(len(columns)):
+                chunks[index].append(frame.iloc[:, index])
+            del frame
+    finally:
+        cursor.close()
+
+    data = {}
+    for index, column in enumerate(columns):
+        parts, chunks[index] = chunks[index], None
+        if not parts:
+            data[column] = pd.Series([], dtype=object)
+            continue
+
+        series = pd.concat(parts, ignore_index=True)
+        del parts
+        if series.dtype == object:
+            # a chunk of all nulls comes through as object, fix up the dtype
+            series = series.infer_objects()
+        data[column] = series
+
+    return pd.DataFrame(data, columns=columns)
+
+
+# postgres type oids the COPY loader has to convert back from text
+BOOL_OIDS = {16}
+NUMERIC_OIDS = {20, 21, 23, 26, 700, 701, 1700}
+DATE_OIDS = {1082}
+TIMESTAMP_OIDS = {1114}
+TIMESTAMPTZ_OIDS = {1184}
+JSON_OIDS = {114, 3802}
+
+COPY_NULL = "\\N"
+
+
+def _query_columns(sql, connection, params=None):
+    with connection.cursor() as cursor:
+        cursor.execute(f"select * from ({sql}) as copy_query limit 0", params)
+        return [(column[0], column[1]) for column in cursor.description]
+
+
+def read_sql_copy(sql, connection, params=None):
+    """
+    Load a query into a DataFrame with COPY (...) TO STDOUT.
+
+    Postgres streams the result as CSV which pandas parses straight into
+    column arrays, skipping the per row tuples the DBAPI path builds. Column
+    types are read from the query description so the frame comes back with
+    the same dtypes read_sql_query would give.
+    """
+    sql = sql.strip().rstrip(";")
+    columns = _query_columns(sql, connection, params)
+
+    copy_sql = f"COPY ({sql}) TO STDOUT WITH (FORMAT csv, HEADER false, NULL '{COPY_NULL}')"
+
+    with connection.cursor() as cursor:
+        if params:
+            # COPY does not take bind parameters, inline them client side
+            copy_sql = cursor.mogrify(copy_sql, params).decode(
+                psycopg2.extensions.encodings[connection.encoding]
+            )
+        buffer = io.StringIO()
+        cursor.copy_expert(copy_sql, buffer)
+
+    # size of the COPY text, picked up by the read_sql metrics
+    _local.copy_bytes = buffer.tell()
+    buffer.seek(0)
+    names = [name for name, _ in columns]
+    text_columns = [
+        index
+        for index, (_, oid) in enumerate(columns)
+        if oid not in NUMERIC_OIDS
+    ]
+    df = pd.read_csv(
+        buffer,
+        header=None,
+        names=list(range(len(names))),
+        dtype={index: object for index in text_columns},
+        na_values=[COPY_NULL],
+        keep_default_na=False,
+    )
+    del buffer
+
+    for index, (name, oid) in enumerate(columns):
+        series = df[index]
+        if oid in BOOL_OIDS:
+            df[index] = series.map({"t": True, "f": False}).where(series.notna(), None)
+        elif oid in TIMESTAMP_OIDS:
+            df[index] = pd.to_datetime(series, format="ISO8601")
+        elif oid in TIMESTAMPTZ_OIDS:
+            df[index] = pd.to_datetime(series, format="ISO8601", utc=True)
+        elif oid in DATE_OIDS:
+            parsed = pd.to_datetime(series, format="%Y-%m-%d")
+            df[index] = pd.Series(parsed.dt.date, dtype=object).where(parsed.notna(), None)
+        elif oid in JSON_OIDS:
+            df[index] = series.map(json.loads, na_action="ignore").where(series.notna(), None)
+        elif oid not in NUMERIC_OIDS:
+            df[index] = series.where(series.notna(), None)
+
+    df.columns = names
+    return df
+
+
+def read_watermark(connection):
+    """
+    The query cache watermark for reads on connection, or None with the
+    cache off. Read it once and pass it to read_sql when loading several
+    queries on one connection.
+    """
+    if not query_cache.is_enabled():
+        return None
+    return query_cache.get_watermark(connection, getattr(_local, "snapshot", None))
+
+
+def read_sql(sql, connection, params=None, loader=None, cache=True, name=None, watermark=None):
+    """
+    Load a query into a DataFrame with the configured loader
+
+        pandas  - pd.read_sql_query over the DBAPI cursor
+        stream  - read_sql_streaming, server side cursor in chunks
+        copy    - read_sql_copy, COPY ... TO STDOUT parsed as CSV
+
+    With cache=True the result is kept on disk keyed by the sql and the
+    database watermark, and reused while the watermark is unchanged. The
+    watermark is read on connection unless given (see read_watermark).
+
+    Every call is timed and counted in the query metrics, labelled with
+    the page from query_labels() and name, which defaults to the name of
+    the sql in queries.py.
+    """
+    loader = loader or SQL_LOADER
+
+    if loader not in ("copy", "stream", "pandas"):
+        raise ValueError(f"unknown sql loader: {loader}")
+
+    labels = {
+        "page": getattr(_local, "page", None) or "none",
+        "query": name or queries.name_of(sql),
+    }
+    wait = getattr(_local, "connection_wait", None)
+    if wait is not None:
+        _local.connection_wait = None
+        CONNECTION_WAIT.observe(wait, **labels)
+
+    started = time.monotonic()
+    _local.copy_bytes = None
+
+    df = None
+    if not cache or not query_cache.is_enabled():
+        watermark = None
+    elif watermark is None:
+        watermark = read_watermark(connection)
+    if watermark is not None:
+        df = query_cache.load(sql, watermark, params=params)
+
+    if df is not None:
+        loader = "cache"
+    else:
+        if loader == "copy":
+            df = read_sql_copy(sql, connection, params=params)
+        elif loader == "stream":
+            df = read_sql_streaming(sql, connection, params=params)
+        else:
+            df = pd.read_sql_query(sql, con=connection, params=params)
+
+        if watermark is not None:
+            query_cache.store(sql, watermark, df, params=params)
+
+    elapsed = time.monotonic() - started
+    size = _local.copy_bytes
+    if size is None:
+        size = int(df.memory_usage(deep=True, index=False).sum())
+
+    QUERY_SECONDS.observe(elapsed, loader=loader, **labels)
+    QUERY_ROWS.inc(len(df), **labels)
+    QUERY_LAST_ROWS.set(len(df), **labels)
+    QUERY_BYTES.inc(size, **labels)
+    log.debug(
+        f"query {labels['query']} page={labels['page']} loader={loader} "
+        f"rows={len(df)} bytes={size} in {elapsed:.3f}s"
+    )
+    return df
+
+
 def project_data(cursor):
     cursor.execute('select id, name, start_date, end_date from project')
     return cursor.fetchall()
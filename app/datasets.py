@@ -0,0 +1,654 @@
+# -*- coding: utf-8 -*-
+
+# Registry of the page datasets. Each loads on first use, or at startup
+# when listed for warm up.
+import time
+import datetime
+import threading
+import traceback
+
+from collections import namedtuple
+from contextlib import ExitStack
+from concurrent.futures import ThreadPoolExecutor
+
+import logging
+log = logging.getLogger(__name__)
+
+import pandas as pd
+
+import queries
+import dimensions
+from database import exported_snapshot, use_snapshot, pooled_connection, query_labels, read_sql
+from settings import (
+    DATASET_LOAD_WORKERS,
+    DATASET_CONSISTENT_SNAPSHOT,
+    DATASET_REFRESH_INTERVAL,
+    DATASET_REFRESH_INTERVALS,
+    DELTA_OVERLAP_SECONDS,
+)
+
+PENDING = "pending"
+LOADING = "loading"
+READY = "ready"
+FAILED = "failed"
+
+# The frame a dataset serves and the version it was swapped in as. Each
+# load or refresh publishes a new Snapshot in one reference assignment, so
+# a callback always sees a frame and version that belong together and a
+# refresh never changes a frame a callback is filtering. index is the
+# FilterIndex of a DataFrame frame.
+Snapshot = namedtuple("Snapshot", ["frame", "version", "loaded_at", "index"])
+
+
+class Delta:
+    """
+    How to refresh a dataset incrementally.
+
+    changed_keys_sql returns the key_columns (uuid ids) of every group touched
+    by task / comment / file changes since %(since)s. Those groups are
+    re-aggregated by running sql for just those keys, passed through
+    transform (the page calcs), and swapped in for the old rows.
+    """
+
+    def __init__(self, sql, key_columns, changed_keys_sql, transform=None, sort_columns=None):
+        self.sql = sql
+        self.key_columns = key_columns
+        self.changed_keys_sql = changed_keys_sql
+        self.transform = transform
+        self.sort_columns = sort_columns
+
+    def restricted_sql(self):
+        """
+        The dataset sql limited to the key tuples in the %(key_N)s arrays
+        """
+        sql = self.sql.strip().rstrip(";")
+        keys = ", ".join(f"delta.{column}" for column in self.key_columns)
+        arrays = ", ".join(f"%(key_{index})s::uuid[]" for index in range(len(self.key_columns)))
+        return f"select delta.* from ({sql}) as delta where ({keys}) in (select * from unnest({arrays}))"
+
+
+def get_delta_watermark():
+    """
+    Latest change time in the Kitsu tables the deltas track
+    """
+    with pooled_connection() as connection:
+        with connection.cursor() as cursor:
+            cursor.execute(queries.DELTA_WATERMARK)
+            return cursor.fetchone()[0]
+
+
+class Dataset:
+    """
+    A page dataset and its load state.
+
+    builder is a callable returning the finished DataFrame for the page
+    (query plus any calcs); it runs on a loader thread and must borrow its
+    own connection from the pool. With a Delta the dataset can also be
+    refreshed from just the rows changed since the last load.
+
+    tables are the Kitsu tables the dataset reads; change notifications for
+    them mark it stale. version goes up every time a new frame is swapped in.
+    The scheduler refreshes a loaded dataset every refresh_interval seconds,
+    0 leaves it to change notifications and manual refreshes.
+    """
+
+    def __init__(self, name, builder, delta=None, tables=None, refresh_interval=None):
+        self.name = name
+        self.builder = builder
+        self.delta = delta
+        self.tables = set(tables or [])
+        self.refresh_interval = DATASET_REFRESH_INTERVALS.get(
+            name, refresh_interval if refresh_interval is not None else DATASET_REFRESH_INTERVAL
+        )
+        self.watermark = None
+        self.stale = False
+
+        self.state = PENDING
+        self.error = None
+        self.load_seconds = None
+
+        # projections of this dataset, rebuilt whenever it changes
+        self.dependents = []
+
+        self._snapshot = None
+        self._ready = threading.Event()
+        # set whenever no load is running, whether the last one worked or not
+        self._loaded = threading.Event()
+        self._loaded.set()
+        self._lock = threading.Lock()
+        self._refresh_lock = threading.Lock()
+
+    @property
+    def is_ready(self):
+        return self._ready.is_set()
+
+    @property
+    def version(self):
+        return self._snapshot.version if self._snapshot else 0
+
+    @property
+    def loaded_at(self):
+        return self._snapshot.loaded_at if self._snapshot else None
+
+    def snapshot(self):
+        """
+        The current Snapshot, loading it on first use
+        """
+        self.frame()
+        return self._snapshot
+
+    def _publish(self, df):
+        """
+        Swap in df as the frame callbacks read, then rebuild the projections
+        already in use so that work stays off the request path
+        """
+        index = None
+        if isinstance(df, pd.DataFrame):
+            df = dimensions.categorize(df)
+            index = dimensions.FilterIndex(df)
+        self._snapshot = Snapshot(df, self.version + 1, time.time(), index)
+        self._ready.set()
+
+        for dependent in self.dependents:
+            if dependent._snapshot is not None:
+                dependent.load()
+
+    def publish(self, df):
+        """
+        Mark the dataset loaded with a frame built elsewhere, e.g. by a
+        benchmark standing in for the database
+        """
+        with self._lock:
+            self.stale = False
+            self.state = READY
+            self.error = None
+        self._publish(df)
+        self._loaded.set()
+
+    @property
+    def incremental(self):
+        """
+        Whether refresh() can merge changes rather than reload
+        """
+        return self.delta is not None
+
+    def load(self):
+        """
+        Run the builder, unless another thread is already loading
+        """
+        with self._lock:
+            if self.state == LOADING:
+                return
+            self.state = LOADING
+            self._loaded.clear()
+
+        self._load()
+
+    def ensure_loaded(self, retry=False):
+        """
+        Start loading in the background on first use.
+
+        Concurrent first requests start a single load and the rest wait on
+        it. A failed load is only started again with retry.
+        """
+        with self._lock:
+            if self.state not in (PENDING, FAILED) or (self.state == FAILED and not retry):
+                return
+            self.state = LOADING
+            self._loaded.clear()
+
+        threading.Thread(target=self._load, name=f"dataset-loader-{self.name}", daemon=True).start()
+
+    def _load(self):
+        try:
+            self._run_builder()
+        finally:
+            self._loaded.set()
+
+    def _run_builder(self):
+        log.debug(f"loading dataset: {self.name}")
+        started = time.monotonic()
+        try:
+            # read before the data so changes made during the load are picked
+            # up by the next refresh rather than lost
+            watermark = get_delta_watermark() if self.incremental else None
+            with query_labels(self.name):
+                df = self.builder()
+        except Exception as error:
+            log.error(f"Error loading dataset: {self.name}")
+            traceback.print_exc()
+            with self._lock:
+                self.state = FAILED
+                self.error = error
+            return
+
+        with self._lock:
+            self.watermark = watermark
+            self.stale = False
+            self.state = READY
+            self.error = None
+            self.load_seconds = time.monotonic() - started
+        log.info(f"loaded dataset: {self.name} rows={len(df)} in {self.load_seconds:.2f}s")
+        self._publish(df)
+
+    def refresh(self):
+        """
+        Merge rows changed since the last load or refresh into the frame.
+
+        Falls back to a full load when the dataset has no Delta or has never
+        loaded. Returns the number of groups re-aggregated.
+        """
+        if not self.incremental or not self.is_ready or self.watermark is None:
+            self.load()
+            return None
+
+        if not self._refresh_lock.acquire(blocking=False):
+            return 0
+
+        try:
+            watermark = get_delta_watermark()
+            # overlap so rows committed late with an older updated_at still count
+            since = self.watermark - datetime.timedelta(seconds=DELTA_OVERLAP_SECONDS)
+
+            with query_labels(self.name):
+                changed, df = self.apply_delta(since)
+            self.watermark = watermark
+            self.stale = False
+            if changed:
+                self._publish(df)
+            return changed
+        except Exception:
+            log.error(f"Error refreshing dataset: {self.name}")
+            traceback.print_exc()
+            return None
+        finally:
+            self._refresh_lock.release()
+
+    def apply_delta(self, since):
+        """
+        Build a new frame with the groups changed since since swapped in.
+        Returns how many groups were re-aggregated and the new frame.
+        """
+        delta = self.delta
+        with pooled_connection() as connection:
+            keys = read_sql(delta.changed_keys_sql, connection, params={"since": since}, cache=False)
+            if keys.empty:
+                return 0, None
+
+            keys = keys[delta.key_columns].drop_duplicates()
+            params = {
+                f"key_{index}": keys[column].astype(str).tolist()
+                for index, column in enumerate(delta.key_columns)
+            }
+            changed = read_sql(
+                delta.restricted_sql(),
+                connection,
+                params=params,
+                cache=False,
+                name=f"{queries.name_of(delta.sql)}_DELTA",
+            )
+
+        if delta.transform is not None:
+            changed = delta.transform(changed)
+
+        df = self._snapshot.frame
+        touched = pd.MultiIndex.from_frame(keys.astype(str))
+        current = pd.MultiIndex.from_frame(df[delta.key_columns].astype(str))
+        df = pd.concat([df[~current.isin(touched)], changed], ignore_index=True)
+        if delta.sort_columns:
+            df = df.sort_values(delta.sort_columns, ignore_index=True)
+
+        log.info(f"refreshed dataset: {self.name} groups={len(keys)} rows={len(changed)}")
+        return len(keys), df
+
+    def mark_stale(self):
+        """
+        Flag the frame as out of date with the database
+        """
+        if not self.stale:
+            log.debug(f"dataset stale: {self.name}")
+        self.stale = True
+
+    def frame(self, timeout=None):
+        """
+        The loaded DataFrame, loading it on first use and waiting up to
+        timeout seconds for it. Raises the load error when the load fails.
+        The frame is shared by every request, filter it into a new frame
+        rather than modifying it in place.
+        """
+        if not self._ready.is_set():
+            self.ensure_loaded(retry=True)
+            if not self._loaded.wait(timeout):
+                raise TimeoutError(f"dataset {self.name} is not loaded ({self.state})")
+            if not self._ready.is_set():
+                raise self.error or RuntimeError(f"dataset {self.name} failed to load")
+        return self._snapshot.frame
+
+    def select(self, timeout=None, **selections):
+        """
+        The loaded frame limited to the rows matching the combo selections,
+        e.g. select(project=["A"], department=None); empty selections are
+        ignored. Filters through the FilterIndex of the same snapshot.
+        """
+        self.frame(timeout)
+        snapshot = self._snapshot
+        return snapshot.index.select(snapshot.frame, **selections)
+
+
+class Projection(Dataset):
+    """
+    A page frame derived in process from another dataset instead of read
+    from the database.
+
+    builder takes the source frame and returns the page frame. The result
+    is cached and rebuilt when the source publishes a new version, or the
+    first time it is asked for after that, so a projection is ready
+    whenever its source is.
+
+    Only the first build makes a callback wait. After that a callback gets
+    the current frame straight away while a newer one is built on another
+    thread and swapped in.
+    """
+
+    def __init__(self, name, source, builder):
+        super().__init__(name, builder)
+        self.source = source
+        self._source_version = None
+        # one build at a time; held while the builder runs, unlike _lock
+        self._build_lock = threading.Lock()
+        source.dependents.append(self)
+
+    @property
+    def is_ready(self):
+        return self.source.is_ready
+
+    def _build(self, wait=True):
+        """
+        Project the current source frame unless it already has been. Without
+        wait, returns at once when another thread is building.
+        """
+        if not self._build_lock.acquire(blocking=wait):
+            return
+        try:
+            source = self.source.snapshot()
+            if self._source_version == source.version:
+                return
+
+            started = time.monotonic()
+            try:
+                df = self.builder(source.frame)
+            except Exception as error:
+                log.error(f"Error projecting dataset: {self.name}")
+                traceback.print_exc()
+                with self._lock:
+                    self.state = FAILED
+                    self.error = error
+                raise
+
+            with self._lock:
+                self.state = READY
+                self.error = None
+                self.load_seconds = time.monotonic() - started
+            log.info(f"projected dataset: {self.name} rows={len(df)} in {self.load_seconds:.2f}s")
+            self._publish(df)
+            self._source_version = source.version
+        finally:
+            self._build_lock.release()
+
+    def _build_in_background(self):
+        if self._build_lock.locked():
+            return
+
+        def _run():
+            try:
+                self._build(wait=False)
+            except Exception:
+                pass
+
+        threading.Thread(target=_run, name=f"dataset-projection-{self.name}", daemon=True).start()
+
+    def load(self):
+        """
+        Build the projection if the source is loaded, else mirror its state
+        """
+        if not self.source.is_ready:
+            self.state = self.source.state
+            self.error = self.source.error
+            return
+
+        try:
+            self._build()
+        except Exception:
+            pass
+
+    def ensure_loaded(self, retry=False):
+        self.source.ensure_loaded(retry)
+
+    def refresh(self):
+        """
+        Rebuild if the source has changed, the source refreshes itself
+        """
+        self.load()
+        return None
+
+    def frame(self, timeout=None):
+        self.source.frame(timeout)
+        if self._snapshot is None:
+            self._build()
+        elif self._source_version != self.source.version:
+            self._build_in_background()
+        return self._snapshot.frame
+
+
+_datasets = {}
+
+
+def add_dataset(dataset):
+    """
+    Register a Dataset instance; nothing is loaded until it is first used
+    or warmed up by load_all()
+    """
+    if dataset.name in _datasets:
+        log.warning(f"dataset registered twice, replacing: {dataset.name}")
+
+    _datasets[dataset.name] = dataset
+    return dataset
+
+
+def register_dataset(name, builder, delta=None, tables=None, refresh_interval=None):
+    """
+    Register a page dataset read from the database
+    """
+    return add_dataset(
+        Dataset(
+            name,
+            builder,
+            delta=delta,
+            tables=tables,
+            refresh_interval=refresh_interval,
+        )
+    )
+
+
+def register_projection(name, source, builder):
+    """
+    Register a page dataset projected from source, a Dataset or its name
+    """
+    if isinstance(source, str):
+        source = get_dataset(source)
+    return add_dataset(Projection(name, source, builder))
+
+
+def get_dataset(name):
+    return _datasets[name]
+
+
+def datasets_for_table(table):
+    """
+    Names of the datasets that read table
+    """
+    return [name for name, dataset in _datasets.items() if table in dataset.tables]
+
+
+def readiness():
+    """
+    Load state of every registered dataset, e.g. {"shot_data": "ready"}
+    """
+    return {name: dataset.state for name, dataset in _datasets.items()}
+
+
+def _load_in_snapshot(dataset, snapshot_id):
+    with use_snapshot(snapshot_id):
+        dataset.load()
+
+
+def _root(dataset):
+    """
+    The dataset a projection is ultimately built from
+    """
+    while isinstance(dataset, Projection):
+        dataset = dataset.source
+    return dataset
+
+
+def load_all(names=None, max_workers=None, wait=False, consistent=None):
+    """
+    Load every pending dataset, or just those in names, concurrently on a
+    thread pool. A projection named loads its source.
+
+    Each builder checks out its own pooled connection, so the queries run in
+    parallel on the database. With consistent=True every connection imports
+    one exported REPEATABLE READ snapshot, so all pages see the database at
+    the same instant. With wait=False this returns straight away and the
+    pages render a placeholder until their dataset is ready.
+    """
+    selected = _datasets.values() if names is None else [get_dataset(name) for name in names]
+    pending = [
+        dataset
+        for dataset in dict.fromkeys(_root(dataset) for dataset in selected)
+        if dataset.state in (PENDING, FAILED)
+    ]
+    projections = [
+        dataset
+        for dataset in _datasets.values()
+        if isinstance(dataset, Projection) and _root(dataset) in pending
+    ]
+    if not pending:
+        return
+
+    consistent = DATASET_CONSISTENT_SNAPSHOT if consistent is None else consistent
+
+    def _run():
+        started = time.monotonic()
+
+        # the exporting transaction stays open until every load has finished
+        with ExitStack() as stack, ThreadPoolExecutor(
+            max_workers=max_workers or DATASET_LOAD_WORKERS,
+            thread_name_prefix="dataset-loader",
+        ) as executor:
+            snapshot_id = None
+            if consistent:
+                try:
+                    snapshot_id = stack.enter_context(exported_snapshot())
+                except Exception:
+                    log.error("Error exporting snapshot, loading datasets independently")
+                    traceback.print_exc()
+
+            if snapshot_id:
+                futures = [
+                    executor.submit(_load_in_snapshot, dataset, snapshot_id)
+                    for dataset in pending
+                ]
+            else:
+                futures = [executor.submit(dataset.load) for dataset in pending]
+
+            for future in futures:
+                future.result()
+
+        # build projections now rather than on the first page request,
+        # in registration order so a projection's source is built first
+        for projection in projections:
+            projection.load()
+
+        log.info(f"loaded {len(pending)} datasets in {time.monotonic() - started:.2f}s")
+
+    if wait:
+        _run()
+    else:
+        threading.Thread(target=_run, name="dataset-loader-wait", daemon=True).start()
+
+
+def refresh_all():
+    """
+    Incrementally refresh every loaded dataset
+    """
+    for dataset in list(_datasets.values()):
+        if dataset.is_ready:
+            dataset.refresh()
+
+
+class RefreshScheduler:
+    """
+    Refreshes each loaded dataset on its own refresh_interval, on one
+    background thread.
+
+    New frames, calcs included, are built on this thread and published as
+    a new Snapshot, so requests never wait on a refresh. Projections are
+    rebuilt by their source as it publishes, datasets not yet used are
+    left alone.
+    """
+
+    def __init__(self, tick=1.0):
+        self.tick = tick
+        self.refreshes = 0
+
+        self._due = {}
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name="dataset-refresh", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+
+    def run_pending(self):
+        """
+        Refresh the datasets whose interval has passed
+        """
+        for dataset in list(_datasets.values()):
+            if isinstance(dataset, Projection) or not dataset.is_ready or not dataset.refresh_interval:
+                continue
+
+            now = time.monotonic()
+            due = self._due.setdefault(dataset.name, now + dataset.refresh_interval)
+            if now < due:
+                continue
+
+            dataset.refresh()
+            self.refreshes += 1
+            self._due[dataset.name] = time.monotonic() + dataset.refresh_interval
+
+    def _run(self):
+        while not self._stop.wait(self.tick):
+            try:
+                self.run_pending()
+            except Exception:
+                log.error("Error refreshing datasets")
+                traceback.print_exc()
+
+
+_scheduler = None
+
+
+def start_scheduler():
+    """
+    Start the shared refresh scheduler, once
+    """
+    global _scheduler
+
+    if _scheduler is None:
+        _scheduler = RefreshScheduler().start()
+    return _scheduler
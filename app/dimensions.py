@@ -0,0 +1,191 @@
+# -*- coding: utf-8 -*-
+
+# Dimension columns of the page frames (project, department, task type,
+# status, artist, episode) held as pandas Categoricals. The few hundred
+# names repeat on every row, so each frame stores small integer codes
+# against one dictionary per column that every page shares, and the
+# multi-select filters (isin and FilterIndex below) match codes instead of
+# comparing strings.
+import threading
+
+import logging
+log = logging.getLogger(__name__)
+
+import numpy as np
+import pandas as pd
+
+import metrics
+
+DIMENSION_COLUMNS = [
+    "project",
+    "department",
+    "task_type",
+    "task_status",
+    "artist",
+    "episode",
+]
+
+_dtypes = {}
+_lock = threading.Lock()
+
+
+def dimension_dtype(column, values):
+    """
+    The shared CategoricalDtype of column, grown to hold values.
+
+    Categories are kept sorted so sorting a frame on a dimension still
+    orders it by name. A new value replaces the dtype with a new one; frames
+    already normalised keep the one they were built with.
+    """
+    with _lock:
+        dtype = _dtypes.get(column)
+        known = dtype.categories if dtype is not None else pd.Index([], dtype=object)
+
+        new = pd.Index(values, dtype=object).dropna().unique().difference(known)
+        if dtype is None or len(new):
+            dtype = pd.CategoricalDtype(known.append(new).sort_values())
+            _dtypes[column] = dtype
+            log.debug(f"dimension categories: {column} values={len(dtype.categories)}")
+        return dtype
+
+
+def categorize(df):
+    """
+    df with its dimension columns as categoricals of the shared dtypes
+    """
+    converted = {}
+    for column in DIMENSION_COLUMNS:
+        if column not in df.columns:
+            continue
+
+        series = df[column]
+        if isinstance(series.dtype, pd.CategoricalDtype):
+            values = series.cat.categories
+        else:
+            values = series.unique()
+
+        dtype = dimension_dtype(column, values)
+        if series.dtype is not dtype:
+            converted[column] = series.astype(dtype)
+
+    if not converted:
+        return df
+    return df.assign(**converted)
+
+
+def isin(series, values):
+    """
+    series.isin(values) for a dimension column. On a categorical the
+    selected values are resolved to codes once and every row is a lookup
+    of its code; a missing value (None) in values selects the empty rows.
+    """
+    if not isinstance(series.dtype, pd.CategoricalDtype):
+        return series.isin(values)
+
+    categories = series.dtype.categories
+    present = [value for value in values if not pd.isna(value)]
+    codes = categories.get_indexer(pd.Index(present, dtype=object))
+
+    # code -1 (missing) is slot 0
+    lookup = np.zeros(len(categories) + 1, dtype=bool)
+    lookup[codes[codes >= 0] + 1] = True
+    lookup[0] = len(present) < len(values)
+    return pd.Series(lookup[series.cat.codes.to_numpy() + 1], index=series.index, name=series.name)
+
+
+class FilterIndex:
+    """
+    Packed row bitsets of every value of the dimension columns of one
+    frame, so a combo selection resolves without intermediate frames: the
+    bitsets of the values picked in a combo are OR'ed, the combos AND'ed,
+    and the matching rows taken once at the end.
+
+    Built with the frame when a dataset publishes it; the frame is never
+    modified, so the bitsets never go stale.
+    """
+
+    def __init__(self, df):
+        self.rows = len(df)
+        self._categories = {}
+        self._bitsets = {}
+        for column in DIMENSION_COLUMNS:
+            if column in df.columns and isinstance(df[column].dtype, pd.CategoricalDtype):
+                self._categories[column] = df[column].dtype.categories
+                self._bitsets[column] = self._build(df[column].cat.codes.to_numpy())
+
+    def _build(self, codes):
+        """
+        (codes present, one packed row bitset per code present)
+        """
+        # -1 (missing) shifted to 0, only the codes present get a bitset
+        codes = codes.astype(np.intp) + 1
+        counts = np.bincount(codes)
+        present = np.flatnonzero(counts)
+        slot_of = np.zeros(len(counts), dtype=np.intp)
+        slot_of[present] = np.arange(len(present))
+
+        # packbits order, the first row is the high bit of byte 0
+        rows = np.arange(self.rows)
+        bits = np.zeros((len(present), (self.rows + 7) // 8), dtype=np.uint8)
+        np.bitwise_or.at(bits, (slot_of[codes], rows >> 3), (128 >> (rows & 7)).astype(np.uint8))
+        return present - 1, bits
+
+    def _value_mask(self, df, column, values):
+        """
+        Packed bitset of the rows whose column is in values
+        """
+        if column not in self._bitsets:
+            return np.packbits(isin(df[column], values).to_numpy())
+
+        present, bits = self._bitsets[column]
+        categories = self._categories[column]
+        selected = [value for value in values if not pd.isna(value)]
+        codes = categories.get_indexer(pd.Index(selected, dtype=object))
+        codes = codes[codes >= 0]
+        if len(selected) < len(values):
+            codes = np.append(codes, -1)
+
+        slots = np.searchsorted(present, codes)
+        found = slots < len(present)
+        found[found] = present[slots[found]] == codes[found]
+        slots = slots[found]
+        if not len(slots):
+            return np.zeros(bits.shape[1], dtype=np.uint8)
+        return np.bitwise_or.reduce(bits[slots], axis=0)
+
+    def select(self, df, **selections):
+        """
+        The rows of df (the frame the index was built from) matching every
+        non-empty selection, {column: values}; a None value selects the
+        empty rows
+        """
+        mask = None
+        for column, values in selections.items():
+            if not values:
+                continue
+            values = list(values)
+            column_mask = self._value_mask(df, column, values)
+            mask = column_mask if mask is None else mask & column_mask
+
+        if mask is None:
+            return df
+
+        rows = np.flatnonzero(np.unpackbits(mask, count=self.rows))
+        if len(rows) == self.rows:
+            return df
+        return df.iloc[rows]
+
+
+DIMENSION_VALUES = metrics.gauge(
+    "swing_stats_dimension_values", "Values in the shared dictionary of a dimension column", ["column"]
+)
+
+
+def _collect_dimension_metrics():
+    with _lock:
+        sizes = {column: len(dtype.categories) for column, dtype in _dtypes.items()}
+    for column, size in sizes.items():
+        DIMENSION_VALUES.set(size, column=column)
+
+
+metrics.register_collector(_collect_dimension_metrics)
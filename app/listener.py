@@ -0,0 +1,140 @@
+# -*- coding: utf-8 -*-
+
+# Background LISTEN on the reporting database. Triggers installed by
+# migrations/0001_change_notify.sql notify on every change to the tables the
+# page datasets read, and the affected datasets are refreshed a moment later.
+import json
+import time
+import select
+import threading
+import traceback
+
+import psycopg2
+
+import logging
+log = logging.getLogger(__name__)
+
+from database import get_connect_kwargs
+from datasets import datasets_for_table, get_dataset
+from settings import NOTIFY_CHANNEL, NOTIFY_DEBOUNCE_SECONDS
+
+
+class ChangeListener:
+    """
+    Marks datasets stale as change notifications arrive and refreshes them
+    once the database has been quiet for debounce seconds, so a burst of
+    edits in Kitsu becomes a single refresh.
+    """
+
+    def __init__(self, channel=NOTIFY_CHANNEL, debounce=NOTIFY_DEBOUNCE_SECONDS):
+        self.channel = channel
+        self.debounce = debounce
+
+        self.notifications = 0
+        self.refreshes = 0
+
+        self._stale = set()
+        self._last_notify = None
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name="db-change-listener", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+
+    def handle(self, payload):
+        """
+        Mark the datasets reading the notified table as stale
+        """
+        self.notifications += 1
+        try:
+            table = json.loads(payload)["table"]
+        except (ValueError, KeyError, TypeError):
+            log.warning(f"Ignoring malformed change notification: {payload}")
+            return
+
+        names = datasets_for_table(table)
+        with self._lock:
+            for name in names:
+                get_dataset(name).mark_stale()
+            self._stale.update(names)
+            self._last_notify = time.monotonic()
+
+    def flush(self, force=False):
+        """
+        Refresh the stale datasets once the debounce period has passed.
+        Datasets this process has not loaded stay marked stale, their first
+        use loads them fresh.
+        """
+        with self._lock:
+            if not self._stale:
+                return
+            if not force and time.monotonic() - self._last_notify < self.debounce:
+                return
+            names, self._stale = self._stale, set()
+
+        for name in sorted(names):
+            dataset = get_dataset(name)
+            if not dataset.is_ready:
+                continue
+            dataset.refresh()
+            self.refreshes += 1
+
+    def _listen(self):
+        connection = psycopg2.connect(**get_connect_kwargs())
+        connection.set_session(autocommit=True)
+        with connection.cursor() as cursor:
+            cursor.execute(f"LISTEN {self.channel}")
+        log.info(f"Listening for changes on channel: {self.channel}")
+        return connection
+
+    def _run(self):
+        connection = None
+        backoff = 1
+
+        while not self._stop.is_set():
+            try:
+                if connection is None:
+                    connection = self._listen()
+                    backoff = 1
+
+                # wake at least every second to flush debounced refreshes
+                if select.select([connection], [], [], 1.0) != ([], [], []):
+                    connection.poll()
+                    while connection.notifies:
+                        self.handle(connection.notifies.pop(0).payload)
+
+                self.flush()
+            except Exception:
+                log.error("Change listener connection lost, reconnecting")
+                traceback.print_exc()
+                if connection is not None:
+                    try:
+                        connection.close()
+                    except Exception:
+                        pass
+                connection = None
+                self._stop.wait(backoff)
+                backoff = min(backoff * 2, 60)
+
+        if connection is not None:
+            connection.close()
+
+
+_listener = None
+
+
+def start_listener():
+    """
+    Start the shared change listener, once
+    """
+    global _listener
+
+    if _listener is None:
+        _listener = ChangeListener().start()
+    return _listener
@@ -0,0 +1,160 @@
+# -*- coding: utf-8 -*-
+
+# Apply the sql migrations in app/migrations to the swingdata database
+#
+#   python app/migrate.py            apply anything not yet applied
+#   python app/migrate.py --list     show applied / pending migrations
+import os
+import sys
+import argparse
+import traceback
+
+import logging
+log = logging.getLogger(__name__)
+
+from database import pooled_connection
+from settings import NOTIFY_CHANNEL
+
+MIGRATIONS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "migrations")
+
+CREATE_MIGRATION_TABLE = """
+create table if not exists swing_stats_migration (
+    name text primary key,
+    applied_at timestamp not null default now()
+)
+"""
+
+
+# {name} placeholders substituted in the migration sql, e.g. the channel the
+# change triggers notify
+MIGRATION_PARAMETERS = {
+    "notify_channel": NOTIFY_CHANNEL,
+}
+
+
+def render_migration(sql, parameters=None):
+    """
+    sql with its {name} placeholders replaced. Plain replace rather than
+    str.format, so the braces and percent signs of the sql itself are left
+    alone; values are escaped for use inside a quoted literal.
+    """
+    for name, value in (MIGRATION_PARAMETERS if parameters is None else parameters).items():
+        sql = sql.replace("{" + name + "}", str(value).replace("'", "''"))
+    return sql
+
+
+def get_migrations():
+    """
+    Migration file names in the order they apply
+    """
+    return sorted(name for name in os.listdir(MIGRATIONS_DIR) if name.endswith(".sql"))
+
+
+def get_applied(connection):
+    with connection.cursor() as cursor:
+        cursor.execute(CREATE_MIGRATION_TABLE)
+        cursor.execute("select name from swing_stats_migration")
+        applied = {row[0] for row in cursor.fetchall()}
+    connection.commit()
+    return applied
+
+
+def get_pending(connection):
+    """
+    Migrations not yet applied, read only so it also works against a
+    reporting replica
+    """
+    with connection.cursor() as cursor:
+        cursor.execute("select to_regclass('swing_stats_migration') is not null")
+        applied = set()
+        if cursor.fetchone()[0]:
+            cursor.execute("select name from swing_stats_migration")
+            applied = {row[0] for row in cursor.fetchall()}
+    connection.rollback()
+    return [name for name in get_migrations() if name not in applied]
+
+
+def apply_migrations(connection):
+    """
+    Apply each pending migration in its own transaction
+    """
+    applied = get_applied(connection)
+    pending = [name for name in get_migrations() if name not in applied]
+
+    for name in pending:
+        with open(os.path.join(MIGRATIONS_DIR, name)) as migration:
+            sql = render_migration(migration.read())
+
+        log.info(f"applying migration: {name}")
+        try:
+            with connection.cursor() as cursor:
+                cursor.execute(sql)
+                cursor.execute("insert into swing_stats_migration (name) values (%s)", (name,))
+            connection.commit()
+        except Exception:
+            connection.rollback()
+            log.error(f"Error applying migration: {name}")
+            raise
+
+    return pending
+
+
+def run_migrations():
+    """
+    Apply pending migrations at app startup, logging instead of failing so
+    the app still starts against a read only reporting host
+    """
+    try:
+        with pooled_connection(primary=True) as connection:
+            pending = apply_migrations(connection)
+        if pending:
+            log.info(f"applied {len(pending)} migration(s)")
+    except Exception:
+        log.error("Error applying migrations, run app/migrate.py against the primary")
+        traceback.print_exc()
+
+
+def check_migrations():
+    """
+    Exit when a migration is not applied. The datasets read the tables and
+    rely on the triggers the migrations create, without them every load
+    fails. A database that can't be reached is only logged, the loads retry
+    once it is back.
+    """
+    try:
+        with pooled_connection() as connection:
+            pending = get_pending(connection)
+    except Exception:
+        log.error("Error checking migrations")
+        traceback.print_exc()
+        return
+
+    if pending:
+        sys.exit(
+            f"{len(pending)} migration(s) not applied ({', '.join(pending)}): "
+            "run python app/migrate.py against the primary, "
+            "or set APPLY_MIGRATIONS_ON_STARTUP"
+        )
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Apply swing stats migrations")
+    parser.add_argument("--list", action="store_true", help="list migrations and exit")
+    args = parser.parse_args()
+
+    with pooled_connection(primary=True) as connection:
+        if args.list:
+            applied = get_applied(connection)
+            for name in get_migrations():
+                print(f"{'applied' if name in applied else 'pending':<10}{name}")
+            return 0
+
+        pending = apply_migrations(connection)
+
+    print(f"applied {len(pending)} migration(s)")
+    return 0
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    sys.exit(main())
@@ -0,0 +1,35 @@
+-- Notify the stats app when the Kitsu tables behind the page datasets change.
+-- Statement level so a bulk update sends one notification per table, and
+-- postgres folds identical payloads within a transaction into one.
+-- The channel placeholder is replaced with settings.NOTIFY_CHANNEL when the
+-- migration is applied (see app/migrate.py).
+
+create or replace function swing_stats_notify_change() returns trigger as $$
+begin
+    perform pg_notify(
+        '{notify_channel}',
+        json_build_object('table', TG_TABLE_NAME, 'op', TG_OP)::text
+    );
+    return null;
+end;
+$$ language plpgsql;
+
+drop trigger if exists swing_stats_task_changed on task;
+create trigger swing_stats_task_changed
+    after insert or update or delete or truncate on task
+    for each statement execute procedure swing_stats_notify_change();
+
+drop trigger if exists swing_stats_comment_changed on comment;
+create trigger swing_stats_comment_changed
+    after insert or update or delete or truncate on comment
+    for each statement execute procedure swing_stats_notify_change();
+
+drop trigger if exists swing_stats_assignations_changed on assignations;
+create trigger swing_stats_assignations_changed
+    after insert or update or delete or truncate on assignations
+    for each statement execute procedure swing_stats_notify_change();
+
+drop trigger if exists swing_stats_entity_changed on entity;
+create trigger swing_stats_entity_changed
+    after insert or update or delete or truncate on entity
+    for each statement execute procedure swing_stats_notify_change();
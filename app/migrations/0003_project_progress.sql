@@ -0,0 +1,167 @@
+-- Per project task counters for the projects_summary page, kept up to date
+-- by triggers on task so the page never scans the task table. One row per
+-- project and task status; done / total are resolved against
+-- task_status.is_done when read, so changing a status definition needs no
+-- rebuild. Rows are kept at zero rather than deleted, so the history below
+-- stays complete.
+--
+-- The history holds the counters of a project as they stood at the end of
+-- each day it changed; days without a row carry the previous day forward.
+-- Statement level triggers with transition tables, so a bulk update is one
+-- aggregate rather than one trigger call per row.
+
+create table if not exists swing_stats_project_progress (
+    project_id uuid not null,
+    task_status_id uuid not null,
+    task_count bigint not null default 0,
+    estimation double precision not null default 0,
+    duration double precision not null default 0,
+    primary key (project_id, task_status_id)
+);
+
+create table if not exists swing_stats_project_progress_history (
+    day date not null,
+    project_id uuid not null,
+    task_status_id uuid not null,
+    task_count bigint not null,
+    estimation double precision not null,
+    duration double precision not null,
+    primary key (day, project_id, task_status_id)
+);
+
+-- copy the counters of project_ids into today's history
+create or replace function swing_stats_record_project_progress(project_ids uuid[]) returns void as $$
+begin
+    insert into swing_stats_project_progress_history as history
+        (day, project_id, task_status_id, task_count, estimation, duration)
+    select current_date, project_id, task_status_id, task_count, estimation, duration
+    from swing_stats_project_progress
+    where project_id = any(project_ids)
+    on conflict (day, project_id, task_status_id) do update set
+        task_count = excluded.task_count,
+        estimation = excluded.estimation,
+        duration = excluded.duration;
+end;
+$$ language plpgsql;
+
+create or replace function swing_stats_task_progress_inserted() returns trigger as $$
+begin
+    insert into swing_stats_project_progress as progress
+        (project_id, task_status_id, task_count, estimation, duration)
+    select project_id, task_status_id, count(*), coalesce(sum(estimation), 0), coalesce(sum(duration), 0)
+    from new_rows
+    where project_id is not null and task_status_id is not null
+    group by project_id, task_status_id
+    on conflict (project_id, task_status_id) do update set
+        task_count = progress.task_count + excluded.task_count,
+        estimation = progress.estimation + excluded.estimation,
+        duration = progress.duration + excluded.duration;
+
+    perform swing_stats_record_project_progress(array(select distinct project_id from new_rows));
+    return null;
+end;
+$$ language plpgsql;
+
+create or replace function swing_stats_task_progress_updated() returns trigger as $$
+declare
+    project_ids uuid[];
+begin
+    -- most task updates (comments, dates) leave the counters alone
+    with changed as (
+        select old_rows as old_row, new_rows as new_row
+        from old_rows
+        join new_rows on new_rows.id = old_rows.id
+        where (old_rows.project_id, old_rows.task_status_id, old_rows.estimation, old_rows.duration)
+            is distinct from (new_rows.project_id, new_rows.task_status_id, new_rows.estimation, new_rows.duration)
+    ), changes as (
+        select (old_row).project_id, (old_row).task_status_id, -1 as task_count,
+            -coalesce((old_row).estimation, 0) as estimation, -coalesce((old_row).duration, 0) as duration
+        from changed
+        union all
+        select (new_row).project_id, (new_row).task_status_id, 1,
+            coalesce((new_row).estimation, 0), coalesce((new_row).duration, 0)
+        from changed
+    ), applied as (
+        insert into swing_stats_project_progress as progress
+            (project_id, task_status_id, task_count, estimation, duration)
+        select project_id, task_status_id, sum(task_count), sum(estimation), sum(duration)
+        from changes
+        where project_id is not null and task_status_id is not null
+        group by project_id, task_status_id
+        on conflict (project_id, task_status_id) do update set
+            task_count = progress.task_count + excluded.task_count,
+            estimation = progress.estimation + excluded.estimation,
+            duration = progress.duration + excluded.duration
+        returning progress.project_id
+    )
+    select array_agg(distinct project_id) into project_ids from applied;
+
+    if project_ids is null then
+        return null;
+    end if;
+
+    perform swing_stats_record_project_progress(project_ids);
+    return null;
+end;
+$$ language plpgsql;
+
+create or replace function swing_stats_task_progress_deleted() returns trigger as $$
+begin
+    update swing_stats_project_progress as progress set
+        task_count = progress.task_count - removed.task_count,
+        estimation = progress.estimation - removed.estimation,
+        duration = progress.duration - removed.duration
+    from (
+        select project_id, task_status_id, count(*) as task_count,
+            coalesce(sum(estimation), 0) as estimation, coalesce(sum(duration), 0) as duration
+        from old_rows
+        group by project_id, task_status_id
+    ) as removed
+    where progress.project_id = removed.project_id and progress.task_status_id = removed.task_status_id;
+
+    perform swing_stats_record_project_progress(array(select distinct project_id from old_rows));
+    return null;
+end;
+$$ language plpgsql;
+
+-- rebuild the counters from task, e.g. after a truncate or if they ever drift
+create or replace function swing_stats_rebuild_project_progress() returns void as $$
+begin
+    lock table swing_stats_project_progress in exclusive mode;
+
+    update swing_stats_project_progress set task_count = 0, estimation = 0, duration = 0;
+
+    insert into swing_stats_project_progress as progress
+        (project_id, task_status_id, task_count, estimation, duration)
+    select project_id, task_status_id, count(*), coalesce(sum(estimation), 0), coalesce(sum(duration), 0)
+    from task
+    where project_id is not null and task_status_id is not null
+    group by project_id, task_status_id
+    on conflict (project_id, task_status_id) do update set
+        task_count = excluded.task_count,
+        estimation = excluded.estimation,
+        duration = excluded.duration;
+
+    perform swing_stats_record_project_progress(array(select id from project));
+end;
+$$ language plpgsql;
+
+drop trigger if exists swing_stats_task_progress_inserted on task;
+create trigger swing_stats_task_progress_inserted
+    after insert on task
+    referencing new table as new_rows
+    for each statement execute procedure swing_stats_task_progress_inserted();
+
+drop trigger if exists swing_stats_task_progress_updated on task;
+create trigger swing_stats_task_progress_updated
+    after update on task
+    referencing old table as old_rows new table as new_rows
+    for each statement execute procedure swing_stats_task_progress_updated();
+
+drop trigger if exists swing_stats_task_progress_deleted on task;
+create trigger swing_stats_task_progress_deleted
+    after delete on task
+    referencing old table as old_rows
+    for each statement execute procedure swing_stats_task_progress_deleted();
+
+select swing_stats_rebuild_project_progress();
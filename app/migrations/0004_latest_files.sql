@@ -0,0 +1,225 @@
+-- The latest working file per task and artist, and the latest output file
+-- per entity, artist and task type, kept up to date by triggers on
+-- working_file and output_file. The artist page joins these by key instead
+-- of ranking the whole of both tables, the fastest growing in Kitsu, on
+-- every load.
+--
+-- A newly published file replaces the indexed one when it is at least as
+-- recent. Updating or deleting files re-reads the latest file of the keys
+-- they were and are under.
+
+create table if not exists swing_stats_latest_working_file (
+    task_id uuid not null,
+    person_id uuid not null,
+    working_file_id uuid not null,
+    name text,
+    updated_at timestamp,
+    primary key (task_id, person_id)
+);
+
+create table if not exists swing_stats_latest_output_file (
+    entity_id uuid not null,
+    person_id uuid not null,
+    task_type_id uuid not null,
+    output_file_id uuid not null,
+    name text,
+    updated_at timestamp,
+    primary key (entity_id, person_id, task_type_id)
+);
+
+-- the update and delete triggers find the rows of the changed files by id
+create index if not exists swing_stats_latest_working_file_file
+    on swing_stats_latest_working_file (working_file_id);
+create index if not exists swing_stats_latest_output_file_file
+    on swing_stats_latest_output_file (output_file_id);
+
+create or replace function swing_stats_working_file_published() returns trigger as $$
+begin
+    insert into swing_stats_latest_working_file as latest
+        (task_id, person_id, working_file_id, name, updated_at)
+    select distinct on (task_id, person_id) task_id, person_id, id, name, updated_at
+    from new_rows
+    where task_id is not null and person_id is not null
+    order by task_id, person_id, updated_at desc nulls last
+    on conflict (task_id, person_id) do update set
+        working_file_id = excluded.working_file_id,
+        name = excluded.name,
+        updated_at = excluded.updated_at
+    where latest.updated_at is null or excluded.updated_at >= latest.updated_at;
+    return null;
+end;
+$$ language plpgsql;
+
+create or replace function swing_stats_working_file_updated() returns trigger as $$
+begin
+    delete from swing_stats_latest_working_file as latest
+    using old_rows
+    where latest.working_file_id = old_rows.id;
+
+    insert into swing_stats_latest_working_file as latest
+        (task_id, person_id, working_file_id, name, updated_at)
+    select distinct on (working_file.task_id, working_file.person_id)
+        working_file.task_id, working_file.person_id, working_file.id,
+        working_file.name, working_file.updated_at
+    from working_file
+    inner join (
+        select task_id, person_id from old_rows
+        union
+        select task_id, person_id from new_rows
+    ) as touched
+        on touched.task_id = working_file.task_id and touched.person_id = working_file.person_id
+    order by working_file.task_id, working_file.person_id, working_file.updated_at desc nulls last
+    on conflict (task_id, person_id) do update set
+        working_file_id = excluded.working_file_id,
+        name = excluded.name,
+        updated_at = excluded.updated_at;
+    return null;
+end;
+$$ language plpgsql;
+
+create or replace function swing_stats_working_file_deleted() returns trigger as $$
+begin
+    delete from swing_stats_latest_working_file as latest
+    using old_rows
+    where latest.working_file_id = old_rows.id;
+
+    -- the latest remaining file of the keys left without one
+    insert into swing_stats_latest_working_file
+        (task_id, person_id, working_file_id, name, updated_at)
+    select distinct on (working_file.task_id, working_file.person_id)
+        working_file.task_id, working_file.person_id, working_file.id,
+        working_file.name, working_file.updated_at
+    from working_file
+    inner join (select distinct task_id, person_id from old_rows) as removed
+        on removed.task_id = working_file.task_id and removed.person_id = working_file.person_id
+    order by working_file.task_id, working_file.person_id, working_file.updated_at desc nulls last
+    on conflict (task_id, person_id) do nothing;
+    return null;
+end;
+$$ language plpgsql;
+
+create or replace function swing_stats_output_file_published() returns trigger as $$
+begin
+    insert into swing_stats_latest_output_file as latest
+        (entity_id, person_id, task_type_id, output_file_id, name, updated_at)
+    select distinct on (entity_id, person_id, task_type_id)
+        entity_id, person_id, task_type_id, id, name, updated_at
+    from new_rows
+    where entity_id is not null and person_id is not null and task_type_id is not null
+    order by entity_id, person_id, task_type_id, updated_at desc nulls last
+    on conflict (entity_id, person_id, task_type_id) do update set
+        output_file_id = excluded.output_file_id,
+        name = excluded.name,
+        updated_at = excluded.updated_at
+    where latest.updated_at is null or excluded.updated_at >= latest.updated_at;
+    return null;
+end;
+$$ language plpgsql;
+
+create or replace function swing_stats_output_file_updated() returns trigger as $$
+begin
+    delete from swing_stats_latest_output_file as latest
+    using old_rows
+    where latest.output_file_id = old_rows.id;
+
+    insert into swing_stats_latest_output_file as latest
+        (entity_id, person_id, task_type_id, output_file_id, name, updated_at)
+    select distinct on (output_file.entity_id, output_file.person_id, output_file.task_type_id)
+        output_file.entity_id, output_file.person_id, output_file.task_type_id, output_file.id,
+        output_file.name, output_file.updated_at
+    from output_file
+    inner join (
+        select entity_id, person_id, task_type_id from old_rows
+        union
+        select entity_id, person_id, task_type_id from new_rows
+    ) as touched
+        on touched.entity_id = output_file.entity_id
+        and touched.person_id = output_file.person_id
+        and touched.task_type_id = output_file.task_type_id
+    order by
+        output_file.entity_id, output_file.person_id, output_file.task_type_id,
+        output_file.updated_at desc nulls last
+    on conflict (entity_id, person_id, task_type_id) do update set
+        output_file_id = excluded.output_file_id,
+        name = excluded.name,
+        updated_at = excluded.updated_at;
+    return null;
+end;
+$$ language plpgsql;
+
+create or replace function swing_stats_output_file_deleted() returns trigger as $$
+begin
+    delete from swing_stats_latest_output_file as latest
+    using old_rows
+    where latest.output_file_id = old_rows.id;
+
+    insert into swing_stats_latest_output_file
+        (entity_id, person_id, task_type_id, output_file_id, name, updated_at)
+    select distinct on (output_file.entity_id, output_file.person_id, output_file.task_type_id)
+        output_file.entity_id, output_file.person_id, output_file.task_type_id, output_file.id,
+        output_file.name, output_file.updated_at
+    from output_file
+    inner join (select distinct entity_id, person_id, task_type_id from old_rows) as removed
+        on removed.entity_id = output_file.entity_id
+        and removed.person_id = output_file.person_id
+        and removed.task_type_id = output_file.task_type_id
+    order by
+        output_file.entity_id, output_file.person_id, output_file.task_type_id,
+        output_file.updated_at desc nulls last
+    on conflict (entity_id, person_id, task_type_id) do nothing;
+    return null;
+end;
+$$ language plpgsql;
+
+drop trigger if exists swing_stats_working_file_inserted on working_file;
+create trigger swing_stats_working_file_inserted
+    after insert on working_file
+    referencing new table as new_rows
+    for each statement execute procedure swing_stats_working_file_published();
+
+drop trigger if exists swing_stats_working_file_updated on working_file;
+create trigger swing_stats_working_file_updated
+    after update on working_file
+    referencing old table as old_rows new table as new_rows
+    for each statement execute procedure swing_stats_working_file_updated();
+
+drop trigger if exists swing_stats_working_file_deleted on working_file;
+create trigger swing_stats_working_file_deleted
+    after delete on working_file
+    referencing old table as old_rows
+    for each statement execute procedure swing_stats_working_file_deleted();
+
+drop trigger if exists swing_stats_output_file_inserted on output_file;
+create trigger swing_stats_output_file_inserted
+    after insert on output_file
+    referencing new table as new_rows
+    for each statement execute procedure swing_stats_output_file_published();
+
+drop trigger if exists swing_stats_output_file_updated on output_file;
+create trigger swing_stats_output_file_updated
+    after update on output_file
+    referencing old table as old_rows new table as new_rows
+    for each statement execute procedure swing_stats_output_file_updated();
+
+drop trigger if exists swing_stats_output_file_deleted on output_file;
+create trigger swing_stats_output_file_deleted
+    after delete on output_file
+    referencing old table as old_rows
+    for each statement execute procedure swing_stats_output_file_deleted();
+
+-- seed from the files already published
+insert into swing_stats_latest_working_file (task_id, person_id, working_file_id, name, updated_at)
+select distinct on (task_id, person_id) task_id, person_id, id, name, updated_at
+from working_file
+where task_id is not null and person_id is not null
+order by task_id, person_id, updated_at desc nulls last
+on conflict do nothing;
+
+insert into swing_stats_latest_output_file
+    (entity_id, person_id, task_type_id, output_file_id, name, updated_at)
+select distinct on (entity_id, person_id, task_type_id)
+    entity_id, person_id, task_type_id, id, name, updated_at
+from output_file
+where entity_id is not null and person_id is not null and task_type_id is not null
+order by entity_id, person_id, task_type_id, updated_at desc nulls last
+on conflict do nothing;
@@ -0,0 +1,55 @@
+-- Tombstones of deleted tasks and comments for the delta refreshes. The
+-- changed key queries find rows by updated_at, which a deleted row no
+-- longer has, so without these a deleted task or comment stayed in the page
+-- frames until the next full load. key_id is the id the page rows are keyed
+-- by: the task itself, or the task a comment is on.
+--
+-- deleted_at is UTC without time zone, like the updated_at columns Kitsu
+-- writes, so both compare against the same watermark. Tombstones are kept
+-- for a week, far longer than any refresh interval.
+
+create table if not exists swing_stats_deleted_row (
+    table_name text not null,
+    key_id uuid not null,
+    deleted_at timestamp not null default (now() at time zone 'utc')
+);
+
+create index if not exists swing_stats_deleted_row_deleted_at on swing_stats_deleted_row (deleted_at);
+
+create or replace function swing_stats_task_tombstone() returns trigger as $$
+begin
+    insert into swing_stats_deleted_row (table_name, key_id)
+    select 'task', id from old_rows;
+
+    delete from swing_stats_deleted_row where deleted_at < (now() at time zone 'utc') - interval '7 days';
+    return null;
+end;
+$$ language plpgsql;
+
+create or replace function swing_stats_comment_tombstone() returns trigger as $$
+begin
+    insert into swing_stats_deleted_row (table_name, key_id)
+    select distinct 'comment', object_id from old_rows where object_id is not null;
+
+    delete from swing_stats_deleted_row where deleted_at < (now() at time zone 'utc') - interval '7 days';
+    return null;
+end;
+$$ language plpgsql;
+
+drop trigger if exists swing_stats_task_tombstone on task;
+create trigger swing_stats_task_tombstone
+    after delete on task
+    referencing old table as old_rows
+    for each statement execute procedure swing_stats_task_tombstone();
+
+drop trigger if exists swing_stats_comment_tombstone on comment;
+create trigger swing_stats_comment_tombstone
+    after delete on comment
+    referencing old table as old_rows
+    for each statement execute procedure swing_stats_comment_tombstone();
+
+-- opening or closing a project adds or removes all of its tasks
+drop trigger if exists swing_stats_project_changed on project;
+create trigger swing_stats_project_changed
+    after insert or update or delete or truncate on project
+    for each statement execute procedure swing_stats_notify_change();
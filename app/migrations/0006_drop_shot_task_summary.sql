@@ -0,0 +1,6 @@
+-- The shot pages project their episode aggregate from the task facts in
+-- the app, so nothing reads or refreshes the swing_stats_shot_task_summary
+-- materialized view 0002 created any more. Databases that applied 0002
+-- drop it here instead of carrying a view that only goes stale.
+
+drop materialized view if exists swing_stats_shot_task_summary;
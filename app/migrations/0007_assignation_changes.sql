@@ -0,0 +1,53 @@
+-- Changes to task assignments for the delta refreshes. assignations is a
+-- plain (task, person) link table without updated_at, so the changed key
+-- queries had no way to see a task assigned or unassigned and the artist,
+-- asset and comment rows kept their old assignees until the next full load.
+-- Each insert, update or delete records the tasks it touched here.
+--
+-- changed_at is UTC without time zone like the Kitsu updated_at columns,
+-- and rows are kept for a week, as the tombstones in 0005 are.
+
+create table if not exists swing_stats_assignation_change (
+    task_id uuid not null,
+    changed_at timestamp not null default (now() at time zone 'utc')
+);
+
+create index if not exists swing_stats_assignation_change_changed_at
+    on swing_stats_assignation_change (changed_at);
+
+-- plpgsql plans each statement when it first runs, so the branch reading a
+-- transition table the event doesn't have is never planned
+create or replace function swing_stats_assignation_change() returns trigger as $$
+begin
+    if TG_OP in ('UPDATE', 'DELETE') then
+        insert into swing_stats_assignation_change (task_id)
+        select distinct task from old_rows where task is not null;
+    end if;
+    if TG_OP in ('INSERT', 'UPDATE') then
+        insert into swing_stats_assignation_change (task_id)
+        select distinct task from new_rows where task is not null;
+    end if;
+
+    delete from swing_stats_assignation_change where changed_at < (now() at time zone 'utc') - interval '7 days';
+    return null;
+end;
+$$ language plpgsql;
+
+-- a trigger with transition tables takes a single event
+drop trigger if exists swing_stats_assignation_inserted on assignations;
+create trigger swing_stats_assignation_inserted
+    after insert on assignations
+    referencing new table as new_rows
+    for each statement execute procedure swing_stats_assignation_change();
+
+drop trigger if exists swing_stats_assignation_updated on assignations;
+create trigger swing_stats_assignation_updated
+    after update on assignations
+    referencing old table as old_rows new table as new_rows
+    for each statement execute procedure swing_stats_assignation_change();
+
+drop trigger if exists swing_stats_assignation_deleted on assignations;
+create trigger swing_stats_assignation_deleted
+    after delete on assignations
+    referencing old table as old_rows
+    for each statement execute procedure swing_stats_assignation_change();
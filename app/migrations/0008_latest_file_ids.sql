@@ -0,0 +1,8 @@
+-- The file id indexes 0004 now creates, for databases that applied 0004
+-- before it did. Without them every update or delete of a working or output
+-- file scanned the whole latest file table inside Kitsu's transaction.
+
+create index if not exists swing_stats_latest_working_file_file
+    on swing_stats_latest_working_file (working_file_id);
+create index if not exists swing_stats_latest_output_file_file
+    on swing_stats_latest_output_file (output_file_id);
@@ -17,10 +17,14 @@ import plotly.express as px
 
 import pandas as pd
 
-from database import connect
+import task_facts
+from datasets import register_projection
+from result_cache import result_cache, filter_key
+from callback_timing import timed_callback, lap
 
-from .calcs import load_default_calcs, load_graph_calcs, filter_by_task_date
+from .calcs import load_default_calcs, load_graph_calcs, filter_by_task_date, task_window
 from .page_nav import get_nav_filters, get_task_filters
+from .page_loading import get_loading_layout
 
 dash.register_page(__name__, order=25, path="/artist-data")
 
@@ -88,160 +92,34 @@ columnsDefs = [
 defaultColDef = {"editable": True, "filter": True}
 
 
-def load_data():
-    logging.debug("loaded default table")
-
-    connection, cursor = connect()
-
-    df = pd.read_sql_query(
-        """
-      WITH LastFilePerTaskPerson AS (
-          SELECT
-              task_id,
-              person_id,
-              updated_at,
-              name,
-              ROW_NUMBER() OVER (PARTITION BY task_id, person_id ORDER BY updated_at DESC) AS rn
-          FROM
-              working_file
-	  ),
-      LastOutputFilePerTaskPerson AS (
-          SELECT
-              entity_id,
-              person_id,
-              updated_at,
-              task_type_id,
-              name,
-              ROW_NUMBER() OVER (PARTITION BY entity_id, person_id, task_type_id ORDER BY updated_at DESC) AS rn
-          FROM
-              output_file
-      )            
-		select distinct
-            project.name as project,
-            project.code as project_code,
-
-            department.name as department,
-
-            COALESCE(person.first_name, '') ||
-            CASE
-                WHEN person.first_name IS NOT NULL AND person.last_name IS NOT NULL THEN ' '
-                ELSE ''
-            END ||
-            COALESCE(person.last_name, '') as artist,
-            
-            CASE
-            	WHEN (parent.name IS NOT NULL and gran.name IS NOT NULL) THEN gran.name
-                ELSE 'ALL'
-            END
-            AS episode,            
-
-            task_type.for_entity,
-
-            CASE
-            	WHEN (parent.name IS NOT NULL and gran.name IS NOT NULL) THEN gran.name || '_' || parent.name || '_' || entity.name
-                ELSE entity.name
-            END
-            AS task,
-
-            entity_type.name as entity_type,
-            
-            task_type.name as task_type,
-            task_type.color as task_type_color,
-            task_type.short_name task_type_code,
-            
-            task_status.name as task_status,
-            task_status.color as task_status_color,
-            task_status.short_name as task_status_code,
-                                  
-			((task.start_date)) AS task_start_date,
-	       	((task.due_date)) AS task_due_date,
-
-			((task.real_start_date)) AS task_real_start_date,
-	       	((task.end_date)) AS task_end_date,
-            
-            task.estimation as task_estimation,
-            task.duration as task_duration,
-            task.retake_count as retake_count,
-
-            task_type.priority,
-                       
-            wf.name as working_file_name,
-	       	((wf.updated_at)) AS working_file_published_at,                       
-                       
-            outf.name as output_file_name,
-	       	((outf.updated_at)) AS output_file_published_at
-
-        from
-            entity entity
-        left outer join 
-        	entity parent on entity.parent_id = parent.id
-        left outer join
-        	entity gran on parent.parent_id = gran.id
-
-        inner join
-            task on task.entity_id = entity.id
-        inner join
-            project on task.project_id = project.id
-        inner join
-            project_status on project.project_status_id = project_status.id
-
-        inner join
-            entity_type on entity.entity_type_id = entity_type.id
-        inner join
-            task_status on task.task_status_id = task_status.id
-        inner join
-            task_type on task.task_type_id = task_type.id
-        left outer join 
-            department on task_type.department_id = department.id
-
-        inner join
-            assignations on task.id = assignations.task
-        inner join person
-            on person.id = assignations.person
-            
-        left outer join LastFilePerTaskPerson wf on 
-        	wf.task_id = task.id and wf.person_id = person.id and wf.rn = 1
-            
-		left outer join LastOutputFilePerTaskPerson outf on
-        	outf.entity_id = entity.id and outf.person_id = person.id and outf.task_type_id = task_type.id and outf.rn = 1
-
-        where
-            project_status.name in ('Open')
-        and
-        	entity.canceled = 'False'
-        and
-        	task_status.name not in ('Omit')
-            
-        order by
-        	artist, priority, task, task_type
-              
-
-
-    """,
-        con=connection,
-    )
-
+def apply_calcs(df):
+    df = load_default_calcs(df)
+    df = load_graph_calcs(df)
     return df
 
 
-logging.debug(f"loading data: {__name__}")
+def build_data(facts):
+    logging.debug(f"projecting data: {__name__}")
 
-df = load_data()
-df = load_default_calcs(df)
-df = load_graph_calcs(df)
+    df = task_facts.artist_tasks(facts)
+    df = apply_calcs(df)
+    return df
 
-project_list = df["project"].unique().tolist()
-department_list = df["department"].unique().tolist()
 
-# episode_list = df["episode"].unique().tolist()
-task_type_list = df["task_type"].unique().tolist()
-task_status_list = df["task_status"].unique().tolist()
-artist_list = df["artist"].unique().tolist()
+dataset = register_projection("artist_data", task_facts.dataset, build_data)
+results = result_cache("artist_data")
 
 grid = None
 
 
-def get_nav_div():
+def get_nav_div(df):
+    project_list = df["project"].unique().tolist()
+    department_list = df["department"].unique().tolist()
+
+    # episode_list = df["episode"].unique().tolist()
+    task_type_list = df["task_type"].unique().tolist()
+    task_status_list = df["task_status"].unique().tolist()
+
     return html.Div(
         className="nav-header",
         children=[
@@ -258,6 +136,12 @@ def get_nav_div():
 
 
 def layout(**kwargs):
+    if not dataset.is_ready:
+        return get_loading_layout(dataset, layout)
+
+    df = dataset.frame()
+    artist_list = df["artist"].unique().tolist()
+
     return html.Div(
         [
             dbc.Card(
@@ -276,7 +160,7 @@ def layout(**kwargs):
                 style={"width": "100%", "height": "200px", "border": "none"},
                 className="nav-header",
                 children=[
-                    get_nav_div(),
+                    get_nav_div(df),
                 ],
             ),
             html.Div(
@@ -340,14 +224,14 @@ def layout(**kwargs):
     Input("artist_data_project_combo", "value"),
     Input("artist_data_department_combo", "value"),
 )
+@timed_callback
 def update_filters(project, department):
-    dff = df.copy()
-
-    if project:
-        dff = dff[dff["project"].isin(project)]
+    dff = dataset.select(
+        project=project,
+        department=department,
+    )
 
-    if department:
-        dff = dff[dff["department"].isin(department)]
+    lap("filter")
 
     artist_list = dff["artist"].unique().tolist()
 
@@ -374,6 +258,7 @@ def update_filters(project, department):
     Input("artist_data_tasks_now", "n_clicks"),
     Input("artist_data_tasks_next_week", "n_clicks"),
 )
+@timed_callback
 def update_graphs(
     project,
     department,
@@ -395,23 +280,33 @@ def update_graphs(
     # `derived_virtual_data=df.to_rows('dict')` when you initialize
     # the component.
 
-    dff = df.copy()
-    dff = filter_by_task_date(dff, ctx, "artist_data")    
-
-    if project:
-        dff = dff[dff["project"].isin(project)]
-
-    if department:
-        dff = dff[dff["department"].isin(department)]
-
-    if task_type:
-        dff = dff[dff["task_type"].isin(task_type)]
-
-    if task_status:
-        dff = dff[dff["task_status"].isin(task_status)]
+    # the key, the rows and the timeline range all come from one snapshot
+    snapshot = dataset.snapshot()
+    cache_key = filter_key(
+        snapshot.version,
+        task_window(ctx, "artist_data"),
+        project=project,
+        department=department,
+        task_type=task_type,
+        task_status=task_status,
+        artist=artist,
+    )
+    cached = results.get(cache_key)
+    if cached is not None:
+        lap("cache")
+        return cached
+
+    dff = snapshot.index.select(
+        snapshot.frame,
+        project=project,
+        department=department,
+        task_type=task_type,
+        task_status=task_status,
+        artist=artist,
+    )
+    dff = filter_by_task_date(dff, ctx, "artist_data")
 
-    if artist:
-        dff = dff[dff["artist"].isin(artist)]        
+    lap("filter")
 
     data_table = dag.AgGrid(
         id="datatable-interactivity",
@@ -424,6 +319,7 @@ def update_graphs(
         ## className="ag-theme-alpine-dark",
         style={"height": "450px", "width": "100%"},
     )
+    lap("serialise")
 
     # add chart helpers
     summary_df = dff.copy()
@@ -439,6 +335,7 @@ def update_graphs(
                 pd.Grouper(key="task_end_date", freq="D"),
             ],
             ## dropna=True,
+            observed=True,
         )
         .sum(numeric_only=True)
         .reset_index()
@@ -498,7 +395,7 @@ def update_graphs(
     fig2.update_layout(
         bargap=0.5,
         bargroupgap=0.1,
-        xaxis_range=[df.Start.min(), df.Finish.max()],
+        xaxis_range=[snapshot.frame.Start.min(), snapshot.frame.Finish.max()],
         xaxis=dict(
             showgrid=True,
             rangeslider_visible=True,
@@ -558,4 +455,7 @@ def update_graphs(
     # summary_df = summary_df.assign(Finish = lambda x: pd.to_datetime(x.task_end_date))
     # summary_df = summary_df.assign(Duration = lambda x: (pd.to_datetime(x.task_end_date) - pd.to_datetime(x.task_start_date)))
     # fig = px.bar(summary_df, x="nb_frames", y="shot_count", color="task_duration", barmode="group")
-    return data_table, dcc.Graph(figure=fig2), dcc.Graph(figure=fig)
+    lap("figure")
+    result = (data_table, dcc.Graph(figure=fig2), dcc.Graph(figure=fig))
+    results.put(cache_key, result)
+    return result
@@ -16,10 +16,14 @@ import dash_bootstrap_components as dbc
 import numpy as np
 import pandas as pd
 
-from database import connect
+import task_facts
+from datasets import register_projection
+from result_cache import result_cache, filter_key
+from callback_timing import timed_callback, lap
 
-from .calcs import load_default_calcs, filter_by_task_date
+from .calcs import load_default_calcs, filter_by_task_date, task_window
 from .page_nav import get_nav_filters, get_task_filters
+from .page_loading import get_loading_layout
 
 dash.register_page(__name__, order=20, path="/asset-data")
 
@@ -91,114 +95,34 @@ columnsDefs = [
 defaultColDef = {"editable": True, "filter": True}
 
 
-def load_data():
-    logging.debug("loaded default table")
-
-    connection, cursor = connect()
-
-    df = pd.read_sql_query(
-        """
-		select distinct 
-            project.name as project,
-            project.code as project_code, 
-
-            department.name as department,
-                       
-            entity_type.name as entity_type,
-            asset.name as asset_name,    
-                       
-            task_type.name as task_type,   
-            task_type.short_name as task_type_code,
-            task_type.priority,
-            task_type.color as task_type_color,
-
-            task_status.name as task_status,
-            task_status.short_name as task_status_code,
-            task_status.color as task_status_color,
-            
-            sum(task.estimation) as task_estimation,
-            sum(task.duration) as task_duration,
-            sum(task.retake_count) as retake_count,            
-
-			(MIN(task.real_start_date)) AS task_real_start_date,
-	       	(MAX(task.end_date)) AS task_end_date,  
-
-			(MIN(task.start_date)) AS task_start_date,
-	       	(MAX(task.due_date)) AS task_due_date,                        
-                       
-            STRING_AGG(
-                DISTINCT
-                COALESCE(person.first_name, '') ||
-                CASE
-                    WHEN person.first_name IS NOT NULL AND person.last_name IS NOT NULL THEN ' '
-                    ELSE ''
-                END ||
-                COALESCE(person.last_name, ''),
-                ', '
-            ) as artists
-                                              
-        from
-            entity asset
-            
-        inner join 
-            task on task.entity_id = asset.id
-        inner join 
-            project on task.project_id = project.id
-        inner join
-            project_status on project.project_status_id = project_status.id
-
-        inner join 
-            entity_type on asset.entity_type_id = entity_type.id
-        inner join
-            task_status on task.task_status_id = task_status.id
-        inner join
-            task_type on task.task_type_id = task_type.id
-        left outer join 
-            department on task_type.department_id = department.id 
-        left outer join
-            assignations on task.id = assignations.task
-        left outer join 
-        	person on person.id = assignations.person                  
-            
-        where
-            project_status.name in ('Open')
-        and
-        	asset.canceled = 'False'
-        and
-        	task_status.name not in ('Omit')
-        and
-        	task_type.for_entity in ('Asset')
-        group by
-        	project.name, project.code, department.name, entity_type.name, asset.name, task_type.name, task_type.short_name, task_type.color, task_type.priority, task_status.name, task_status.short_name, task_status.color 
-        order by
-        	project.name, project.code, entity_type.name, asset.name, task_type.priority 
-              
-
-
-    """,
-        con=connection,
-    )
-
+def apply_calcs(df):
+    df = load_default_calcs(df)
     return df
 
 
-logging.debug(f"loading data: {__name__}")
+def build_data(facts):
+    logging.debug(f"projecting data: {__name__}")
 
-df = load_data()
-df = load_default_calcs(df)
+    df = task_facts.asset_task_summary(facts)
+    df = apply_calcs(df)
+    return df
 
-project_list = df["project"].unique().tolist()
-department_list = df["department"].unique().tolist()
 
-# episode_list = df["episode"].unique().tolist()
-task_type_list = df["task_type"].unique().tolist()
-task_status_list = df["task_status"].unique().tolist()
-##artist_list = df["artists"].unique().tolist()
+dataset = register_projection("asset_data", task_facts.dataset, build_data)
+results = result_cache("asset_data")
 
 grid = None
 
 
-def get_nav_div():
+def get_nav_div(df):
+    project_list = df["project"].unique().tolist()
+    department_list = df["department"].unique().tolist()
+
+    # episode_list = df["episode"].unique().tolist()
+    task_type_list = df["task_type"].unique().tolist()
+    task_status_list = df["task_status"].unique().tolist()
+    ##artist_list = df["artists"].unique().tolist()
+
     return html.Div(
         className="nav-header",
         children=[
@@ -215,6 +139,11 @@ def get_nav_div():
 
 
 def layout(**kwargs):
+    if not dataset.is_ready:
+        return get_loading_layout(dataset, layout)
+
+    df = dataset.frame()
+
     return html.Div(
         [
             dbc.Card(
@@ -232,7 +161,7 @@ def layout(**kwargs):
                 style={"width": "100%", "height": "200px", "border": "1px solid black"},
                 className="nav-header",
                 children=[
-                    get_nav_div(),
+                    get_nav_div(df),
                 ],
             ),
             html.Div(
@@ -261,6 +190,7 @@ def layout(**kwargs):
     Input("asset_data_tasks_now", "n_clicks"),
     Input("asset_data_tasks_next_week", "n_clicks"),
 )
+@timed_callback
 def update_graphs(
     project,
     department,
@@ -281,25 +211,34 @@ def update_graphs(
     # `derived_virtual_data=df.to_rows('dict')` when you initialize
     # the component.
 
-    dff = df.copy()
+    # the key and the rows come from one snapshot
+    snapshot = dataset.snapshot()
+    cache_key = filter_key(
+        snapshot.version,
+        task_window(ctx, "asset_data"),
+        project=project,
+        department=department,
+        task_type=task_type,
+        task_status=task_status,
+    )
+    cached = results.get(cache_key)
+    if cached is not None:
+        lap("cache")
+        return cached
 
     current_date_time = pd.Timestamp.now()
     logging.debug(f"Current Date Time: {current_date_time}")
 
-    dff = df.copy()
+    dff = snapshot.index.select(
+        snapshot.frame,
+        project=project,
+        department=department,
+        task_type=task_type,
+        task_status=task_status,
+    )
     dff = filter_by_task_date(dff, ctx, "asset_data")
 
-    if project:
-        dff = dff[dff["project"].isin(project)]
-
-    if department:
-        dff = dff[dff["department"].isin(department)]
-
-    if task_type:
-        dff = dff[dff["task_type"].isin(task_type)]
-
-    if task_status:
-        dff = dff[dff["task_status"].isin(task_status)]
+    lap("filter")
 
     data_table = dag.AgGrid(
         id="datatable-interactivity",
@@ -312,5 +251,7 @@ def update_graphs(
         className="ag-theme-alpine-dark",
         style={"height": "600px", "width": "100%"},
     )
+    lap("serialise")
 
+    results.put(cache_key, data_table)
     return data_table
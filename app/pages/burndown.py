@@ -0,0 +1,183 @@
+import logging
+
+# Configure logging
+logging.basicConfig(
+    level=logging.DEBUG,
+    format="%(asctime)s - %(levelname)s - %(message)s",
+    datefmt="%Y-%m-%d %H:%M:%S",
+)
+
+import dash
+from dash import dcc, html, Input, Output, callback
+import dash_bootstrap_components as dbc
+
+import pandas as pd
+import plotly.express as px
+
+import status_history
+from datasets import register_dataset
+from callback_timing import timed_callback, lap
+
+from .page_nav import get_nav_filters
+from .page_loading import get_loading_layout
+
+dash.register_page(__name__, order=35, path="/burndown")
+
+MEASURES = {
+    "task_count": "Tasks",
+    "task_estimation": "Estimation (D)",
+    "task_duration": "Duration (D)",
+    "nb_frames": "Frames",
+}
+
+
+def build_data():
+    logging.debug(f"loading data: {__name__}")
+
+    # only the stored daily snapshots, never Kitsu
+    df = status_history.read_history()
+
+    # the snapshots keep estimation and duration in minutes, plot days of 8
+    # hours like calc_estimate
+    for column in ["task_estimation", "task_duration"]:
+        if column in df.columns:
+            df[column] = df[column] / 60 / 8
+    return df
+
+
+# snapshots are taken once a day, an hourly reload picks them up
+dataset = register_dataset("burndown", build_data, refresh_interval=3600)
+
+
+def get_nav_div(df):
+    project_list = df["project"].dropna().unique().tolist()
+    department_list = df["department"].dropna().unique().tolist()
+    episode_list = df["episode"].dropna().unique().tolist()
+    task_type_list = df["task_type"].dropna().unique().tolist()
+
+    return html.Div(
+        className="nav-header",
+        children=[
+            get_nav_filters(
+                "burndown",
+                project_list=project_list,
+                department_list=department_list,
+                task_type_list=task_type_list,
+                episode_list=episode_list,
+                additional_children=[
+                    dcc.RadioItems(
+                        [{"label": label, "value": value} for value, label in MEASURES.items()],
+                        value="task_count",
+                        id="burndown_measure",
+                        inline=True,
+                    ),
+                ],
+            ),
+        ],
+    )
+
+
+def layout(**kwargs):
+    if not dataset.is_ready:
+        return get_loading_layout(dataset, layout)
+
+    df = dataset.frame()
+    if df.empty:
+        return dbc.Alert(
+            "No status snapshots yet, the first is captured today after "
+            f"{status_history.STATUS_HISTORY_CAPTURE_HOUR}:00",
+            color="info",
+        )
+
+    return html.Div(
+        [
+            dbc.Card(
+                dbc.CardBody(
+                    [
+                        html.H3("Burn Down", className="card-title"),
+                    ]
+                ),
+                color="info",
+                inverse=True,
+                className="mb-2",
+            ),
+            html.Div(
+                className="nav-header",
+                children=[get_nav_div(df)],
+            ),
+            html.Div(
+                className="body",
+                children=[
+                    html.Div(
+                        id="burndown_figure",
+                        className="datatable-interactivity",
+                    ),
+                    html.Div(
+                        id="burndown_trend_figure",
+                        className="datatable-interactivity",
+                    ),
+                ],
+            ),
+        ]
+    )
+
+
+@callback(
+    Output("burndown_figure", "children"),
+    Output("burndown_trend_figure", "children"),
+
+    Input("burndown_project_combo", "value"),
+    Input("burndown_department_combo", "value"),
+    Input("burndown_task_type_combo", "value"),
+    Input("burndown_episode_combo", "value"),
+    Input("burndown_measure", "value"),
+)
+@timed_callback
+def update_graphs(project, department, task_type=None, episode=None, measure="task_count"):
+    measure = measure if measure in MEASURES else "task_count"
+
+    dff = dataset.select(
+        project=project,
+        department=department,
+        task_type=task_type,
+        episode=episode,
+    )
+
+    lap("filter")
+
+    if dff.empty:
+        return html.Div("No data to display"), None
+
+    # work left: everything not in a done status, per project and day
+    remaining = (
+        dff[~dff["is_done"].astype(bool)]
+        .groupby(["day", "project"], observed=True)[measure]
+        .sum()
+        .reset_index()
+    )
+    burndown = px.line(
+        remaining,
+        x="day",
+        y=measure,
+        color="project",
+        markers=True,
+        title=f"Remaining {MEASURES[measure]}",
+    )
+    burndown.update_layout(title_x=0.5, xaxis=dict(title=""), yaxis=dict(title=MEASURES[measure]))
+
+    by_status = dff.groupby(["day", "task_status"], observed=True)[measure].sum().reset_index()
+    colors = (
+        dff.drop_duplicates("task_status").set_index("task_status")["task_status_color"].dropna().to_dict()
+    )
+    trend = px.area(
+        by_status,
+        x="day",
+        y=measure,
+        color="task_status",
+        color_discrete_map=colors,
+        title=f"{MEASURES[measure]} by Status",
+    )
+    trend.update_layout(title_x=0.5, xaxis=dict(title=""), yaxis=dict(title=MEASURES[measure]))
+    lap("figure")
+
+    return dcc.Graph(figure=burndown), dcc.Graph(figure=trend)
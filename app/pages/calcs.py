@@ -1,4 +1,5 @@
 import logging
+import calendar
 import datetime
 import traceback
 
@@ -19,14 +20,18 @@ console_handler.setFormatter(formatter)
 # Add the handler to the logger
 logger.addHandler(console_handler)
 
+import numpy as np
 import pandas as pd
 
 def load_default_calcs(df: pd.DataFrame) -> pd.DataFrame:
 
+    # parse once, everything below and the page filters use the typed columns
+    df = parse_task_dates(df)
+
     # Calculate duration in days
     df = df.assign(
         calc_duration=lambda x: (
-            (pd.to_datetime(x.task_end_date) - pd.to_datetime(x.task_start_date)) / pd.Timedelta(days=1)
+            (x.task_end_date - x.task_start_date) / pd.Timedelta(days=1)
         ).round(2)
     )
 
@@ -36,16 +41,11 @@ def load_default_calcs(df: pd.DataFrame) -> pd.DataFrame:
     )
 
     # Status Description
-    df["status_description"] = df.apply(lambda row: get_status_description(row), axis=1)  
-    df["calc_status_color"] = df.apply(lambda row: get_status_color(row), axis=1)      
-
-    df["calc_task_real_start_date"] = df.apply(lambda row: str_parse_date(row['task_real_start_date']), axis=1)  
-    df["calc_task_end_date"] = df.apply(lambda row: str_parse_date(row['task_end_date']), axis=1)  
-    df["calc_task_start_date"] = df.apply(lambda row: str_parse_date(row['task_start_date']), axis=1)  
-    df["calc_task_due_date"] = df.apply(lambda row: str_parse_date(row['task_due_date']), axis=1)              
+    df["status_description"], df["calc_status_color"] = classify_status(df)
 
     # Standarise dates
-    #df = df.assign(calc_task_real_start_date = lambda x: str_parse_date(x['task_real_start_date']), axis=1)
+    for column in TASK_DATE_COLUMNS:
+        df[f"calc_{column}"] = format_dates(df[column])
 
     df.reindex()
     return df
@@ -55,11 +55,60 @@ def load_graph_calcs(df: pd.DataFrame) -> pd.DataFrame:
     df = df.assign(Start = lambda x: x.task_real_start_date)
     df = df.assign(Finish = lambda x: x.task_end_date)
 
-    df = df.assign(Duration = lambda x: (pd.to_datetime(x.task_real_start_date) - pd.to_datetime(x.task_end_date)))     
+    df = df.assign(Duration = lambda x: (as_datetime(x.task_real_start_date) - as_datetime(x.task_end_date)))
     df.reindex()
     return df    
 
 
+TASK_DATE_COLUMNS = [
+    "task_real_start_date",
+    "task_end_date",
+    "task_start_date",
+    "task_due_date",
+]
+
+
+def as_datetime(series: pd.Series) -> pd.Series:
+    """
+    series as datetime64, parsed only when it is not already
+    """
+    if pd.api.types.is_datetime64_any_dtype(series):
+        return series
+    return pd.to_datetime(series, errors="coerce", format="mixed")
+
+
+def parse_task_dates(df: pd.DataFrame) -> pd.DataFrame:
+    """
+    df with every task date column present as datetime64
+    """
+    untyped = [
+        column for column in TASK_DATE_COLUMNS
+        if column in df.columns and not pd.api.types.is_datetime64_any_dtype(df[column])
+    ]
+    if not untyped:
+        return df
+    return df.assign(**{column: as_datetime(df[column]) for column in untyped})
+
+
+MONTH_ABBR = np.array(calendar.month_abbr[1:], dtype=object)
+
+
+def format_dates(series: pd.Series) -> pd.Series:
+    """
+    str_parse_date for a whole datetime64 column: '%e %b %Y', or "" for NaT
+    """
+    valid = series.notna().to_numpy()
+    out = np.full(len(series), "", dtype=object)
+    if valid.any():
+        dates = series[valid]
+        out[valid] = (
+            dates.dt.day.astype(str).str.rjust(2)
+            + " " + MONTH_ABBR[dates.dt.month.to_numpy() - 1]
+            + " " + dates.dt.year.astype(str)
+        ).to_numpy()
+    return pd.Series(out, index=series.index, name=series.name)
+
+
 
 
 '''
@@ -120,6 +169,60 @@ def get_status_color(row: pd.Series) -> str:
     
     return "grey"
 
+# every label get_status_description can return, in the order it tests them
+STATUS_DESCRIPTIONS = [
+    "Started | No Start Date",
+    "Started | On Time | Scheduled",
+    "Started | LATE | Scheduled",
+    "Not Started | Overdue | Scheduled",
+    "Started | Not Scheduled",
+    "No Info",
+]
+STATUS_COLORS = [get_status_color({"status_description": label}) for label in STATUS_DESCRIPTIONS]
+STATUS_COLOR_CATEGORIES = sorted(set(STATUS_COLORS))
+
+
+def _is_falsy(series: pd.Series) -> np.ndarray:
+    """
+    not value for every value, as the row-wise checks test it (NaT and NaN
+    are truthy, None and "" are not)
+    """
+    if pd.api.types.is_datetime64_any_dtype(series):
+        return np.zeros(len(series), dtype=bool)
+    return ~series.astype(bool).to_numpy()
+
+
+def classify_status(df: pd.DataFrame):
+    """
+    get_status_description and get_status_color for every row at once, as
+    categoricals with the same labels and colors
+    """
+    active = (df["task_status"] != "Todo").to_numpy()
+    late = (df["task_real_start_date"] > df["task_start_date"]).to_numpy()
+    overdue = (df["task_due_date"] < df["task_end_date"]).to_numpy()
+    no_start = _is_falsy(df["task_real_start_date"])
+
+    codes = np.select(
+        [
+            active & no_start,
+            active & ~late & ~overdue,
+            active & late & ~overdue,
+            active & ~late & overdue,
+            active,
+        ],
+        [0, 1, 2, 3, 4],
+        default=5,
+    )
+    color_codes = np.array([STATUS_COLOR_CATEGORIES.index(color) for color in STATUS_COLORS])[codes]
+
+    description = pd.Categorical.from_codes(codes, categories=STATUS_DESCRIPTIONS)
+    color = pd.Categorical.from_codes(color_codes, categories=STATUS_COLOR_CATEGORIES)
+    return (
+        pd.Series(description, index=df.index, name="status_description"),
+        pd.Series(color, index=df.index, name="calc_status_color"),
+    )
+
+
 def str_parse_date(date_item):
     date = ""    
 
@@ -149,34 +252,46 @@ def str_parse_date(date_item):
     return date    
 
 
+TASK_WINDOWS = ("last_week", "now", "next_week")
+
+
+def task_window(ctx, prefix: str):
+    """
+    The time window button that triggered the callback, None when any
+    other input did (filter_by_task_date then keeps every row)
+    """
+    for window in TASK_WINDOWS:
+        if f"{prefix}_tasks_{window}" == ctx.triggered_id:
+            return window
+    return None
+
+
 def filter_by_task_date(dff: pd.DataFrame, ctx, prefix: str) -> pd.DataFrame:
     """
     Filter the dataframe by task date
     """
     current_date_time = pd.Timestamp.now()    
+    window = task_window(ctx, prefix)
 
-    if f"{prefix}_tasks_last_week" == ctx.triggered_id:
+    # the columns are typed by load_default_calcs, as_datetime is a no-op
+    if window == "last_week":
         start = current_date_time - pd.Timedelta(days=14)
 
         logging.debug(f"Last Week: {start}")
-        df = dff[
-            (pd.to_datetime(dff["task_due_date"], errors='coerce') <= start) |
-            (pd.to_datetime(dff["task_start_date"], errors='coerce') >= start)
+        dff = dff[
+            (as_datetime(dff["task_due_date"]) <= start) |
+            (as_datetime(dff["task_start_date"]) >= start)
         ]
-    elif f"{prefix}_tasks_now" == ctx.triggered_id:
+    elif window == "now":
         start = current_date_time
         end = current_date_time + pd.Timedelta(days=14)
 
         logging.debug(f"Now: {start} - {end}")
-        dff = dff[
-            pd.to_datetime(dff["task_due_date"], format="mixed").between(start, end)
-        ]
-    elif f"{prefix}_tasks_next_week" == ctx.triggered_id:
+        dff = dff[as_datetime(dff["task_due_date"]).between(start, end)]
+    elif window == "next_week":
         end = current_date_time + pd.Timedelta(days=14)
 
         logging.debug(f"Next Week: {end}")
-        dff = dff[pd.to_datetime(dff["task_due_date"]) <= end]
-    elif f"{prefix}_tasks_reset" == ctx.triggered_id:
-        dff.reindex()
+        dff = dff[as_datetime(dff["task_due_date"]) <= end]
 
-    return dff
\ No newline at end of file
+    return dff
@@ -0,0 +1,52 @@
+from dash import dcc, html, callback, Input, Output, MATCH, ctx, no_update
+import dash_bootstrap_components as dbc
+
+from datasets import get_dataset
+from callback_timing import timed_callback
+
+# layout functions to render once a dataset finishes loading, by dataset name
+_layouts = {}
+
+
+def get_loading_layout(dataset, layout):
+    """
+    Placeholder shown while a page dataset is still loading. Opening the
+    page starts the load if nothing has yet; the placeholder polls the
+    dataset and swaps in the real page layout once the data is in.
+    """
+    _layouts[dataset.name] = layout
+    dataset.ensure_loaded(retry=True)
+
+    message = "Loading data..."
+    if dataset.error is not None:
+        message = f"Error loading data: {dataset.error}"
+
+    return html.Div(
+        id={"type": "dataset_loading_container", "name": dataset.name},
+        children=[
+            dbc.Alert(
+                [dbc.Spinner(size="sm", spinner_class_name="me-2"), message],
+                color="warning" if dataset.error is not None else "info",
+            ),
+            dcc.Interval(
+                id={"type": "dataset_loading_interval", "name": dataset.name},
+                interval=2000,
+            ),
+        ],
+    )
+
+
+@callback(
+    Output({"type": "dataset_loading_container", "name": MATCH}, "children"),
+    Input({"type": "dataset_loading_interval", "name": MATCH}, "n_intervals"),
+)
+@timed_callback
+def update_loading(n_intervals):
+    name = ctx.triggered_id["name"]
+    dataset = get_dataset(name)
+    dataset.ensure_loaded()
+
+    if not dataset.is_ready:
+        return no_update
+
+    return _layouts[name]()
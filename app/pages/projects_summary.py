@@ -16,44 +16,14 @@ import dash_bootstrap_components as dbc
 import pandas as pd
 import plotly.express as px
 
-from database import connect
+import queries
+from database import pooled_connection, read_sql
+from datasets import register_dataset
+from callback_timing import timed_callback, lap
 
-dash.register_page(__name__, order = 10)
-
-def load_data():
-    logging.debug("loaded default table")
-
-    connection, cursor = connect()
-
-    df = pd.read_sql_query(
-        """
-select 
-	project.name as project, project_status.name as project_status, project.id, project.start_date, project.end_date, 
-    (
-    	select count(*) from task left outer join task_status on task.task_status_id = task_status.id where task.project_id = project.id
-    ) as total_tasks,
-    (
-    	select count(*) from task left outer join task_status on task.task_status_id = task_status.id where task.project_id = project.id and task_status.is_done
-    ) as completed_tasks,
-    
-    project.end_date - project.start_date as duration
-        
-from
-	project   
-left outer join 
-	project_status on project.project_status_id = project_status.id
-where
-    project_status.name in ('Open')
-group by project.name, project.id, project_status.name;
-
-    """,
-        con=connection,
-    )
+from .page_loading import get_loading_layout
 
-    # add caculated fields
-    df = df.assign(index_count=lambda x: x.id)
-    df = df.assign(perc_completed=lambda x: (x.completed_tasks / x.total_tasks * 100).round(2))
-    return df
+dash.register_page(__name__, order = 10)
 
 def add_finish_column(timeline_df: pd.DataFrame):
     logging.debug("adding calculated fields")
@@ -110,11 +80,102 @@ def create_gantt_chart(df):
 
     return fig
 
-logging.debug(f"loading data: {__name__}")
-df = load_data()
-df = add_finish_column(df)
+def apply_calcs(df):
+    # add caculated fields
+    df = df.assign(index_count=lambda x: x.id)
+    df = df.assign(perc_completed=lambda x: (x.completed_tasks / x.total_tasks * 100).round(2))
+    df = add_finish_column(df)
+    return df
+
+
+def load_data():
+    logging.debug("loaded default table")
+
+    # counters kept up to date by the progress triggers, no task scan
+    with pooled_connection() as connection:
+        df = read_sql(queries.PROJECT_PROGRESS, connection, cache=False)
+
+    df["duration"] = (pd.to_datetime(df["end_date"]) - pd.to_datetime(df["start_date"])).dt.days
+    return df
+
+
+def build_data():
+    logging.debug(f"loading data: {__name__}")
+
+    df = load_data()
+    df = apply_calcs(df)
+    return df
+
+
+def build_history():
+    """
+    Daily total and completed tasks per project, days without a change
+    carrying the previous day forward
+    """
+    with pooled_connection() as connection:
+        df = read_sql(queries.PROJECT_PROGRESS_HISTORY, connection, cache=False)
+
+    if df.empty:
+        return df.assign(perc_completed=pd.Series(dtype=float))
+
+    df["day"] = pd.to_datetime(df["day"])
+    days = pd.date_range(df["day"].min(), pd.Timestamp.today().normalize())
+
+    columns = []
+    for column in ["total_tasks", "completed_tasks"]:
+        daily = df.pivot(index="day", columns="project", values=column).reindex(days).ffill()
+        columns.append(
+            daily.rename_axis("day").reset_index().melt(id_vars="day", value_name=column).set_index(["day", "project"])
+        )
+
+    # projects only appear from their first recorded day
+    df = pd.concat(columns, axis=1).dropna().reset_index()
+    df["perc_completed"] = (df["completed_tasks"] / df["total_tasks"] * 100).round(2)
+    return df
+
+
+dataset = register_dataset("projects_summary", build_data, tables=["task", "project"])
+history_dataset = register_dataset("project_progress_history", build_history, tables=["task"])
+
+def create_history_chart(df):
+    if df.empty:
+        return html.Div("No progress history yet")
+
+    fig = px.line(
+        df,
+        x="day",
+        y="perc_completed",
+        color="project",
+        line_shape="hv",
+        title="Completion Over Time",
+    )
+    fig.update_layout(
+        title_x=0.5,
+        yaxis=dict(title="% completed", range=[0, 100]),
+        xaxis=dict(title=""),
+    )
+    return dcc.Graph(figure=fig)
+
+
+def get_history():
+    """
+    The history chart, or a note while the history is loading or cannot
+    load (e.g. the progress migration is not applied)
+    """
+    if not history_dataset.is_ready:
+        history_dataset.ensure_loaded(retry=True)
+        if history_dataset.error is not None:
+            return dbc.Alert(f"Progress history unavailable: {history_dataset.error}", color="warning")
+        return dbc.Alert("Progress history is loading, refresh the page to see it", color="info")
+
+    return create_history_chart(history_dataset.frame())
+
 
 def layout(**kwargs):
+    history_dataset.ensure_loaded(retry=True)
+    if not dataset.is_ready:
+        return get_loading_layout(dataset, layout)
+
     return html.Div(
         [
             html.Div(
@@ -142,6 +203,10 @@ def layout(**kwargs):
                         id="project_summary_figure",
                         className="datatable-interactivity",
                     ),
+                    html.Div(
+                        id="project_summary_history_figure",
+                        className="datatable-interactivity",
+                    ),
                 ],
             ),
         ]
@@ -149,11 +214,14 @@ def layout(**kwargs):
 @callback(
     Output("project_summary_datatable", "children"),
     Output("project_summary_figure", "children"),
+    Output("project_summary_history_figure", "children"),
 
     Input("project_summary_figure", "n_clicks"),
 )
 
+@timed_callback
 def update_page(n_clicks):
+    df = dataset.frame()
 
     columnsDefs = [
         {"field": "project", "headerName": "Project"},
@@ -163,6 +231,8 @@ def update_page(n_clicks):
         {"field": "total_tasks", "headerName": "Total Tasks"},
         {"field": "completed_tasks", "headerName": "Completed Tasks"},
         {"field": "perc_completed", "headerName": "%"},
+        {"field": "task_estimation", "headerName": "Estimation"},
+        {"field": "task_duration", "headerName": "Duration"},
 
     ]
 
@@ -177,10 +247,13 @@ def update_page(n_clicks):
             dashGridOptions={"animateRows": False},
             ## className="ag-theme-alpine-dark",            
         ),
+    lap("serialise")
 
     ### updated_table_as_df = add_finish_column(updated_table)
     figure = create_gantt_chart(df)
-    return data_table, dcc.Graph(figure=figure)
+    history = get_history()
+    lap("figure")
+    return data_table, dcc.Graph(figure=figure), history
 
 #@callback(
 #    Output('drilldown-link', 'href'),
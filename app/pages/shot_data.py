@@ -17,136 +17,50 @@ import numpy as np
 import pandas as pd
 
 
-from database import connect, close
+import task_facts
+from datasets import register_projection
+from result_cache import result_cache, filter_key
+from callback_timing import timed_callback, lap
 
-from .calcs import load_default_calcs, filter_by_task_date
+from .calcs import load_default_calcs, filter_by_task_date, task_window
 from .page_nav import get_nav_filters, get_task_filters
+from .page_loading import get_loading_layout
 
 
 dash.register_page(__name__, order=15, path="/shot-data")
 
 
-def load_data():
-    logging.debug("loaded default table")
-
-    connection, cursor = connect()
-    try:
-        df = pd.read_sql_query(
-            """
-            select
-                project.name as project,
-                project.code as project_code,
-                project.id as project_id,
-                department.id as department_id,
-                department.name as department,
-
-                episode.name as episode,
-                episode.id as episode_id,
-
-                task_type.name as task_type,
-                task_type.id as task_type_id,
-                task_type.short_name as task_type_code,
-
-                task_type.priority,
-                task_type.color as task_type_color,
-
-                task_status.name as task_status,
-                task_status.color as task_status_color,
-                task_status.short_name as task_status_code,
-
-                task_status.id as task_status_id,
-
-                sum(task.estimation) as task_estimation,
-                sum(task.duration) as task_duration,
-                sum(task.retake_count) as retake_count,
-                
-
-                (MIN(task.real_start_date)) AS task_real_start_date,
-                (MAX(task.end_date)) AS task_end_date,
-
-                (MIN(task.start_date)) AS task_start_date,
-                (MAX(task.due_date)) AS task_due_date,              
-
-                SUM(DISTINCT CASE
-                        WHEN shot.name = 'sh000' THEN 0
-                        ELSE shot.nb_frames
-                END) AS nb_frames,
-
-                COUNT(CASE
-                        WHEN shot.name = 'sh000' THEN 0
-                        ELSE 1
-                END) AS shot_count
-
-            FROM
-                entity shot
-            inner join
-                entity scene on shot.parent_id = scene.id
-            inner join
-                entity episode on scene.parent_id = episode.id
-            inner join
-                task on task.entity_id = shot.id
-            inner join
-                project on task.project_id = project.id
-            inner join
-                project_status on project.project_status_id = project_status.id
-            inner join
-                entity_type on shot.entity_type_id = entity_type.id
-            inner join
-                task_status on task.task_status_id = task_status.id
-            inner join
-                task_type on task.task_type_id = task_type.id
-            left outer join 
-                department on task_type.department_id = department.id
-            where
-                shot.canceled = 'False'
-            and
-                project_status.name in ('Open')
-            and
-                entity_type.name in ('Shot')
-            and
-                task_status.name not in ('Omit')
-            group by
-                project.name, project.id, project_code, 
-                department.name, department.id, 
-                episode.name, episode.id, 
-                task_type.name, task_type.color, task_type.id, task_type.short_name, task_type.priority, 
-                task_status.name, task_status.color, task_status.id, task_status.short_name
-
-            order by
-                project.code, department.name, episode.name, task_type.name, task_status.name
-                
-
-
-        """,
-            con=connection,
-        )
-
-        ##df = df.assign(index_count=lambda x: x.id)
-        ##df = df.assign(perc_completed=lambda x: (x.completed_tasks / x.total_tasks * 100).round(2))
-        ## df = add_finish_column(df)
-        return df
-    finally:
-        close(connection)
-
-
-logging.debug(f"loading data: {__name__}")
-
-
-df = load_data()
-df = load_default_calcs(df)
-
-project_list = df["project"].unique().tolist()
-department_list = df["department"].unique().tolist()
-
-episode_list = df["episode"].unique().tolist()
-task_type_list = df["task_type"].unique().tolist()
-task_status_list = df["task_status"].unique().tolist()
-##artist_list = df["artists"].unique().tolist()
+def apply_calcs(df):
+    df = load_default_calcs(df)
+    return df
+
+
+def build_data(summary):
+    logging.debug(f"projecting data: {__name__}")
+
+    df = summary.sort_values(
+        ["project_code", "department", "episode", "task_type", "task_status"],
+        ignore_index=True,
+    )
+    df = apply_calcs(df)
+    return df
+
+
+dataset = register_projection("shot_data", task_facts.shot_task_dataset, build_data)
+results = result_cache("shot_data")
 
 grid = None
 
 
-def get_nav_div():
+def get_nav_div(df):
+    project_list = df["project"].unique().tolist()
+    department_list = df["department"].unique().tolist()
+
+    episode_list = df["episode"].unique().tolist()
+    task_type_list = df["task_type"].unique().tolist()
+    task_status_list = df["task_status"].unique().tolist()
+    ##artist_list = df["artists"].unique().tolist()
+
     return html.Div(
         className="nav-header",
         children=[
@@ -164,6 +78,11 @@ def get_nav_div():
 
 
 def layout(**kwargs):
+    if not dataset.is_ready:
+        return get_loading_layout(dataset, layout)
+
+    df = dataset.frame()
+
     return html.Div(
         [
             dbc.Card(
@@ -179,7 +98,7 @@ def layout(**kwargs):
             html.Div(
                 style={"width": "100%", "height": "200px", "border": "1px solid black"},
                 className="nav-header",
-                children=[get_nav_div()],
+                children=[get_nav_div(df)],
             ),
             html.Div(children=[]),
             html.Div(
@@ -208,6 +127,7 @@ def layout(**kwargs):
     Input("shot_data_tasks_now", "n_clicks"),
     Input("shot_data_tasks_next_week", "n_clicks"),
 )
+@timed_callback
 def update_page(
     project,
     department,
@@ -228,26 +148,33 @@ def update_page(
     # `derived_virtual_data=df.to_rows('dict')` when you initialize
     # the component.
 
-    dff = df.copy()
+    # the key and the rows come from one snapshot
+    snapshot = dataset.snapshot()
+    cache_key = filter_key(
+        snapshot.version,
+        task_window(ctx, "shot_data"),
+        project=project,
+        department=department,
+        task_type=task_type,
+        task_status=task_status,
+    )
+    cached = results.get(cache_key)
+    if cached is not None:
+        lap("cache")
+        return cached
 
     current_date_time = pd.Timestamp.now()
     logging.debug(f"Current Date Time: {current_date_time}")
 
-    dff = df.copy()
+    dff = snapshot.index.select(
+        snapshot.frame,
+        project=project,
+        department=department,
+        task_type=task_type,
+        task_status=task_status,
+    )
     dff = filter_by_task_date(dff, ctx, "shot_data")
 
-    if project:
-        dff = dff[dff["project"].isin(project)]
-
-    if department:
-        dff = dff[dff["department"].isin(department)]
-
-    if task_type:
-        dff = dff[dff["task_type"].isin(task_type)]
-
-    if task_status:
-        dff = dff[dff["task_status"].isin(task_status)]
-
     # Add additional filters for task_type, task_status, artist if needed
 
     columnsDefs = [
@@ -314,6 +241,8 @@ def update_page(
 
     defaultColDef = {"editable": True, "filter": True}
 
+    lap("filter")
+
     data_table = dag.AgGrid(
         id="datatable-interactivity",
         persistence=True,
@@ -324,5 +253,7 @@ def update_page(
         style={"height": "600px", "width": "100%"},
         className="ag-theme-alpine-dark",
     )
+    lap("serialise")
 
+    results.put(cache_key, data_table)
     return data_table
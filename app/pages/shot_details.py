@@ -17,8 +17,11 @@ import plotly.express as px
 
 from .calcs import load_default_calcs, filter_by_task_date
 from .page_nav import get_nav_filters, get_episode_filter, get_task_filters
+from .page_loading import get_loading_layout
 
-from database import connect
+import task_facts
+from datasets import register_projection
+from callback_timing import timed_callback, lap
 
 dash.register_page(__name__, order=40, path="/shot-details")
 
@@ -110,120 +113,40 @@ DATA_TABLE_STYLE = {
 }
 
 
-def load_data():
-    logging.debug("loaded default table")
-
-    connection, cursor = connect()
-
-    df = pd.read_sql_query(
-        """
-          select
-              project.name as project,
-              project.code as project_code,
-
-              project.id as project_id,
-              department.id as department_id,
-              department.name as department,
-
-              episode.name as episode,
-              episode.id as episode_id,
-
-              task_type.name as task_type,
-              task_type.id as task_type_id,
-              task_type.priority,
-              task_type.short_name as task_type_code,
-
-              task_status.name as task_status,
-              task_status.id as task_status_id,
-              task_status.short_name as task_status_code,
-
-              sum(task.estimation) as task_estimation,
-              sum(task.duration) as task_duration,
-              sum(task.retake_count) as retake_count,
-
-              (MIN(task.real_start_date)) AS task_real_start_date,
-              (MAX(task.end_date)) AS task_end_date,
-
-              (MIN(task.start_date)) AS task_start_date,
-              (MAX(task.due_date)) AS task_due_date,              
-
-              SUM(DISTINCT CASE
-                      WHEN shot.name = 'sh000' THEN 0
-                      ELSE shot.nb_frames
-              END) AS nb_frames,
-
-              COUNT(CASE
-                      WHEN shot.name = 'sh000' THEN 0
-                      ELSE 1
-              END) AS shot_count
-
-          FROM
-              entity shot
-          inner join
-              entity scene on shot.parent_id = scene.id
-          inner join
-              entity episode on scene.parent_id = episode.id
-          inner join
-              task on task.entity_id = shot.id
-          inner join
-              project on task.project_id = project.id
-          inner join
-          	  project_status on project.project_status_id = project_status.id
-          inner join
-              entity_type on shot.entity_type_id = entity_type.id
-          inner join
-              task_status on task.task_status_id = task_status.id
-          inner join
-              task_type on task.task_type_id = task_type.id
-          left outer join 
-              department on task_type.department_id = department.id
-          where
-              shot.canceled = 'False'
-          and
-          	  project_status.name in ('Open')
-          and
-              entity_type.name in ('Shot')
-          and
-              task_status.name not in ('Omit')
-          group by
-              project.name, project.id, 
-              department.name, department.id, 
-              episode.name, episode.id, 
-              task_type.name, task_type.id, task_type.priority, task_type.short_name,
-              task_status.name, task_status.id, task_status.short_name
-
-          order by
-              project.name, department.name, episode.name, task_type.name, task_status.name, task_real_start_date, task_end_date
-
-    """,
-        con=connection,
-    )
-
-    ##df = df.assign(index_count=lambda x: x.id)
-    ##df = df.assign(perc_completed=lambda x: (x.completed_tasks / x.total_tasks * 100).round(2))
-    ## df = add_finish_column(df)
+def apply_calcs(df):
+    df = load_default_calcs(df)
     return df
 
 
-logging.debug(f"loading data: {__name__}")
-df = load_data()
-df = load_default_calcs(df)
+def build_data(summary):
+    logging.debug(f"projecting data: {__name__}")
+
+    df = summary.sort_values(
+        ["project", "department", "episode", "task_type", "task_status", "task_real_start_date", "task_end_date"],
+        ignore_index=True,
+    )
+    df = apply_calcs(df)
+    return df
 
-# Just open projects for now
-# df = df[df['project_status'] == "Open"]
 
-# nav lookups
-project_list = df["project"].unique().tolist()
-department_list = df["department"].unique().tolist()
+dataset = register_projection("shot_details", task_facts.shot_task_dataset, build_data)
 
-episode_list = df["episode"].unique().tolist()
-task_type_list = df["task_type"].unique().tolist()
-task_status_list = df["task_status"].unique().tolist()
-# artist_list = df["artists"].unique().tolist()
 grid = None
 
 
-def get_nav_div():
+def get_nav_div(df):
+    # Just open projects for now
+    # df = df[df['project_status'] == "Open"]
+
+    # nav lookups
+    project_list = df["project"].unique().tolist()
+    department_list = df["department"].unique().tolist()
+
+    episode_list = df["episode"].unique().tolist()
+    task_type_list = df["task_type"].unique().tolist()
+    task_status_list = df["task_status"].unique().tolist()
+    # artist_list = df["artists"].unique().tolist()
+
     return html.Div(
         className="nav-header",
         children=[
@@ -241,6 +164,11 @@ def get_nav_div():
 
 
 def layout(**kwargs):
+    if not dataset.is_ready:
+        return get_loading_layout(dataset, layout)
+
+    df = dataset.frame()
+
     return html.Div(
         [
             dbc.Card(
@@ -257,7 +185,7 @@ def layout(**kwargs):
             html.Div(
                 className="nav-header",
                 style={"height": "300px"},
-                children=[get_nav_div()],
+                children=[get_nav_div(df)],
             ),
             html.Div(
                 className="body",
@@ -282,13 +210,10 @@ def layout(**kwargs):
 #    Input("shot_details_department_combo", "value"),
 #)
 def update_filters(project, department):
-    dff = df.copy()
-
-    if project:
-        dff = dff[dff["project"].isin(project)]
-
-    if department:
-        dff = dff[dff["department"].isin(department)]
+    dff = dataset.select(
+        project=project,
+        department=department,
+    )
 
     episode_list = dff["episode"].unique().tolist()
 
@@ -304,28 +229,19 @@ def update_filters(project, department):
     Input("shot_details_episode_combo", "value"),
     Input("shot_details_task_type_combo", "value"),
 )
+@timed_callback
 def update_graphs(
     project, department, episode=None, task_type=None, task_status=None, artist=None
 ):
-    dff = df.copy()
-
-    if project:
-        dff = dff[dff["project"].isin(project)]
-
-    if department:
-        dff = dff[dff["department"].isin(department)]
-
-    if episode:
-        dff = dff[dff["episode"].isin(episode)]
-
-    if task_type:
-        dff = dff[dff["task_type"].isin(task_type)]
-
-    if task_status:
-        dff = dff[dff["task_status"].isin(task_status)]
+    dff = dataset.select(
+        project=project,
+        department=department,
+        episode=episode,
+        task_type=task_type,
+        task_status=task_status,
+    )
 
-    if episode:
-        dff = dff[dff["episode"].isin(episode)]
+    lap("filter")
 
     # Add additional filters for task_type, task_status, artist if needed
     data_table = dash_table.DataTable(
@@ -352,6 +268,7 @@ def update_graphs(
         page_current=0,
         page_size=20,
     )
+    lap("serialise")
 
     # Drop rows without task_start_date and task_end_date
     # summary_df = dff.dropna(
@@ -382,6 +299,7 @@ def update_graphs(
                 pd.Grouper(key="task_end_date", freq="D"),
             ],
             ## dropna=True,
+            observed=True,
         )
         .sum(numeric_only=True)
         .reset_index()
@@ -414,4 +332,5 @@ def update_graphs(
     # summary_df = summary_df.assign(Finish = lambda x: pd.to_datetime(x.task_end_date))
     # summary_df = summary_df.assign(Duration = lambda x: (pd.to_datetime(x.task_end_date) - pd.to_datetime(x.task_start_date)))
     # fig = px.bar(summary_df, x="nb_frames", y="shot_count", color="task_duration", barmode="group")
+    lap("figure")
     return data_table, dcc.Graph(figure=fig)
@@ -14,9 +14,13 @@ import dash_bootstrap_components as dbc
 import pandas as pd
 import plotly.express as px
 
-from database import connect
+import queries
+from database import pooled_connection, read_sql
+from datasets import register_dataset, Delta
+from callback_timing import timed_callback, lap
 
 from .page_nav import get_nav_filters
+from .page_loading import get_loading_layout
 from .calcs import load_default_calcs, get_status_description, filter_by_task_date
 
 dash.register_page(__name__, order=60, path="/task-comments")
@@ -24,76 +28,8 @@ dash.register_page(__name__, order=60, path="/task-comments")
 def load_data():
     logging.debug("loaded default table")
 
-    connection, cursor = connect()
-
-    df = pd.read_sql_query(
-        """
-		select distinct 
-            project.name as project,
-            department.name as department,
-
-            episode.name as episode,    
-            scene.name as scene,
-            shot.name as shot, 
-            
-            task_type.name as task_type,   
-            task_type.priority as task_priority,
-            task_status.name as task_status,  
-
-            task.start_date as task_start_date,
-            task.due_date as task_end_date,   
-            
-            comment.text as comment_text,
-            comment.data as comment_data,
-            comment.checklist as comment_checklist,
-            
-            preview_file.id as preview_file_id,
-
-            task_type.color as task_type_color,
-            task_status.color as task_status_color,            
-            
-            strpos(comment.text, 'Artist: ') as artpost,
-
-            task.last_comment_date
-            
-        from
-            entity shot
-            
-        inner join
-            entity scene on shot.parent_id = scene.id
-        inner join
-            entity episode on scene.parent_id = episode.id    
-        inner join 
-            task on task.entity_id = shot.id
-        inner join 
-            project on task.project_id = project.id
-        inner join 
-            project_status on project.project_status_id = project_status.id
-        inner join 
-            comment on task.id = comment.object_id
-        left outer join
-            comment_preview_link on comment.id = comment_preview_link.comment
-        left outer join
-        	preview_file on comment_preview_link.preview_file = preview_file.id
-        inner join 
-            entity_type on shot.entity_type_id = entity_type.id
-        inner join
-            task_status on task.task_status_id = task_status.id
-        inner join
-            task_type on task.task_type_id = task_type.id
-        inner join 
-            department on task_type.department_id = department.id 
-        inner join 
-            assignations on task.id = assignations.task
-        inner join person 
-            on person.id = assignations.person  
-        where
-            project_status.name in ('Open')
-
-           
-    """,
-        con=connection,
-    )
+    with pooled_connection() as connection:
+        df = read_sql(queries.TASK_COMMENTS, connection)
 
     ##df = df.assign(index_count=lambda x: x.id)
     ##df = df.assign(perc_completed=lambda x: (x.completed_tasks / x.total_tasks * 100).round(2))
@@ -101,24 +37,40 @@ def load_data():
     return df
 
 
-logging.debug(f"loading data: {__name__}")
-df = load_data()
+def build_data():
+    logging.debug(f"loading data: {__name__}")
 
-# Just open projects for now
-# df = df[df['project_status'] == "Open"]
+    df = load_data()
+    return df
 
-# nav lookups
-project_list = df["project"].unique().tolist()
-department_list = df["department"].unique().tolist()
 
-episode_list = df["episode"].unique().tolist()
-task_type_list = df["task_type"].unique().tolist()
-task_status_list = df["task_status"].unique().tolist()
-# artist_list = df["artists"].unique().tolist()
+dataset = register_dataset(
+    "task_comments",
+    build_data,
+    tables=["task", "comment", "entity", "assignations", "project"],
+    delta=Delta(
+        queries.TASK_COMMENTS,
+        key_columns=["task_id"],
+        changed_keys_sql=queries.COMMENT_CHANGED_KEYS,
+    ),
+)
+
 grid = None
 
 
-def get_nav_div():
+def get_nav_div(df):
+    # Just open projects for now
+    # df = df[df['project_status'] == "Open"]
+
+    # nav lookups
+    project_list = df["project"].unique().tolist()
+    department_list = df["department"].unique().tolist()
+
+    episode_list = df["episode"].unique().tolist()
+    task_type_list = df["task_type"].unique().tolist()
+    task_status_list = df["task_status"].unique().tolist()
+    # artist_list = df["artists"].unique().tolist()
+
     return html.Div(
         className="nav-header",
         children=[
@@ -134,6 +86,11 @@ def get_nav_div():
 
 
 def layout(**kwargs):
+    if not dataset.is_ready:
+        return get_loading_layout(dataset, layout)
+
+    df = dataset.frame()
+
     return html.Div(
         [
             dbc.Card(
@@ -150,7 +107,7 @@ def layout(**kwargs):
             html.Div(
                 className="nav-header",
                 style={"height": "250px"},
-                children=[get_nav_div()],
+                children=[get_nav_div(df)],
             ),
             html.Div(
                 className="body",
@@ -175,13 +132,10 @@ def layout(**kwargs):
 #    Input("department", "value"),
 #)
 def update_filters(project, department):
-    dff = df.copy()
-
-    if project:
-        dff = dff[dff["project"].isin(project)]
-
-    if department:
-        dff = dff[dff["department"].isin(department)]
+    dff = dataset.select(
+        project=project,
+        department=department,
+    )
 
     episode_list = dff["episode"].unique().tolist()
 
@@ -201,35 +155,26 @@ def update_filters(project, department):
     Input("episode", "value"),
     Input("task_type", "value"),
 )
+@timed_callback
 def update_graphs(
     project, department, episode=None, task_type=None, task_status=None, artist=None
 ):
-    dff = df.copy()
-
-    if project:
-        dff = dff[dff["project"].isin(project)]
-
-    if department:
-        dff = dff[dff["department"].isin(department)]
-
-    if episode:
-        dff = dff[dff["episode"].isin(episode)]
-
-    if task_type:
-        dff = dff[dff["task_type"].isin(task_type)]
-
-    if task_status:
-        dff = dff[dff["task_status"].isin(task_status)]
+    dff = dataset.select(
+        project=project,
+        department=department,
+        episode=episode,
+        task_type=task_type,
+        task_status=task_status,
+    )
 
-    if episode:
-        dff = dff[dff["episode"].isin(episode)]
+    lap("filter")
 
     # Add additional filters for task_type, task_status, artist if needed
     data_table = dash_table.DataTable(
         id="datatable-interactivity",
         columns=[
             {"name": i, "id": i, "deletable": True, "selectable": True}
-            for i in df.columns
+            for i in dff.columns
         ],
         data=dff.to_dict("records"),
         editable=True,
@@ -245,6 +190,7 @@ def update_graphs(
         page_current=0,
         page_size=10,
     )
+    lap("serialise")
 
     # Drop rows without task_start_date and task_end_date
     # summary_df = dff.dropna(
@@ -275,6 +221,7 @@ def update_graphs(
                 pd.Grouper(key="task_end_date", freq="D"),
             ],
             ## dropna=True,
+            observed=True,
         )
         .sum(numeric_only=True)
         .reset_index()
@@ -307,4 +254,5 @@ def update_graphs(
     # summary_df = summary_df.assign(Finish = lambda x: pd.to_datetime(x.task_end_date))
     # summary_df = summary_df.assign(Duration = lambda x: (pd.to_datetime(x.task_end_date) - pd.to_datetime(x.task_start_date)))
     # fig = px.bar(summary_df, x="nb_frames", y="shot_count", color="task_duration", barmode="group")
+    lap("figure")
     return data_table, dcc.Graph(figure=fig)
@@ -0,0 +1,351 @@
+# -*- coding: utf-8 -*-
+
+# SQL for the page datasets, kept apart from the Dash pages so loaders,
+# caches and benchmarks can run them without importing the pages
+
+# Task facts: one row per task of an open project, carrying only ids and
+# measures, plus the small dimension tables the ids resolve against. The
+# page frames are projected from these in app/task_facts.py.
+
+TASK_FACTS = """
+select
+    task.id as task_id,
+    task.project_id,
+    task.task_type_id,
+    task.task_status_id,
+
+    task.entity_id,
+    entity.name as entity_name,
+    entity.entity_type_id,
+    entity.canceled,
+    entity.nb_frames,
+
+    parent.id as parent_id,
+    parent.name as parent_name,
+    gran.id as gran_id,
+    gran.name as gran_name,
+
+    task.estimation as task_estimation,
+    task.duration as task_duration,
+    task.retake_count,
+
+    task.start_date as task_start_date,
+    task.due_date as task_due_date,
+    task.real_start_date as task_real_start_date,
+    task.end_date as task_end_date
+from
+    task
+inner join
+    entity on task.entity_id = entity.id
+left outer join
+    entity parent on entity.parent_id = parent.id
+left outer join
+    entity gran on parent.parent_id = gran.id
+inner join
+    project on task.project_id = project.id
+inner join
+    project_status on project.project_status_id = project_status.id
+where
+    project_status.name in ('Open')
+"""
+
+TASK_ASSIGNMENTS = """
+select
+    assignations.task as task_id,
+    assignations.person as person_id
+from
+    assignations
+inner join
+    task on task.id = assignations.task
+inner join
+    project on task.project_id = project.id
+inner join
+    project_status on project.project_status_id = project_status.id
+where
+    project_status.name in ('Open')
+"""
+
+# latest working file per task and person, output file per entity, person
+# and task type, from the index tables kept by
+# app/migrations/0004_latest_files.sql
+LATEST_WORKING_FILES = """
+select
+    latest.task_id,
+    latest.person_id,
+    latest.name as working_file_name,
+    latest.updated_at as working_file_published_at
+from
+    swing_stats_latest_working_file as latest
+inner join
+    task on task.id = latest.task_id
+inner join
+    project on task.project_id = project.id
+inner join
+    project_status on project.project_status_id = project_status.id
+where
+    project_status.name in ('Open')
+"""
+
+LATEST_OUTPUT_FILES = """
+select
+    latest.entity_id,
+    latest.person_id,
+    latest.task_type_id,
+    latest.name as output_file_name,
+    latest.updated_at as output_file_published_at
+from
+    swing_stats_latest_output_file as latest
+inner join
+    entity on entity.id = latest.entity_id
+inner join
+    project on entity.project_id = project.id
+inner join
+    project_status on project.project_status_id = project_status.id
+where
+    project_status.name in ('Open')
+"""
+
+PROJECT_DIM = """
+select
+    project.id as project_id,
+    project.name as project,
+    project.code as project_code,
+    project_status.name as project_status,
+    project.start_date,
+    project.end_date
+from
+    project
+left outer join
+    project_status on project.project_status_id = project_status.id
+where
+    project_status.name in ('Open')
+"""
+
+TASK_TYPE_DIM = """
+select
+    task_type.id as task_type_id,
+    task_type.name as task_type,
+    task_type.short_name as task_type_code,
+    task_type.color as task_type_color,
+    task_type.priority,
+    task_type.for_entity,
+    task_type.department_id,
+    department.name as department
+from
+    task_type
+left outer join
+    department on task_type.department_id = department.id
+"""
+
+TASK_STATUS_DIM = """
+select
+    task_status.id as task_status_id,
+    task_status.name as task_status,
+    task_status.short_name as task_status_code,
+    task_status.color as task_status_color,
+    task_status.is_done
+from
+    task_status
+"""
+
+ENTITY_TYPE_DIM = """
+select
+    entity_type.id as entity_type_id,
+    entity_type.name as entity_type
+from
+    entity_type
+"""
+
+PERSON_DIM = """
+select
+    person.id as person_id,
+    COALESCE(person.first_name, '') ||
+    CASE
+        WHEN person.first_name IS NOT NULL AND person.last_name IS NOT NULL THEN ' '
+        ELSE ''
+    END ||
+    COALESCE(person.last_name, '') as artist
+from
+    person
+"""
+
+TASK_COMMENTS = """
+select distinct 
+    project.name as project,
+    department.name as department,
+
+    episode.name as episode,    
+    scene.name as scene,
+    shot.name as shot, 
+
+    task.id as task_id,
+    task_type.name as task_type,   
+    task_type.priority as task_priority,
+    task_status.name as task_status,  
+
+    task.start_date as task_start_date,
+    task.due_date as task_end_date,   
+
+    comment.text as comment_text,
+    comment.data as comment_data,
+    comment.checklist as comment_checklist,
+
+    preview_file.id as preview_file_id,
+
+    task_type.color as task_type_color,
+    task_status.color as task_status_color,            
+
+    strpos(comment.text, 'Artist: ') as artpost,
+
+    task.last_comment_date
+
+from
+    entity shot
+
+inner join
+    entity scene on shot.parent_id = scene.id
+inner join
+    entity episode on scene.parent_id = episode.id    
+inner join 
+    task on task.entity_id = shot.id
+inner join 
+    project on task.project_id = project.id
+inner join 
+    project_status on project.project_status_id = project_status.id
+inner join 
+    comment on task.id = comment.object_id
+left outer join
+    comment_preview_link on comment.id = comment_preview_link.comment
+left outer join
+    preview_file on comment_preview_link.preview_file = preview_file.id
+inner join 
+    entity_type on shot.entity_type_id = entity_type.id
+inner join
+    task_status on task.task_status_id = task_status.id
+inner join
+    task_type on task.task_type_id = task_type.id
+inner join 
+    department on task_type.department_id = department.id 
+inner join 
+    assignations on task.id = assignations.task
+inner join person 
+    on person.id = assignations.person  
+where
+    project_status.name in ('Open')
+"""
+
+# Project progress counters kept by the triggers in
+# app/migrations/0003_project_progress.sql, read by projects_summary
+
+PROJECT_PROGRESS = """
+select
+    project.name as project,
+    project_status.name as project_status,
+    project.id,
+    project.start_date,
+    project.end_date,
+    coalesce(sum(progress.task_count), 0) as total_tasks,
+    coalesce(sum(progress.task_count) filter (where task_status.is_done), 0) as completed_tasks,
+    coalesce(sum(progress.estimation), 0) as task_estimation,
+    coalesce(sum(progress.duration), 0) as task_duration
+from
+    project
+left outer join
+    project_status on project.project_status_id = project_status.id
+left outer join
+    swing_stats_project_progress as progress on progress.project_id = project.id
+left outer join
+    task_status on progress.task_status_id = task_status.id
+where
+    project_status.name in ('Open')
+group by
+    project.id, project.name, project_status.name, project.start_date, project.end_date
+"""
+
+PROJECT_PROGRESS_HISTORY = """
+select
+    history.day,
+    project.name as project,
+    sum(history.task_count) as total_tasks,
+    coalesce(sum(history.task_count) filter (where task_status.is_done), 0) as completed_tasks
+from
+    swing_stats_project_progress_history as history
+inner join
+    project on history.project_id = project.id
+inner join
+    project_status on project.project_status_id = project_status.id
+left outer join
+    task_status on history.task_status_id = task_status.id
+where
+    project_status.name in ('Open')
+group by
+    history.day, project.name
+order by
+    history.day
+"""
+
+# Delta refresh: the keys of page rows touched by changes since %(since)s.
+# The query is re-run for just these keys and the rows swapped in; keys it
+# no longer returns rows for (deleted, or their project closed) drop out.
+# Deletions are found through the tombstones in
+# app/migrations/0005_deleted_rows.sql, assignment changes through
+# 0007_assignation_changes.sql, opened and closed projects through
+# project.updated_at.
+
+DELTA_WATERMARK = """
+select greatest(
+    (select max(updated_at) from task),
+    (select max(updated_at) from comment),
+    (select max(updated_at) from entity),
+    (select max(updated_at) from project),
+    (select max(updated_at) from working_file),
+    (select max(updated_at) from output_file),
+    (select max(deleted_at) from swing_stats_deleted_row),
+    (select max(changed_at) from swing_stats_assignation_change)
+) as watermark
+"""
+
+TASK_FACTS_CHANGED_KEYS = """
+select task.id as task_id from task where task.updated_at > %(since)s
+union
+select task.id from task inner join entity on task.entity_id = entity.id where entity.updated_at > %(since)s
+union
+select working_file.task_id from working_file where working_file.updated_at > %(since)s
+union
+select
+    task.id
+from
+    output_file
+inner join
+    task on task.entity_id = output_file.entity_id and task.task_type_id = output_file.task_type_id
+where
+    output_file.updated_at > %(since)s
+union
+select task.id from task inner join project on task.project_id = project.id where project.updated_at > %(since)s
+union
+select key_id from swing_stats_deleted_row where table_name = 'task' and deleted_at > %(since)s
+union
+select task_id from swing_stats_assignation_change where changed_at > %(since)s
+"""
+
+COMMENT_CHANGED_KEYS = """
+select comment.object_id as task_id from comment where comment.updated_at > %(since)s
+union
+select task.id from task where task.updated_at > %(since)s
+union
+select task.id from task inner join project on task.project_id = project.id where project.updated_at > %(since)s
+union
+select key_id from swing_stats_deleted_row where deleted_at > %(since)s
+union
+select task_id from swing_stats_assignation_change where changed_at > %(since)s
+"""
+
+
+def name_of(sql):
+    """
+    The name sql is defined under in this module, or "adhoc"
+    """
+    for name, value in globals().items():
+        if name.isupper() and isinstance(value, str) and value == sql:
+            return name
+    return "adhoc"
@@ -0,0 +1,178 @@
+# -*- coding: utf-8 -*-
+
+# Disk cache of query result frames so a restart with an unchanged Kitsu
+# database loads from local Arrow files instead of re-running the joins
+import os
+import json
+import hashlib
+import threading
+
+import logging
+log = logging.getLogger(__name__)
+
+try:
+    import pyarrow as pa
+    import pyarrow.feather as feather
+except ImportError:
+    pa = None
+    feather = None
+
+from settings import QUERY_CACHE_DIR, QUERY_CACHE_ENABLED
+
+# Anything that changes a page result bumps one of these. Deleted tasks and
+# comments and assignment changes leave no updated_at behind, they are
+# found through the tables app/migrations 0005 and 0007 keep.
+WATERMARK_SQL = """
+select
+    (select max(updated_at) from task),
+    (select max(created_at) from comment),
+    (select max(updated_at) from comment),
+    (select max(updated_at) from entity),
+    (select max(updated_at) from project),
+    (select max(updated_at) from person),
+    (select max(updated_at) from task_type),
+    (select max(updated_at) from task_status),
+    (select max(updated_at) from department),
+    (select max(updated_at) from working_file),
+    (select max(updated_at) from output_file),
+    (select max(deleted_at) from swing_stats_deleted_row),
+    (select max(changed_at) from swing_stats_assignation_change)
+"""
+
+_lock = threading.Lock()
+
+# watermarks already read inside an exported snapshot, by snapshot id
+_snapshot_watermarks = {}
+
+_warned = False
+
+
+def is_enabled():
+    if not QUERY_CACHE_ENABLED:
+        return False
+
+    if feather is None:
+        global _warned
+        if not _warned:
+            _warned = True
+            log.warning("pyarrow is not installed, query cache disabled")
+        return False
+
+    return True
+
+
+def get_watermark(connection, snapshot_id=None):
+    """
+    Fingerprint of the reporting database contents, read on connection so
+    it matches the snapshot the query itself will see. Connections sharing
+    an exported snapshot only read it once.
+    """
+    if snapshot_id and snapshot_id in _snapshot_watermarks:
+        return _snapshot_watermarks[snapshot_id]
+
+    with connection.cursor() as cursor:
+        cursor.execute(WATERMARK_SQL)
+        row = cursor.fetchone()
+    watermark = hashlib.sha1(repr(row).encode("utf-8")).hexdigest()
+
+    if snapshot_id:
+        with _lock:
+            if len(_snapshot_watermarks) > 16:
+                _snapshot_watermarks.clear()
+            _snapshot_watermarks[snapshot_id] = watermark
+    return watermark
+
+
+def _sql_key(sql, params=None):
+    return hashlib.sha1(f"{sql}\n{params!r}".encode("utf-8")).hexdigest()
+
+
+def _path(sql_key, watermark):
+    return os.path.join(QUERY_CACHE_DIR, f"{sql_key}-{watermark}.arrow")
+
+
+def load(sql, watermark, params=None):
+    """
+    Cached frame for sql at watermark, or None
+    """
+    path = _path(_sql_key(sql, params), watermark)
+    if not os.path.exists(path):
+        return None
+
+    try:
+        table = feather.read_table(path, memory_map=True)
+        df = table.to_pandas()
+        json_columns = json.loads((table.schema.metadata or {}).get(b"json_columns", b"[]"))
+        for column in json_columns:
+            df[column] = df[column].map(json.loads, na_action="ignore")
+    except Exception:
+        log.warning(f"Unreadable query cache file, ignoring: {path}", exc_info=True)
+        return None
+
+    log.debug(f"query cache hit: {os.path.basename(path)} rows={len(df)}")
+    return df
+
+
+def _is_json_column(series):
+    if series.dtype != object:
+        return False
+
+    values = series.dropna()
+    return not values.empty and isinstance(values.iloc[0], (dict, list))
+
+
+def store(sql, watermark, df, params=None):
+    """
+    Write df to the cache and drop older entries for the same query
+    """
+    sql_key = _sql_key(sql, params)
+    path = _path(sql_key, watermark)
+    temp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+
+    try:
+        os.makedirs(QUERY_CACHE_DIR, exist_ok=True)
+
+        # json / jsonb columns hold dicts and lists, store them as text so
+        # arrow does not coerce them into a struct type
+        json_columns = [column for column in df.columns if _is_json_column(df[column])]
+        if json_columns:
+            df = df.assign(**{
+                column: df[column].map(json.dumps, na_action="ignore")
+                for column in json_columns
+            })
+
+        table = pa.Table.from_pandas(df, preserve_index=False)
+        table = table.replace_schema_metadata({
+            **(table.schema.metadata or {}),
+            b"json_columns": json.dumps(json_columns).encode("utf-8"),
+        })
+        feather.write_feather(table, temp_path, compression="uncompressed")
+        os.replace(temp_path, path)
+    except Exception:
+        # e.g. json columns arrow cannot infer a type for, just don't cache
+        log.warning(f"Could not cache query result: {sql_key}", exc_info=True)
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+        return
+
+    with _lock:
+        for name in os.listdir(QUERY_CACHE_DIR):
+            if name.startswith(f"{sql_key}-") and name.endswith(".arrow") and name != os.path.basename(path):
+                try:
+                    os.remove(os.path.join(QUERY_CACHE_DIR, name))
+                except OSError:
+                    pass
+
+    log.debug(f"query cache stored: {os.path.basename(path)} rows={len(df)}")
+
+
+def clear():
+    """
+    Remove every cached query result
+    """
+    if not os.path.isdir(QUERY_CACHE_DIR):
+        return
+
+    for name in os.listdir(QUERY_CACHE_DIR):
+        if name.endswith(".arrow"):
+            os.remove(os.path.join(QUERY_CACHE_DIR, name))
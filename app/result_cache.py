@@ -0,0 +1,151 @@
+# -*- coding: utf-8 -*-
+
+# In memory cache of page callback results. Users flip between the same
+# few combo selections all day, so each page keeps its last results keyed
+# by the filter state: the combo values (order and duplicates ignored), the
+# time window button and the version of the dataset filtered. A repeated
+# state returns the finished components without filtering or building the
+# grid rows again. Entries go least recently used first once a page has
+# RESULT_CACHE_SIZE, and expire after RESULT_CACHE_TTL seconds, which also
+# bounds how stale the "now" windows get.
+import json
+import time
+import hashlib
+import threading
+
+from collections import OrderedDict
+
+import logging
+log = logging.getLogger(__name__)
+
+import metrics
+from settings import RESULT_CACHE_SIZE, RESULT_CACHE_TTL
+
+RESULT_CACHE_EVENTS = metrics.counter(
+    "swing_stats_result_cache_events_total",
+    "Page result cache lookups and evictions: hit, miss, expired, evicted",
+    ["cache", "event"],
+)
+RESULT_CACHE_ENTRIES = metrics.gauge(
+    "swing_stats_result_cache_entries",
+    "Results held by a page result cache",
+    ["cache"],
+)
+
+
+def _canonical(values):
+    """
+    A combo value as a sorted list of its distinct values, None when
+    nothing is selected
+    """
+    if not values:
+        return None
+    if isinstance(values, (str, int, float)):
+        values = [values]
+    # None (empty rows) sorts first, apart from the names
+    return sorted(set(values), key=lambda value: (value is not None, str(value)))
+
+
+def filter_key(version, window=None, **selections):
+    """
+    Hash of a filter state, the same whatever the order of the combo values
+    """
+    state = {
+        "version": version,
+        "window": window,
+        "selections": {name: _canonical(values) for name, values in selections.items()},
+    }
+    text = json.dumps(state, sort_keys=True, default=str)
+    return hashlib.sha1(text.encode("utf-8")).hexdigest()
+
+
+class ResultCache:
+    """
+    LRU of results with a time to live, safe to share between request
+    threads
+    """
+
+    def __init__(self, name, size=RESULT_CACHE_SIZE, ttl=RESULT_CACHE_TTL):
+        self.name = name
+        self.size = size
+        self.ttl = ttl
+
+        self.hits = 0
+        self.misses = 0
+
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    @property
+    def enabled(self):
+        return self.size > 0 and self.ttl > 0
+
+    def get(self, key):
+        """
+        The result stored under key, or None
+        """
+        if not self.enabled:
+            return None
+
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and time.monotonic() - entry[0] > self.ttl:
+                del self._entries[key]
+                RESULT_CACHE_EVENTS.inc(cache=self.name, event="expired")
+                entry = None
+
+            if entry is None:
+                self.misses += 1
+                RESULT_CACHE_EVENTS.inc(cache=self.name, event="miss")
+                return None
+
+            self._entries.move_to_end(key)
+            self.hits += 1
+        RESULT_CACHE_EVENTS.inc(cache=self.name, event="hit")
+        return entry[1]
+
+    def put(self, key, result):
+        if not self.enabled:
+            return
+
+        with self._lock:
+            self._entries[key] = (time.monotonic(), result)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.size:
+                self._entries.popitem(last=False)
+                RESULT_CACHE_EVENTS.inc(cache=self.name, event="evicted")
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+            }
+
+
+_caches = {}
+
+
+def result_cache(name, size=RESULT_CACHE_SIZE, ttl=RESULT_CACHE_TTL):
+    """
+    The ResultCache of a page, created on first use
+    """
+    cache = _caches.get(name)
+    if cache is None:
+        cache = _caches.setdefault(name, ResultCache(name, size, ttl))
+    return cache
+
+
+def _collect_result_cache_metrics():
+    for name, cache in list(_caches.items()):
+        RESULT_CACHE_ENTRIES.set(len(cache._entries), cache=name)
+
+
+metrics.register_collector(_collect_result_cache_metrics)
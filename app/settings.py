@@ -1,3 +1,5 @@
+import os
+
 # Point to local Kitsu instance
 PROD_DATABASE = {
     'reporting': {
@@ -8,6 +10,101 @@ PROD_DATABASE = {
         'port': 5432,
         'database': 'swingdata',
         'user': 'postgres',
-        'password': 'postgres'
+        'password': 'postgres',
+
+        # Share of reads sent to the host above, the primary, next to any
+        # replicas (0 keeps reads off it while a replica is healthy)
+        'weight': 1,
+
+        # Streaming replicas to spread reads across, by weight. Keys not
+        # given are taken from the primary. Writes (migrations, view
+        # refreshes) and LISTEN always go to the primary.
+        'replicas': [
+            # {'host': '172.16.16.124', 'weight': 2, 'name': 'roadrunner'},
+            # {'host': '172.16.16.79', 'weight': 1},
+        ],
     }
 }
+
+# Replicas are checked this often, and skipped while down or replaying more
+# than DATABASE_REPLICA_MAX_LAG seconds behind the primary (keep it under
+# DELTA_OVERLAP_SECONDS so incremental refreshes miss nothing)
+DATABASE_REPLICA_CHECK_INTERVAL = 10
+DATABASE_REPLICA_MAX_LAG = 30
+
+# Connection pool kept for each reporting host
+DATABASE_POOL = {
+    'min_size': 1,
+    'max_size': 10,
+    'idle_timeout': 300,        # seconds before an idle connection is closed
+    'checkout_timeout': 30,     # seconds to wait for a free connection
+    'health_check_after': 30,   # ping connections idle longer than this
+}
+
+# Rows fetched per round trip by the streaming (server side cursor) loader
+STREAMING_CHUNK_SIZE = 10000
+
+# How page queries are loaded: 'pandas' (read_sql_query), 'stream' (server
+# side cursor, lowest memory) or 'copy' (COPY TO STDOUT, fastest)
+SQL_LOADER = 'copy'
+
+# Page datasets load on the first request that needs them. Datasets named
+# here (or in the comma separated SWING_STATS_WARMUP environment variable)
+# are loaded in the background at startup instead, e.g. ['task_facts']
+DATASET_WARMUP = [
+    name for name in os.environ.get('SWING_STATS_WARMUP', '').split(',') if name
+]
+
+# Threads used to warm up the page datasets (each holds a connection)
+DATASET_LOAD_WORKERS = 7
+
+# Load all page datasets from one exported snapshot so the pages agree
+DATASET_CONSISTENT_SNAPSHOT = True
+
+# Seconds between incremental refreshes of the loaded page datasets, per
+# dataset name overrides, e.g. {'task_comments': 60} (0 turns refreshing
+# off), and how far before the last watermark each refresh looks for
+# changed rows
+DATASET_REFRESH_INTERVAL = 300
+DATASET_REFRESH_INTERVALS = {}
+DELTA_OVERLAP_SECONDS = 120
+
+# Query results are cached on disk as Arrow files, keyed by the sql and a
+# watermark of the Kitsu tables, so restarts skip unchanged queries
+QUERY_CACHE_ENABLED = True
+QUERY_CACHE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '.query_cache')
+
+# Page callbacks keep their last results per combo selection, time window
+# button and dataset version, up to this many per page, for this many
+# seconds (0 turns the cache off)
+RESULT_CACHE_SIZE = 16
+RESULT_CACHE_TTL = 300
+
+# LISTEN for change notifications from the triggers in app/migrations and
+# refresh the affected datasets once changes have been quiet this long
+DATASET_LISTEN_FOR_CHANGES = True
+# the triggers are created notifying this channel, after changing it apply
+# 0001_change_notify.sql again (or re-create swing_stats_notify_change)
+NOTIFY_CHANNEL = 'swing_stats_changes'
+NOTIFY_DEBOUNCE_SECONDS = 2
+
+# Apply app/migrations when the app starts. They create triggers, tables and
+# functions in the Kitsu database itself, so this is opt in: run
+# python app/migrate.py against the primary once, or set this where the app
+# owns its database. The app needs them all: the task facts, latest files and
+# project progress queries read their tables, the delta refreshes their
+# tombstones and the change listener their triggers. It exits at startup
+# naming the migrations still pending.
+APPLY_MIGRATIONS_ON_STARTUP = False
+
+# Append every page callback request (the _dash-update-component POSTs) to
+# this JSON lines file, for benchmarks/replay_callbacks.py to replay. Off
+# unless set, here or in the SWING_STATS_RECORD_CALLBACKS environment variable
+CALLBACK_RECORD_PATH = os.environ.get('SWING_STATS_RECORD_CALLBACKS') or None
+
+# Task counts per project, episode, department, task type and status are
+# captured once a day, after this hour, into one Parquet file per day under
+# STATUS_HISTORY_DIR for the burn down page (needs pyarrow)
+STATUS_HISTORY_ENABLED = True
+STATUS_HISTORY_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '.status_history')
+STATUS_HISTORY_CAPTURE_HOUR = 20
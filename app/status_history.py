@@ -0,0 +1,208 @@
+# -*- coding: utf-8 -*-
+
+# Daily history of task status counts for burn down and trend charts. Once
+# a day the task facts are rolled up by project, episode, department, task
+# type and status (task_facts.status_snapshot) and written as one Parquet
+# file per day, so trends are read from a few small columnar files rather
+# than rebuilt from Kitsu.
+#
+#   python app/status_history.py        capture today's snapshot now
+import os
+import sys
+import datetime
+import threading
+import traceback
+import contextlib
+
+import logging
+log = logging.getLogger(__name__)
+
+import pandas as pd
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:
+    pa = None
+    pq = None
+
+import task_facts
+from settings import STATUS_HISTORY_DIR, STATUS_HISTORY_ENABLED, STATUS_HISTORY_CAPTURE_HOUR
+
+# seconds between checks for a snapshot due
+CHECK_INTERVAL = 600
+
+# seconds to wait for the task facts before giving up until the next check
+FACTS_TIMEOUT = 600
+
+_lock = threading.Lock()
+
+
+def is_enabled():
+    if not STATUS_HISTORY_ENABLED:
+        return False
+
+    if pq is None:
+        log.warning("pyarrow is not installed, status history disabled")
+        return False
+
+    return True
+
+
+def snapshot_path(day):
+    return os.path.join(STATUS_HISTORY_DIR, f"status_{day.isoformat()}.parquet")
+
+
+def has_snapshot(day):
+    return os.path.exists(snapshot_path(day))
+
+
+def write_snapshot(df, day):
+    """
+    Store df as the snapshot of day, replacing any already stored
+    """
+    os.makedirs(STATUS_HISTORY_DIR, exist_ok=True)
+
+    df = df.assign(day=pd.Timestamp(day))
+    # the names repeat on every row, dictionary encoding keeps the files small
+    for column in df.columns:
+        if df[column].dtype == object or pd.api.types.is_string_dtype(df[column]):
+            df[column] = df[column].astype("category")
+
+    path = snapshot_path(day)
+    temp_path = f"{path}.tmp"
+    pq.write_table(pa.Table.from_pandas(df, preserve_index=False), temp_path, compression="zstd")
+    os.replace(temp_path, path)
+    log.info(f"stored status snapshot: {day} rows={len(df)}")
+
+
+@contextlib.contextmanager
+def _capture_lock():
+    """
+    Yields whether this process holds the capture lock file; every worker
+    runs a CaptureJob, one of them takes the snapshot
+    """
+    os.makedirs(STATUS_HISTORY_DIR, exist_ok=True)
+    with open(os.path.join(STATUS_HISTORY_DIR, ".capture.lock"), "w") as file:
+        if fcntl is None:
+            yield True
+            return
+
+        try:
+            fcntl.flock(file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            yield False
+            return
+
+        try:
+            yield True
+        finally:
+            fcntl.flock(file, fcntl.LOCK_UN)
+
+
+def capture(day=None, facts=None, force=False):
+    """
+    Roll up the task facts into the snapshot of day (today by default),
+    unless it is already stored or another process is capturing it.
+    Returns True when a snapshot was written.
+    """
+    day = day or datetime.date.today()
+    with _lock, _capture_lock() as locked:
+        if not locked:
+            log.debug(f"status snapshot taken by another process: {day}")
+            return False
+
+        if has_snapshot(day) and not force:
+            return False
+
+        if facts is None:
+            facts = task_facts.dataset.frame(timeout=FACTS_TIMEOUT)
+        write_snapshot(task_facts.status_snapshot(facts), day)
+        return True
+
+
+def read_history(since=None):
+    """
+    Every stored snapshot, or those from since on, as one frame with a
+    day column
+    """
+    if not is_enabled() or not os.path.isdir(STATUS_HISTORY_DIR):
+        return pd.DataFrame(columns=["day"])
+
+    paths = sorted(
+        os.path.join(STATUS_HISTORY_DIR, name)
+        for name in os.listdir(STATUS_HISTORY_DIR)
+        if name.startswith("status_") and name.endswith(".parquet")
+        and (since is None or name[len("status_"):-len(".parquet")] >= since.isoformat())
+    )
+    if not paths:
+        return pd.DataFrame(columns=["day"])
+
+    # categories differ from file to file, so they concat as plain columns
+    return pd.concat([pq.read_table(path).to_pandas() for path in paths], ignore_index=True)
+
+
+class CaptureJob:
+    """
+    Captures the daily snapshot on a background thread, at the first check
+    after STATUS_HISTORY_CAPTURE_HOUR each day
+    """
+
+    def __init__(self, interval=CHECK_INTERVAL, hour=STATUS_HISTORY_CAPTURE_HOUR):
+        self.interval = interval
+        self.hour = hour
+
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name="status-history", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+
+    def run_pending(self):
+        now = datetime.datetime.now()
+        if now.hour < self.hour or has_snapshot(now.date()):
+            return False
+        return capture(now.date())
+
+    def _run(self):
+        while True:
+            try:
+                self.run_pending()
+            except Exception:
+                log.error("Error capturing status snapshot")
+                traceback.print_exc()
+            if self._stop.wait(self.interval):
+                return
+
+
+_job = None
+
+
+def start_capture():
+    """
+    Start the daily capture, once
+    """
+    global _job
+
+    if _job is None and is_enabled():
+        _job = CaptureJob().start()
+    return _job
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s")
+
+    if not is_enabled():
+        sys.exit("status history is disabled")
+
+    capture(facts=task_facts.load_task_facts(), force=True)
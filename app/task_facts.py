@@ -0,0 +1,357 @@
+# -*- coding: utf-8 -*-
+
+# The canonical task fact table. Every task of an open project is read once,
+# as ids and measures, next to small dimension tables the ids resolve
+# against. The artist, asset and shot frames are projected
+# from it in process (see Projection in datasets.py), so the pages share one
+# copy of the data and agree on the numbers.
+from functools import cached_property
+
+import logging
+log = logging.getLogger(__name__)
+
+import numpy as np
+import pandas as pd
+
+import queries
+from database import pooled_connection, read_sql, read_watermark
+from datasets import Dataset, add_dataset, register_projection
+
+DIMENSIONS = {
+    "projects": queries.PROJECT_DIM,
+    "task_types": queries.TASK_TYPE_DIM,
+    "task_statuses": queries.TASK_STATUS_DIM,
+    "entity_types": queries.ENTITY_TYPE_DIM,
+    "persons": queries.PERSON_DIM,
+}
+
+
+class TaskFacts:
+    """
+    The fact frames, never modified once built.
+
+    tasks has one row per task id; assignments, working_files and
+    output_files hang off it, and dimensions maps a name from DIMENSIONS to
+    the frame resolving its ids to names, codes and colors.
+    """
+
+    def __init__(self, tasks, assignments, working_files, output_files, dimensions):
+        self.tasks = tasks
+        self.assignments = assignments
+        self.working_files = working_files
+        self.output_files = output_files
+        self.dimensions = dimensions
+
+    def __len__(self):
+        return len(self.tasks)
+
+    @cached_property
+    def task_rows(self):
+        """
+        tasks with their project, task type, department, status and entity
+        type resolved
+        """
+        dimensions = self.dimensions
+        df = self.tasks.merge(dimensions["projects"], on="project_id")
+        df = df.merge(dimensions["task_types"], on="task_type_id")
+        df = df.merge(dimensions["task_statuses"], on="task_status_id")
+        df = df.merge(dimensions["entity_types"], on="entity_type_id")
+        return df
+
+    def replace_tasks(self, task_ids, entity_ids, changed):
+        """
+        A new TaskFacts with the rows of task_ids (output files of
+        entity_ids) swapped for the changed ones
+        """
+        return TaskFacts(
+            _replace(self.tasks, "task_id", task_ids, changed.tasks),
+            _replace(self.assignments, "task_id", task_ids, changed.assignments),
+            _replace(self.working_files, "task_id", task_ids, changed.working_files),
+            _replace(self.output_files, "entity_id", entity_ids, changed.output_files),
+            changed.dimensions,
+        )
+
+
+def _replace(df, column, ids, rows):
+    keep = ~df[column].astype(str).isin(ids)
+    return pd.concat([df[keep], rows], ignore_index=True)
+
+
+def _read(connection, sql, column=None, ids=None, watermark=None):
+    """
+    read_sql, limited to the rows whose column is in ids when given
+    """
+    if ids is None:
+        return read_sql(sql, connection, watermark=watermark)
+
+    name = f"{queries.name_of(sql)}_DELTA"
+    sql = f"select facts.* from ({sql.strip()}) as facts where facts.{column} = any(%(ids)s::uuid[])"
+    return read_sql(sql, connection, params={"ids": ids}, cache=False, name=name)
+
+
+def read_dimensions(connection, cache=True, watermark=None):
+    return {
+        name: read_sql(sql, connection, cache=cache, watermark=watermark)
+        for name, sql in DIMENSIONS.items()
+    }
+
+
+def load_task_facts():
+    logging.debug("loading task facts")
+
+    with pooled_connection() as connection:
+        # one query cache watermark for the whole load, not one per query
+        watermark = read_watermark(connection)
+        return TaskFacts(
+            _read(connection, queries.TASK_FACTS, watermark=watermark),
+            _read(connection, queries.TASK_ASSIGNMENTS, watermark=watermark),
+            _read(connection, queries.LATEST_WORKING_FILES, watermark=watermark),
+            _read(connection, queries.LATEST_OUTPUT_FILES, watermark=watermark),
+            read_dimensions(connection, watermark=watermark),
+        )
+
+
+class TaskFactsDataset(Dataset):
+    """
+    Dataset holding a TaskFacts, refreshed by re-reading the facts of the
+    tasks changed since the last load
+    """
+
+    @property
+    def incremental(self):
+        return True
+
+    def apply_delta(self, since):
+        facts = self._snapshot.frame
+
+        with pooled_connection() as connection:
+            keys = read_sql(
+                queries.TASK_FACTS_CHANGED_KEYS, connection, params={"since": since}, cache=False
+            )
+            if keys.empty:
+                return 0, None
+
+            task_ids = keys["task_id"].astype(str).unique().tolist()
+            tasks = _read(connection, queries.TASK_FACTS, "task_id", task_ids)
+
+            # entities the changed tasks were or are now on
+            previous = facts.tasks.loc[facts.tasks["task_id"].astype(str).isin(task_ids), "entity_id"]
+            entity_ids = pd.concat([previous, tasks["entity_id"]]).astype(str).unique().tolist()
+
+            changed = TaskFacts(
+                tasks,
+                _read(connection, queries.TASK_ASSIGNMENTS, "task_id", task_ids),
+                _read(connection, queries.LATEST_WORKING_FILES, "task_id", task_ids),
+                _read(connection, queries.LATEST_OUTPUT_FILES, "entity_id", entity_ids),
+                read_dimensions(connection, cache=False),
+            )
+
+        log.info(f"refreshed dataset: {self.name} tasks={len(task_ids)} rows={len(tasks)}")
+        return len(task_ids), facts.replace_tasks(task_ids, entity_ids, changed)
+
+
+dataset = add_dataset(
+    TaskFactsDataset(
+        "task_facts",
+        load_task_facts,
+        tables=["task", "entity", "assignations", "project"],
+    )
+)
+
+
+# Projections. Each reproduces the filters, joins and grouping of the page
+# query it replaces.
+
+SHOT_TASK_KEYS = [
+    "project",
+    "project_code",
+    "project_id",
+    "department_id",
+    "department",
+    "episode",
+    "episode_id",
+    "task_type",
+    "task_type_id",
+    "task_type_code",
+    "priority",
+    "task_type_color",
+    "task_status",
+    "task_status_color",
+    "task_status_code",
+    "task_status_id",
+]
+
+ASSET_TASK_KEYS = [
+    "project",
+    "project_code",
+    "department",
+    "entity_type",
+    "asset_name",
+    "asset_id",
+    "task_type",
+    "task_type_id",
+    "task_type_code",
+    "priority",
+    "task_type_color",
+    "task_status",
+    "task_status_code",
+    "task_status_color",
+]
+
+ARTIST_COLUMNS = [
+    "project",
+    "project_code",
+    "department",
+    "artist",
+    "episode",
+    "for_entity",
+    "task_id",
+    "task",
+    "entity_type",
+    "task_type",
+    "task_type_color",
+    "task_type_code",
+    "task_status",
+    "task_status_color",
+    "task_status_code",
+    "task_start_date",
+    "task_due_date",
+    "task_real_start_date",
+    "task_end_date",
+    "task_estimation",
+    "task_duration",
+    "retake_count",
+    "priority",
+    "working_file_name",
+    "working_file_published_at",
+    "output_file_name",
+    "output_file_published_at",
+]
+
+MEASURES = ["task_estimation", "task_duration", "retake_count"]
+
+
+def _live_tasks(facts):
+    """
+    Tasks of entities that are not canceled, omitted tasks excluded
+    """
+    df = facts.task_rows
+    return df[df["canceled"].eq(False) & (df["task_status"] != "Omit")]
+
+
+def _aggregate(df, keys):
+    """
+    Measure sums and date spans per group of keys, like the page sql's
+    sum / min / max over each group
+    """
+    grouped = df.groupby(keys, dropna=False, sort=False)
+
+    # sum over all null is null in sql, not 0
+    out = grouped[MEASURES].sum(min_count=1)
+    out["task_real_start_date"] = grouped["task_real_start_date"].min()
+    out["task_end_date"] = grouped["task_end_date"].max()
+    out["task_start_date"] = grouped["task_start_date"].min()
+    out["task_due_date"] = grouped["task_due_date"].max()
+    return out
+
+
+def shot_task_summary(facts):
+    """
+    Shot tasks per project, department, episode, task type and status
+    """
+    df = _live_tasks(facts)
+    df = df[(df["entity_type"] == "Shot") & df["parent_id"].notna() & df["gran_id"].notna()]
+    df = df.assign(
+        episode=df["gran_name"],
+        episode_id=df["gran_id"],
+        frames=np.where(df["entity_name"] == "sh000", 0, df["nb_frames"]),
+    )
+
+    out = _aggregate(df, SHOT_TASK_KEYS)
+    # SUM(DISTINCT frames)
+    out["nb_frames"] = (
+        df.drop_duplicates(SHOT_TASK_KEYS + ["frames"])
+        .groupby(SHOT_TASK_KEYS, dropna=False, sort=False)["frames"]
+        .sum(min_count=1)
+    )
+    out["shot_count"] = df.groupby(SHOT_TASK_KEYS, dropna=False, sort=False).size()
+    return out.reset_index()
+
+
+def asset_task_summary(facts):
+    """
+    Asset tasks per asset, task type and status, with the assigned artists
+    """
+    df = _live_tasks(facts)
+    df = df[df["for_entity"] == "Asset"]
+    df = df.rename(columns={"entity_name": "asset_name", "entity_id": "asset_id"})
+
+    # one row per assignee, the sums count a task once per artist as the
+    # page query always has
+    artists = facts.assignments.merge(facts.dimensions["persons"], on="person_id")
+    df = df.merge(artists[["task_id", "artist"]], on="task_id", how="left")
+    df["artist"] = df["artist"].fillna("")
+
+    out = _aggregate(df, ASSET_TASK_KEYS)
+    # STRING_AGG(DISTINCT ..., ', ')
+    out["artists"] = df.groupby(ASSET_TASK_KEYS, dropna=False, sort=False)["artist"].agg(
+        lambda names: ", ".join(sorted(set(names)))
+    )
+    out = out.reset_index()
+    return out.sort_values(
+        ["project", "project_code", "entity_type", "asset_name", "priority"], ignore_index=True
+    )
+
+
+def artist_tasks(facts):
+    """
+    One row per task and assigned artist, with their latest files
+    """
+    df = _live_tasks(facts)
+    df = df.merge(facts.assignments, on="task_id")
+    df = df.merge(facts.dimensions["persons"], on="person_id")
+    df = df.merge(facts.working_files, on=["task_id", "person_id"], how="left")
+    df = df.merge(facts.output_files, on=["entity_id", "person_id", "task_type_id"], how="left")
+
+    in_episode = df["parent_name"].notna() & df["gran_name"].notna()
+    df["episode"] = df["gran_name"].where(in_episode, "ALL")
+    df["task"] = (df["gran_name"] + "_" + df["parent_name"] + "_" + df["entity_name"]).where(
+        in_episode, df["entity_name"]
+    )
+
+    df = df[ARTIST_COLUMNS].drop_duplicates()
+    return df.sort_values(["artist", "priority", "task", "task_type"], ignore_index=True)
+
+
+STATUS_SNAPSHOT_KEYS = [
+    "project",
+    "episode",
+    "department",
+    "task_type",
+    "task_status",
+    "task_status_color",
+    "is_done",
+]
+
+
+def status_snapshot(facts):
+    """
+    Task counts, estimation, duration and frames per project, episode,
+    department, task type and status: one day of the status history
+    """
+    df = _live_tasks(facts)
+    in_episode = df["parent_name"].notna() & df["gran_name"].notna()
+    counted = (df["entity_type"] == "Shot") & (df["entity_name"] != "sh000")
+    df = df.assign(
+        episode=df["gran_name"].where(in_episode, "ALL"),
+        nb_frames=df["nb_frames"].where(counted, 0).fillna(0).astype("int64"),
+    )
+
+    grouped = df.groupby(STATUS_SNAPSHOT_KEYS, dropna=False, sort=False)
+    out = grouped[["task_estimation", "task_duration", "nb_frames"]].sum()
+    out["task_count"] = grouped.size()
+    return out.reset_index()
+
+
+# shared by the shot_data, shot_details and project_details pages
+shot_task_dataset = register_projection("shot_task_summary", dataset, shot_task_summary)
@@ -0,0 +1,83 @@
+# -*- coding: utf-8 -*-
+
+# Compare the sql loaders in app/database.py on the heaviest page queries
+#
+#   python benchmarks/bench_loaders.py --repeat 5
+#   python benchmarks/bench_loaders.py --query TASK_FACTS --loader copy --loader pandas
+
+import os
+import sys
+import time
+import argparse
+import tracemalloc
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "app"))
+
+import queries
+from database import pooled_connection, read_sql
+
+LOADERS = ["pandas", "stream", "copy"]
+QUERIES = ["TASK_FACTS", "TASK_COMMENTS"]
+
+
+def run(query_name, loader, repeat, trace_memory):
+    sql = getattr(queries, query_name)
+    timings = []
+    peak = 0
+    rows = 0
+
+    for _ in range(repeat):
+        if trace_memory:
+            tracemalloc.start()
+
+        with pooled_connection() as connection:
+            started = time.perf_counter()
+            # the disk cache would turn every run after the first into a file read
+            df = read_sql(sql, connection, loader=loader, cache=False)
+            timings.append(time.perf_counter() - started)
+
+        if trace_memory:
+            peak = max(peak, tracemalloc.get_traced_memory()[1])
+            tracemalloc.stop()
+
+        rows = len(df)
+        del df
+
+    timings.sort()
+    return {
+        "query": query_name,
+        "loader": loader,
+        "rows": rows,
+        "best": timings[0],
+        "median": timings[len(timings) // 2],
+        "peak_mb": peak / 1024 / 1024,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark page query loaders")
+    parser.add_argument(
+        "--query", action="append", choices=[name for name in dir(queries) if name.isupper()]
+    )
+    parser.add_argument("--loader", action="append", choices=LOADERS)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument(
+        "--memory", action="store_true", help="trace peak python allocations (slower)"
+    )
+    args = parser.parse_args()
+
+    results = []
+    for query_name in args.query or QUERIES:
+        for loader in args.loader or LOADERS:
+            results.append(run(query_name, loader, args.repeat, args.memory))
+
+    print(f"{'query':<16}{'loader':<8}{'rows':>10}{'best s':>10}{'median s':>10}{'peak MB':>10}")
+    for result in results:
+        print(
+            f"{result['query']:<16}{result['loader']:<8}{result['rows']:>10}"
+            f"{result['best']:>10.3f}{result['median']:>10.3f}{result['peak_mb']:>10.1f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
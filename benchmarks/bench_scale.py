@@ -0,0 +1,283 @@
+# -*- coding: utf-8 -*-
+
+# Time the page data pipeline on synthetic productions of growing size:
+# loading the task facts, projecting every page frame (calcs included),
+# load_default_calcs on its own, and the page callbacks. Results are
+# compared with a saved baseline and regressions are reported.
+#
+#   python benchmarks/bench_scale.py --save
+#   python benchmarks/bench_scale.py --tasks 10000 --tasks 100000
+#   python benchmarks/bench_scale.py --backend postgres --database swingdata_synthetic
+#
+# The memory backend builds the task facts with pandas from the generated
+# tables (see synthetic_kitsu.py) and needs no database, but leaves out the
+# pages that still query Kitsu directly (task_comments). The postgres
+# backend loads the generated tables into --database and reads them with
+# the app's own queries.
+
+import os
+import sys
+import json
+import time
+import inspect
+import subprocess
+import argparse
+import platform
+import contextvars
+
+APP_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "app"))
+sys.path.insert(0, APP_DIR)
+
+import settings
+
+SCALES = [10000, 100000, 1000000]
+BASELINE = os.path.join(os.path.dirname(__file__), "baselines", "bench_scale.json")
+
+# (page module, callback) run by the benchmark
+CALLBACKS = [
+    ("artist_data", "update_filters"),
+    ("artist_data", "update_graphs"),
+    ("asset_data", "update_graphs"),
+    ("shot_data", "update_page"),
+    ("shot_details", "update_graphs"),
+    ("project_details", "update_page"),
+    ("projects_summary", "update_page"),
+    ("task_comments", "update_graphs"),
+]
+
+# combo filters and date buttons each callback is run with
+SCENARIOS = ["all", "project", "now"]
+
+
+def _time(func, repeat):
+    timings = []
+    result = None
+    for _ in range(repeat):
+        started = time.perf_counter()
+        result = func()
+        timings.append(time.perf_counter() - started)
+    timings.sort()
+    return timings[len(timings) // 2], result
+
+
+def _import_pages():
+    """
+    The page modules, registered with a Dash app the way app.py does
+    """
+    from dash import Dash
+
+    # rooted at app/ like app.py, so the pages import as pages.<name>
+    Dash("app", use_pages=True, pages_folder=os.path.join(APP_DIR, "pages"))
+    pages = {
+        name.rsplit(".", 1)[-1]: module
+        for name, module in list(sys.modules.items())
+        if name.startswith("pages.") and hasattr(module, "dataset")
+    }
+
+    # time the callbacks, not the page result caches
+    for page in pages.values():
+        if hasattr(page, "results"):
+            page.results.size = 0
+    return pages
+
+
+def _root(dataset):
+    while getattr(dataset, "source", None) is not None:
+        dataset = dataset.source
+    return dataset
+
+
+def _run_callback(func, scenario, prefix, project):
+    """
+    Call a page callback outside Dash, with the combos and the triggering
+    input a user would set for scenario
+    """
+    from dash._callback_context import context_value
+    from dash._utils import AttributeDict
+
+    triggered = []
+    if scenario == "now":
+        triggered = [{"prop_id": f"{prefix}_tasks_now.n_clicks", "value": 1}]
+
+    parameters = list(inspect.signature(inspect.unwrap(func)).parameters)
+    args = [None] * len(parameters)
+    if scenario == "project" and "project" in parameters:
+        args[parameters.index("project")] = [project]
+
+    def _call():
+        context_value.set(AttributeDict(triggered_inputs=triggered, inputs_list=[], states_list=[]))
+        return func(*args)
+
+    return contextvars.copy_context().run(_call)
+
+
+def run_scale(tasks, backend, repeat, generate=True):
+    """
+    {stage: median seconds} for a production of about tasks tasks
+    """
+    import synthetic_kitsu
+
+    config = synthetic_kitsu.SyntheticConfig.for_tasks(tasks)
+    print(f"{backend} {config.tasks} tasks: {config}", file=sys.stderr)
+
+    tables = None
+    if backend == "memory" or generate:
+        tables = synthetic_kitsu.generate(config)
+
+    import task_facts
+    from pages.calcs import load_default_calcs
+
+    pages = _import_pages()
+    results = {}
+
+    if backend == "postgres":
+        from database import pooled_connection
+        from migrate import apply_migrations
+
+        if generate:
+            with pooled_connection(primary=True) as connection:
+                synthetic_kitsu.load_postgres(tables, connection)
+                apply_migrations(connection)
+        results["load:task_facts"], facts = _time(task_facts.load_task_facts, repeat)
+    else:
+        results["load:task_facts"], facts = _time(lambda: synthetic_kitsu.task_facts_from_tables(tables), repeat)
+    task_facts.dataset.publish(facts)
+
+    for name, page in sorted(pages.items()):
+        dataset = page.dataset
+        if _root(dataset) is task_facts.dataset:
+            continue
+        if backend == "memory":
+            pages.pop(name)
+            continue
+        results[f"load:{dataset.name}"], df = _time(dataset.builder, repeat)
+        dataset.publish(df)
+
+    # projections, the shared shot summary first
+    projections = [task_facts.shot_task_dataset] + [
+        page.dataset for page in pages.values() if getattr(page.dataset, "source", None) is not None
+    ]
+    for projection in projections:
+        source = projection.source.snapshot().frame
+        results[f"project:{projection.name}"], _ = _time(lambda: projection.builder(source), repeat)
+        # published for the callbacks below
+        projection.frame()
+
+    raw = task_facts.artist_tasks(facts)
+    results["calcs:load_default_calcs"], _ = _time(lambda: load_default_calcs(raw), repeat)
+
+    project = facts.dimensions["projects"]["project"].iloc[0]
+    for module_name, callback_name in CALLBACKS:
+        page = pages.get(module_name)
+        if page is None:
+            continue
+        func = getattr(page, callback_name)
+        for scenario in SCENARIOS:
+            results[f"callback:{module_name}.{callback_name}:{scenario}"], _ = _time(
+                lambda: _run_callback(func, scenario, module_name, project), repeat
+            )
+
+    return results
+
+
+def _without_tasks(argv):
+    out = []
+    skip = False
+    for arg in argv:
+        if skip:
+            skip = False
+        elif arg == "--tasks":
+            skip = True
+        elif not arg.startswith("--tasks="):
+            out.append(arg)
+    return out
+
+
+def compare(results, baseline, threshold, min_delta):
+    """
+    (stage, baseline seconds, seconds, ratio) for stages slower than
+    baseline by more than threshold and min_delta seconds
+    """
+    regressions = []
+    for stage, seconds in results.items():
+        before = baseline.get(stage)
+        if before is None:
+            continue
+        if seconds > before * (1 + threshold) and seconds - before > min_delta:
+            regressions.append((stage, before, seconds, seconds / before if before else float("inf")))
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the page pipeline at scale")
+    parser.add_argument("--tasks", type=int, action="append", help=f"task counts, default {SCALES}")
+    parser.add_argument("--backend", choices=["memory", "postgres"], default="memory")
+    parser.add_argument("--database", default="swingdata_synthetic", help="postgres backend database")
+    parser.add_argument(
+        "--no-generate", action="store_true", help="postgres backend: use the data already in --database"
+    )
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--baseline", default=BASELINE)
+    parser.add_argument("--save", action="store_true", help="store the results as the new baseline")
+    parser.add_argument("--threshold", type=float, default=0.2, help="slowdown reported as a regression")
+    parser.add_argument("--min-delta", type=float, default=0.01, help="ignore slowdowns under this many seconds")
+    args = parser.parse_args()
+
+    if args.backend == "postgres":
+        if args.database == settings.PROD_DATABASE["reporting"]["database"]:
+            parser.error(f"refusing to overwrite the configured database: {args.database}")
+        # before database.py builds its pool, and with results read fresh
+        settings.PROD_DATABASE["reporting"]["database"] = args.database
+        settings.PROD_DATABASE["reporting"]["replicas"] = []
+        settings.QUERY_CACHE_ENABLED = False
+
+    scales = args.tasks or SCALES
+    if len(scales) > 1:
+        # the page datasets live at module level, so one scale per process
+        failed = False
+        for tasks in scales:
+            command = [sys.executable, __file__, "--tasks", str(tasks)] + _without_tasks(sys.argv[1:])
+            failed |= subprocess.call(command) != 0
+        sys.exit(1 if failed else 0)
+
+    tasks = scales[0]
+    key = f"{args.backend}/{tasks}"
+    results = run_scale(tasks, args.backend, args.repeat, not args.no_generate)
+
+    baselines = {}
+    if os.path.exists(args.baseline):
+        with open(args.baseline) as file:
+            baselines = json.load(file)
+    baseline = baselines.get(key, {}).get("results", {})
+
+    print(f"{key}")
+    print(f"{'stage':<56}{'baseline s':>12}{'median s':>12}{'change':>10}")
+    for stage, seconds in results.items():
+        before = baseline.get(stage)
+        change = f"{(seconds / before - 1) * 100:+.0f}%" if before else ""
+        before = f"{before:.3f}" if before is not None else "-"
+        print(f"{stage:<56}{before:>12}{seconds:>12.3f}{change:>10}")
+
+    regressions = compare(results, baseline, args.threshold, args.min_delta)
+
+    if args.save:
+        baselines[key] = {
+            "machine": f"{platform.node()} {platform.machine()} python {platform.python_version()}",
+            "saved_at": time.strftime("%Y-%m-%d %H:%M:%S"),
+            "results": results,
+        }
+        os.makedirs(os.path.dirname(args.baseline), exist_ok=True)
+        with open(args.baseline, "w") as file:
+            json.dump(baselines, file, indent=2, sort_keys=True)
+        print(f"saved baseline {key} to {args.baseline}")
+
+    if regressions:
+        print(f"\n{len(regressions)} regressions over {args.threshold:.0%}:")
+        for stage, before, seconds, ratio in regressions:
+            print(f"  {stage}: {before:.3f}s -> {seconds:.3f}s ({ratio:.2f}x)")
+        if not args.save:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
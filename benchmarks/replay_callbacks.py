@@ -0,0 +1,191 @@
+# -*- coding: utf-8 -*-
+
+# Replay recorded page callback requests against a server, concurrently and
+# at a fixed rate, and report latency percentiles and error rates per
+# callback. Record the requests first by starting an instance with
+# SWING_STATS_RECORD_CALLBACKS=callbacks.jsonl (see app/callback_recorder.py).
+# Latency runs from the time a request was due to be sent, so a server that
+# falls behind the rate shows up in the percentiles.
+#
+#   python benchmarks/replay_callbacks.py callbacks.jsonl --target http://127.0.0.1:8050 --rate 20
+#   python benchmarks/replay_callbacks.py callbacks.jsonl --rate 0 --speed 4 --loops 3
+
+import sys
+import json
+import math
+import time
+import argparse
+import threading
+import urllib.error
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+
+
+def read_recording(path):
+    with open(path) as file:
+        return [json.loads(line) for line in file if line.strip()]
+
+
+def callback_name(body):
+    """
+    A short label for the callback a request runs: its first output, e.g.
+    artist_data_datatable.children
+    """
+    outputs = body.get("outputs")
+    if isinstance(outputs, list):
+        outputs = outputs[0] if outputs else None
+    if isinstance(outputs, dict):
+        component = outputs.get("id")
+        if isinstance(component, dict):
+            component = json.dumps(component, sort_keys=True)
+        return f"{component}.{outputs.get('property')}"
+    return body.get("output", "unknown").strip(".").split("...")[0]
+
+
+def server_timing(header, name="callback"):
+    """
+    Milliseconds of the name entry in a Server-Timing header
+    """
+    for entry in (header or "").split(","):
+        parts = [part.strip() for part in entry.split(";")]
+        if parts[0] != name:
+            continue
+        for part in parts[1:]:
+            if part.startswith("dur="):
+                return float(part[4:])
+    return None
+
+
+def send(target, request, timeout, scheduled=None):
+    """
+    (seconds, status, server callback ms) for one recorded request; status
+    is None when the request did not complete
+
+    seconds run from scheduled, the perf_counter time the request was due,
+    so time spent queued behind busy workers counts towards its latency
+    instead of being left out (coordinated omission)
+    """
+    data = json.dumps(request["body"]).encode("utf-8")
+    http_request = urllib.request.Request(
+        target.rstrip("/") + request.get("path", "/_dash-update-component"),
+        data=data,
+        headers={"Content-Type": "application/json"},
+        method="POST",
+    )
+
+    started = time.perf_counter() if scheduled is None else scheduled
+    try:
+        with urllib.request.urlopen(http_request, timeout=timeout) as response:
+            response.read()
+            status = response.status
+            callback_ms = server_timing(response.headers.get("Server-Timing"))
+    except urllib.error.HTTPError as error:
+        status = error.code
+        callback_ms = None
+    except Exception:
+        status = None
+        callback_ms = None
+    return time.perf_counter() - started, status, callback_ms
+
+
+def percentile(values, fraction):
+    """
+    Nearest rank percentile of sorted values: the smallest value with at
+    least fraction of the values at or below it
+    """
+    if not values:
+        return float("nan")
+    # the epsilon keeps e.g. 0.07 * 100 = 7.000000000000001 at rank 7
+    rank = math.ceil(fraction * len(values) - 1e-9)
+    return values[min(len(values), max(1, rank)) - 1]
+
+
+def schedule(recording, rate, speed, loops):
+    """
+    (seconds from start, request) in send order: evenly spaced at rate per
+    second, or with the recorded gaps divided by speed when rate is 0
+    """
+    offset = 0.0
+    at = 0.0
+    for _ in range(loops):
+        first = recording[0].get("at", 0.0)
+        last = first
+        for request in recording:
+            if rate:
+                yield at, request
+                at += 1.0 / rate
+            else:
+                yield offset + (request.get("at", first) - first) / speed, request
+                last = request.get("at", last)
+        offset += (last - first) / speed
+
+
+def replay(recording, target, rate, concurrency, speed=1.0, loops=1, timeout=60):
+    """
+    {callback name: [(seconds, status, server callback ms), ...]}
+    """
+    results = {}
+    lock = threading.Lock()
+
+    def _run(request, scheduled):
+        outcome = send(target, request, timeout, scheduled)
+        with lock:
+            results.setdefault(callback_name(request["body"]), []).append(outcome)
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        for at, request in schedule(recording, rate, speed, loops):
+            delay = at - (time.perf_counter() - started)
+            if delay > 0:
+                time.sleep(delay)
+            executor.submit(_run, request, started + at)
+
+    return results, time.perf_counter() - started
+
+
+def report(results, elapsed):
+    print(
+        f"{'callback':<48}{'requests':>10}{'errors':>8}{'error %':>9}"
+        f"{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}{'server p50':>12}"
+    )
+    total = errors = 0
+    for name, outcomes in sorted(results.items()):
+        latencies = sorted(seconds * 1000 for seconds, _, _ in outcomes)
+        failed = sum(1 for _, status, _ in outcomes if status is None or status >= 400)
+        server = sorted(ms for _, _, ms in outcomes if ms is not None)
+        total += len(outcomes)
+        errors += failed
+        print(
+            f"{name[:47]:<48}{len(outcomes):>10}{failed:>8}{failed / len(outcomes) * 100:>9.1f}"
+            f"{percentile(latencies, 0.5):>9.0f}{percentile(latencies, 0.95):>9.0f}"
+            f"{percentile(latencies, 0.99):>9.0f}{percentile(server, 0.5):>12.0f}"
+        )
+    if total:
+        print(f"\n{total} requests in {elapsed:.1f}s ({total / elapsed:.1f}/s), {errors} errors")
+    return errors
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Replay recorded page callback requests")
+    parser.add_argument("recording", help="json lines file written by app/callback_recorder.py")
+    parser.add_argument("--target", default="http://127.0.0.1:80")
+    parser.add_argument("--rate", type=float, default=10, help="requests per second, 0 to keep the recorded pacing")
+    parser.add_argument("--speed", type=float, default=1.0, help="with --rate 0, replay this many times faster")
+    parser.add_argument("--concurrency", type=int, default=8, help="requests in flight at most")
+    parser.add_argument("--loops", type=int, default=1, help="times through the recording")
+    parser.add_argument("--timeout", type=float, default=60)
+    args = parser.parse_args()
+
+    recording = read_recording(args.recording)
+    if not recording:
+        parser.error(f"no requests in {args.recording}")
+
+    results, elapsed = replay(
+        recording, args.target, args.rate, args.concurrency, args.speed, args.loops, args.timeout
+    )
+    if report(results, elapsed):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
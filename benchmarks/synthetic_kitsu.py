@@ -0,0 +1,542 @@
+# -*- coding: utf-8 -*-
+
+# Synthetic Kitsu data for benchmarking the app at a chosen scale.
+#
+# generate() builds the Kitsu tables the app reads (only the columns it
+# uses) as DataFrames. They can be loaded into a local Postgres database,
+# or turned straight into the app's TaskFacts as an in-process stand-in
+# for the database.
+#
+#   python benchmarks/synthetic_kitsu.py --tasks 100000 --database swingdata_synthetic --create
+
+import os
+import io
+import sys
+import json
+import uuid
+import argparse
+import datetime
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "app"))
+
+SCHEMA = """
+create table project_status (id uuid primary key, name text, updated_at timestamp);
+create table project (
+    id uuid primary key, name text, code text, project_status_id uuid,
+    start_date date, end_date date, updated_at timestamp
+);
+create table entity_type (id uuid primary key, name text, updated_at timestamp);
+create table entity (
+    id uuid primary key, name text, project_id uuid, entity_type_id uuid,
+    parent_id uuid, canceled boolean, nb_frames integer, updated_at timestamp
+);
+create table department (id uuid primary key, name text, updated_at timestamp);
+create table task_type (
+    id uuid primary key, name text, short_name text, color text, priority integer,
+    for_entity text, department_id uuid, updated_at timestamp
+);
+create table task_status (
+    id uuid primary key, name text, short_name text, color text, is_done boolean,
+    updated_at timestamp
+);
+create table person (id uuid primary key, first_name text, last_name text, updated_at timestamp);
+create table task (
+    id uuid primary key, project_id uuid, task_type_id uuid, task_status_id uuid,
+    entity_id uuid, estimation real, duration real, retake_count integer,
+    start_date timestamp, due_date timestamp, real_start_date timestamp, end_date timestamp,
+    last_comment_date timestamp, updated_at timestamp
+);
+create table assignations (task uuid, person uuid);
+create table comment (
+    id uuid primary key, object_id uuid, text text, data jsonb, checklist jsonb,
+    created_at timestamp, updated_at timestamp
+);
+create table preview_file (id uuid primary key);
+create table comment_preview_link (comment uuid, preview_file uuid);
+create table working_file (
+    id uuid primary key, task_id uuid, person_id uuid, name text, updated_at timestamp
+);
+create table output_file (
+    id uuid primary key, entity_id uuid, person_id uuid, task_type_id uuid, name text,
+    updated_at timestamp
+);
+create index on task (entity_id);
+create index on task (project_id);
+create index on entity (parent_id);
+create index on assignations (task);
+create index on comment (object_id);
+create index on working_file (task_id, person_id, updated_at);
+create index on output_file (entity_id, person_id, task_type_id, updated_at);
+"""
+
+# load order, parents first
+TABLES = [
+    "project_status",
+    "project",
+    "entity_type",
+    "entity",
+    "department",
+    "task_type",
+    "task_status",
+    "person",
+    "task",
+    "assignations",
+    "comment",
+    "preview_file",
+    "comment_preview_link",
+    "working_file",
+    "output_file",
+]
+
+DEPARTMENTS = ["Modeling", "Rigging", "Layout", "Animation", "FX", "Lighting", "Compositing"]
+
+SHOT_TASK_TYPES = [
+    ("Layout", "LAY", "Layout"),
+    ("Blocking", "BLK", "Animation"),
+    ("Animation", "ANI", "Animation"),
+    ("FX", "FX", "FX"),
+    ("Lighting", "LGT", "Lighting"),
+    ("Compositing", "CMP", "Compositing"),
+]
+
+ASSET_TASK_TYPES = [
+    ("Modeling", "MOD", "Modeling"),
+    ("Texturing", "TEX", "Modeling"),
+    ("Rigging", "RIG", "Rigging"),
+    ("Shading", "SHD", "Lighting"),
+]
+
+# name, short name, is_done, share of tasks
+TASK_STATUSES = [
+    ("Todo", "todo", False, 0.35),
+    ("Work In Progress", "wip", False, 0.2),
+    ("Waiting For Approval", "wfa", False, 0.1),
+    ("Retake", "retake", False, 0.05),
+    ("Done", "done", True, 0.27),
+    ("Omit", "omit", False, 0.03),
+]
+
+ASSET_TYPES = ["Character", "Prop", "Environment"]
+
+
+class SyntheticConfig:
+    """
+    Sizes of the generated production. Tasks are one per entity and task
+    type, so the task count follows from the entity counts.
+    """
+
+    def __init__(
+        self,
+        projects=4,
+        episodes=10,
+        scenes=10,
+        shots=10,
+        assets=200,
+        persons=100,
+        comments_per_task=2.0,
+        files_per_task=1.5,
+        canceled_share=0.02,
+    ):
+        self.projects = projects
+        self.episodes = episodes
+        self.scenes = scenes
+        self.shots = shots
+        self.assets = assets
+        self.persons = persons
+        self.comments_per_task = comments_per_task
+        self.files_per_task = files_per_task
+        self.canceled_share = canceled_share
+
+    @classmethod
+    def for_tasks(cls, tasks, **kwargs):
+        """
+        A config producing roughly tasks tasks, a fifth of them on assets
+        """
+        config = cls(**kwargs)
+        per_project = tasks / config.projects
+        config.assets = max(1, round(per_project * 0.2 / len(ASSET_TASK_TYPES)))
+        shots = per_project * 0.8 / len(SHOT_TASK_TYPES)
+        config.shots = max(1, round(shots / (config.episodes * config.scenes)))
+        config.persons = max(10, tasks // 500)
+        return config
+
+    @property
+    def tasks(self):
+        shots = self.episodes * self.scenes * self.shots * len(SHOT_TASK_TYPES)
+        return self.projects * (shots + self.assets * len(ASSET_TASK_TYPES))
+
+    def __repr__(self):
+        return f"SyntheticConfig({json.dumps(vars(self))})"
+
+
+def _uuids(rng, count):
+    raw = rng.bytes(16 * count)
+    return np.array(
+        [str(uuid.UUID(bytes=raw[index * 16:(index + 1) * 16], version=4)) for index in range(count)],
+        dtype=object,
+    )
+
+
+def _dates(rng, base, count, spread_days):
+    offsets = rng.integers(0, spread_days * 24, size=count).astype("timedelta64[h]")
+    return pd.to_datetime(np.datetime64(base) + offsets)
+
+
+def generate(config=None, seed=0):
+    """
+    Kitsu tables as {name: DataFrame}, columns as in SCHEMA
+    """
+    config = config or SyntheticConfig()
+    rng = np.random.default_rng(seed)
+    now = pd.Timestamp(datetime.datetime.now().replace(microsecond=0))
+    tables = {}
+
+    open_status = _uuids(rng, 2)
+    tables["project_status"] = pd.DataFrame({"id": open_status, "name": ["Open", "Closed"], "updated_at": now})
+
+    project_ids = _uuids(rng, config.projects)
+    starts = _dates(rng, now - pd.Timedelta(days=365), config.projects, 180)
+    tables["project"] = pd.DataFrame({
+        "id": project_ids,
+        "name": [f"Project {index + 1:02d}" for index in range(config.projects)],
+        "code": [f"P{index + 1:02d}" for index in range(config.projects)],
+        "project_status_id": open_status[0],
+        "start_date": starts.date,
+        "end_date": (starts + pd.Timedelta(days=540)).date,
+        "updated_at": now,
+    })
+
+    type_names = ["Episode", "Sequence", "Shot"] + ASSET_TYPES
+    type_ids = dict(zip(type_names, _uuids(rng, len(type_names))))
+    tables["entity_type"] = pd.DataFrame({"id": list(type_ids.values()), "name": type_names, "updated_at": now})
+
+    # episodes > scenes > shots, and assets, for every project
+    episode_count = config.projects * config.episodes
+    episodes = pd.DataFrame({
+        "id": _uuids(rng, episode_count),
+        "name": [f"ep{index % config.episodes + 1:02d}" for index in range(episode_count)],
+        "project_id": np.repeat(project_ids, config.episodes),
+        "entity_type_id": type_ids["Episode"],
+        "parent_id": None,
+    })
+    scene_count = episode_count * config.scenes
+    scenes = pd.DataFrame({
+        "id": _uuids(rng, scene_count),
+        "name": [f"sq{index % config.scenes + 1:03d}" for index in range(scene_count)],
+        "project_id": np.repeat(episodes["project_id"].to_numpy(), config.scenes),
+        "entity_type_id": type_ids["Sequence"],
+        "parent_id": np.repeat(episodes["id"].to_numpy(), config.scenes),
+    })
+    shot_count = scene_count * config.shots
+    shots = pd.DataFrame({
+        # sh000 is the scene placeholder shot the shot pages leave out of frame counts
+        "id": _uuids(rng, shot_count),
+        "name": [f"sh{(index % config.shots) * 10:03d}" for index in range(shot_count)],
+        "project_id": np.repeat(scenes["project_id"].to_numpy(), config.shots),
+        "entity_type_id": type_ids["Shot"],
+        "parent_id": np.repeat(scenes["id"].to_numpy(), config.shots),
+        "nb_frames": rng.integers(24, 400, size=shot_count),
+    })
+    asset_count = config.projects * config.assets
+    assets = pd.DataFrame({
+        "id": _uuids(rng, asset_count),
+        "name": [f"asset_{index % config.assets + 1:04d}" for index in range(asset_count)],
+        "project_id": np.repeat(project_ids, config.assets),
+        "entity_type_id": rng.choice([type_ids[name] for name in ASSET_TYPES], size=asset_count),
+        "parent_id": None,
+    })
+    entity = pd.concat([episodes, scenes, shots, assets], ignore_index=True)
+    entity["canceled"] = rng.random(len(entity)) < config.canceled_share
+    entity["nb_frames"] = entity["nb_frames"].astype("Int64")
+    entity["updated_at"] = now
+    tables["entity"] = entity
+
+    department_ids = dict(zip(DEPARTMENTS, _uuids(rng, len(DEPARTMENTS))))
+    tables["department"] = pd.DataFrame({
+        "id": list(department_ids.values()), "name": DEPARTMENTS, "updated_at": now,
+    })
+
+    task_types = [(*task_type, "Shot") for task_type in SHOT_TASK_TYPES] + [
+        (*task_type, "Asset") for task_type in ASSET_TASK_TYPES
+    ]
+    tables["task_type"] = pd.DataFrame({
+        "id": _uuids(rng, len(task_types)),
+        "name": [name for name, _, _, _ in task_types],
+        "short_name": [short_name for _, short_name, _, _ in task_types],
+        "color": [f"#{rng.integers(0, 0xFFFFFF):06x}" for _ in task_types],
+        "priority": range(1, len(task_types) + 1),
+        "for_entity": [for_entity for _, _, _, for_entity in task_types],
+        "department_id": [department_ids[department] for _, _, department, _ in task_types],
+        "updated_at": now,
+    })
+
+    tables["task_status"] = pd.DataFrame({
+        "id": _uuids(rng, len(TASK_STATUSES)),
+        "name": [name for name, _, _, _ in TASK_STATUSES],
+        "short_name": [short_name for _, short_name, _, _ in TASK_STATUSES],
+        "color": [f"#{rng.integers(0, 0xFFFFFF):06x}" for _ in TASK_STATUSES],
+        "is_done": [is_done for _, _, is_done, _ in TASK_STATUSES],
+        "updated_at": now,
+    })
+
+    tables["person"] = pd.DataFrame({
+        "id": _uuids(rng, config.persons),
+        "first_name": [f"Artist{index + 1}" for index in range(config.persons)],
+        "last_name": [f"Synthetic{index % 7}" for index in range(config.persons)],
+        "updated_at": now,
+    })
+
+    # one task per entity and task type of its kind
+    task_type = tables["task_type"]
+    shot_tasks = shots[["id", "project_id"]].merge(
+        task_type.loc[task_type["for_entity"] == "Shot", ["id"]], how="cross", suffixes=("", "_type")
+    )
+    asset_tasks = assets[["id", "project_id"]].merge(
+        task_type.loc[task_type["for_entity"] == "Asset", ["id"]], how="cross", suffixes=("", "_type")
+    )
+    task = pd.concat([shot_tasks, asset_tasks], ignore_index=True).rename(
+        columns={"id": "entity_id", "id_type": "task_type_id"}
+    )
+    count = len(task)
+    task.insert(0, "id", _uuids(rng, count))
+    shares = np.array([share for _, _, _, share in TASK_STATUSES])
+    task["task_status_id"] = rng.choice(tables["task_status"]["id"].to_numpy(), size=count, p=shares / shares.sum())
+    task["estimation"] = rng.integers(1, 20, size=count).astype(float)
+    task["duration"] = np.where(rng.random(count) < 0.6, rng.integers(0, 25, size=count), np.nan)
+    task["retake_count"] = rng.poisson(0.4, size=count)
+    task["start_date"] = _dates(rng, now - pd.Timedelta(days=300), count, 400)
+    task["due_date"] = task["start_date"] + pd.to_timedelta(rng.integers(2, 40, size=count), unit="D")
+    started = rng.random(count) < 0.7
+    task["real_start_date"] = task["start_date"].where(started)
+    done = task["task_status_id"].isin(tables["task_status"].loc[tables["task_status"]["is_done"], "id"])
+    task["end_date"] = task["due_date"].where(done & started)
+    task["last_comment_date"] = task["start_date"] + pd.Timedelta(days=1)
+    task["updated_at"] = now
+    tables["task"] = task[[
+        "id", "project_id", "task_type_id", "task_status_id", "entity_id", "estimation",
+        "duration", "retake_count", "start_date", "due_date", "real_start_date", "end_date",
+        "last_comment_date", "updated_at",
+    ]]
+
+    # one or two artists per task
+    person_ids = tables["person"]["id"].to_numpy()
+    second = rng.random(count) < 0.3
+    tables["assignations"] = pd.DataFrame({
+        "task": np.concatenate([task["id"].to_numpy(), task["id"].to_numpy()[second]]),
+        "person": np.concatenate([
+            rng.choice(person_ids, size=count), rng.choice(person_ids, size=int(second.sum()))
+        ]),
+    })
+
+    comments_per_task = rng.poisson(config.comments_per_task, size=count)
+    comment_count = int(comments_per_task.sum())
+    commented = np.repeat(task["id"].to_numpy(), comments_per_task)
+    tables["comment"] = pd.DataFrame({
+        "id": _uuids(rng, comment_count),
+        "object_id": commented,
+        "text": [f"Artist: note {index}" for index in range(comment_count)],
+        "data": json.dumps({}),
+        "checklist": json.dumps([]),
+        "created_at": _dates(rng, now - pd.Timedelta(days=300), comment_count, 300),
+    })
+    tables["comment"]["updated_at"] = tables["comment"]["created_at"]
+
+    previewed = tables["comment"]["id"].to_numpy()[rng.random(comment_count) < 0.25]
+    preview_ids = _uuids(rng, len(previewed))
+    tables["preview_file"] = pd.DataFrame({"id": preview_ids})
+    tables["comment_preview_link"] = pd.DataFrame({"comment": previewed, "preview_file": preview_ids})
+
+    # files by the assigned artists, several versions each
+    assigned = tables["assignations"]
+    versions = rng.poisson(config.files_per_task, size=len(assigned))
+    file_count = int(versions.sum())
+    tables["working_file"] = pd.DataFrame({
+        "id": _uuids(rng, file_count),
+        "task_id": np.repeat(assigned["task"].to_numpy(), versions),
+        "person_id": np.repeat(assigned["person"].to_numpy(), versions),
+        "name": [f"work_v{index % 20 + 1:03d}" for index in range(file_count)],
+        "updated_at": _dates(rng, now - pd.Timedelta(days=300), file_count, 300),
+    })
+    published = task.merge(assigned, left_on="id", right_on="task")
+    published = published[rng.random(len(published)) < 0.5]
+    tables["output_file"] = pd.DataFrame({
+        "id": _uuids(rng, len(published)),
+        "entity_id": published["entity_id"].to_numpy(),
+        "person_id": published["person"].to_numpy(),
+        "task_type_id": published["task_type_id"].to_numpy(),
+        "name": [f"output_v{index % 10 + 1:03d}" for index in range(len(published))],
+        "updated_at": _dates(rng, now - pd.Timedelta(days=300), len(published), 300),
+    })
+
+    return tables
+
+
+def load_postgres(tables, connection):
+    """
+    Replace everything in the database of connection with the tables,
+    COPYing the frames in. The app's migrations need applying afterwards.
+    """
+    with connection.cursor() as cursor:
+        cursor.execute("drop schema public cascade")
+        cursor.execute("create schema public")
+        cursor.execute(SCHEMA)
+
+        for name in TABLES:
+            df = tables[name]
+            buffer = io.StringIO()
+            df.to_csv(buffer, index=False, header=False, na_rep="\\N", date_format="%Y-%m-%d %H:%M:%S")
+            buffer.seek(0)
+            columns = ", ".join(df.columns)
+            cursor.copy_expert(
+                f"COPY {name} ({columns}) FROM STDIN WITH (FORMAT csv, NULL '\\N')", buffer
+            )
+
+        cursor.execute("analyze")
+    connection.commit()
+
+
+def task_facts_from_tables(tables):
+    """
+    The TaskFacts the app would load from a database holding tables,
+    built with pandas in place of the queries in app/queries.py
+    """
+    from task_facts import TaskFacts
+
+    status = tables["project_status"].rename(columns={"id": "project_status_id", "name": "project_status"})
+    projects = tables["project"].merge(status[["project_status_id", "project_status"]], on="project_status_id")
+    projects = projects[projects["project_status"] == "Open"]
+    open_projects = set(projects["id"])
+
+    entity = tables["entity"]
+    parent = entity[["id", "name", "parent_id"]].rename(
+        columns={"id": "parent_id", "name": "parent_name", "parent_id": "gran_id"}
+    )
+    gran = entity[["id", "name"]].rename(columns={"id": "gran_id", "name": "gran_name"})
+
+    task = tables["task"]
+    task = task[task["project_id"].isin(open_projects)]
+    tasks = (
+        task.rename(columns={
+            "id": "task_id",
+            "estimation": "task_estimation",
+            "duration": "task_duration",
+            "start_date": "task_start_date",
+            "due_date": "task_due_date",
+            "real_start_date": "task_real_start_date",
+            "end_date": "task_end_date",
+        })
+        .merge(
+            entity[["id", "name", "entity_type_id", "canceled", "nb_frames", "parent_id"]].rename(
+                columns={"id": "entity_id", "name": "entity_name"}
+            ),
+            on="entity_id",
+        )
+        .merge(parent, on="parent_id", how="left")
+        .merge(gran, on="gran_id", how="left")
+    )
+    # a parent without a parent of its own leaves gran null, as the sql left join does
+    tasks = tasks[[
+        "task_id", "project_id", "task_type_id", "task_status_id", "entity_id", "entity_name",
+        "entity_type_id", "canceled", "nb_frames", "parent_id", "parent_name", "gran_id",
+        "gran_name", "task_estimation", "task_duration", "retake_count", "task_start_date",
+        "task_due_date", "task_real_start_date", "task_end_date",
+    ]]
+
+    assignments = tables["assignations"].rename(columns={"task": "task_id", "person": "person_id"})
+    assignments = assignments[assignments["task_id"].isin(set(tasks["task_id"]))]
+
+    working_files = (
+        tables["working_file"]
+        .sort_values("updated_at", ascending=False)
+        .drop_duplicates(["task_id", "person_id"])
+        .rename(columns={"name": "working_file_name", "updated_at": "working_file_published_at"})
+    )
+    working_files = working_files[working_files["task_id"].isin(set(tasks["task_id"]))]
+    output_files = (
+        tables["output_file"]
+        .sort_values("updated_at", ascending=False)
+        .drop_duplicates(["entity_id", "person_id", "task_type_id"])
+        .rename(columns={"name": "output_file_name", "updated_at": "output_file_published_at"})
+    )
+
+    task_type = tables["task_type"].merge(
+        tables["department"][["id", "name"]].rename(columns={"id": "department_id", "name": "department"}),
+        on="department_id",
+        how="left",
+    )
+    person = tables["person"]
+    dimensions = {
+        "projects": projects.rename(columns={"id": "project_id", "name": "project", "code": "project_code"})[
+            ["project_id", "project", "project_code", "project_status", "start_date", "end_date"]
+        ],
+        "task_types": task_type.rename(columns={
+            "id": "task_type_id", "name": "task_type", "short_name": "task_type_code", "color": "task_type_color",
+        })[[
+            "task_type_id", "task_type", "task_type_code", "task_type_color", "priority",
+            "for_entity", "department_id", "department",
+        ]],
+        "task_statuses": tables["task_status"].rename(columns={
+            "id": "task_status_id", "name": "task_status", "short_name": "task_status_code",
+            "color": "task_status_color",
+        })[["task_status_id", "task_status", "task_status_code", "task_status_color", "is_done"]],
+        "entity_types": tables["entity_type"].rename(columns={"id": "entity_type_id", "name": "entity_type"})[
+            ["entity_type_id", "entity_type"]
+        ],
+        "persons": pd.DataFrame({
+            "person_id": person["id"],
+            "artist": (person["first_name"].fillna("") + " " + person["last_name"].fillna("")).str.strip(),
+        }),
+    }
+
+    return TaskFacts(
+        tasks.reset_index(drop=True),
+        assignments.reset_index(drop=True),
+        working_files[["task_id", "person_id", "working_file_name", "working_file_published_at"]].reset_index(drop=True),
+        output_files[[
+            "entity_id", "person_id", "task_type_id", "output_file_name", "output_file_published_at",
+        ]].reset_index(drop=True),
+        dimensions,
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Load a synthetic Kitsu database")
+    parser.add_argument("--tasks", type=int, default=100000, help="approximate number of tasks")
+    parser.add_argument("--database", default="swingdata_synthetic")
+    parser.add_argument("--create", action="store_true", help="create the database first")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    import psycopg2
+    from database import get_connect_kwargs
+    from migrate import apply_migrations
+
+    connect_kwargs = get_connect_kwargs()
+    if args.database == connect_kwargs["database"]:
+        parser.error(f"refusing to overwrite the configured database: {args.database}")
+
+    if args.create:
+        connection = psycopg2.connect(**{**connect_kwargs, "database": "postgres"})
+        connection.set_session(autocommit=True)
+        with connection.cursor() as cursor:
+            cursor.execute(f'create database "{args.database}"')
+        connection.close()
+
+    config = SyntheticConfig.for_tasks(args.tasks)
+    print(f"generating {config.tasks} tasks: {config}")
+    tables = generate(config, seed=args.seed)
+
+    connection = psycopg2.connect(**{**connect_kwargs, "database": args.database})
+    load_postgres(tables, connection)
+    apply_migrations(connection)
+    connection.close()
+
+    for name in TABLES:
+        print(f"{name:<24}{len(tables[name]):>12}")
+
+
+if __name__ == "__main__":
+    main()
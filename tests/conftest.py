@@ -0,0 +1,11 @@
+# -*- coding: utf-8 -*-
+
+# The app runs as python app/app.py with app/ on sys.path, so its modules
+# import each other top level (import settings, from pages.calcs import ...).
+# The tests import them the same way.
+import os
+import sys
+
+APP_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "app"))
+if APP_DIR not in sys.path:
+    sys.path.insert(0, APP_DIR)
@@ -0,0 +1,97 @@
+# -*- coding: utf-8 -*-
+
+# The vectorised status classification and date formatting in pages/calcs.py
+# against the row-wise functions they replaced, on generated task frames
+# mixing every branch with missing values.
+import numpy as np
+import pandas as pd
+import pytest
+
+from pages.calcs import (
+    TASK_DATE_COLUMNS,
+    classify_status,
+    format_dates,
+    get_status_color,
+    get_status_description,
+    parse_task_dates,
+    str_parse_date,
+)
+
+ROWS = 2000
+STATUSES = ["Todo", "WIP", "Done", "Retake", None, ""]
+
+
+def generate_dates(rng, rows, missing):
+    """
+    ISO date strings around today, with missing values drawn from missing
+    """
+    days = rng.integers(-60, 60, size=rows)
+    dates = (pd.Timestamp("2024-06-01") + pd.to_timedelta(days, unit="D")).strftime("%Y-%m-%dT%H:%M:%S")
+    values = np.array(dates, dtype=object)
+    blank = rng.random(rows) < 0.2
+    values[blank] = rng.choice(np.array(missing, dtype=object), size=blank.sum())
+    return values
+
+
+def generate_tasks(seed, missing):
+    rng = np.random.default_rng(seed)
+    df = pd.DataFrame({column: generate_dates(rng, ROWS, missing) for column in TASK_DATE_COLUMNS})
+    df.insert(0, "task_status", rng.choice(np.array(STATUSES, dtype=object), size=ROWS))
+    return df
+
+
+def row_wise_status(df):
+    description = df.apply(get_status_description, axis=1)
+    color = df.assign(status_description=description).apply(get_status_color, axis=1)
+    return description, color
+
+
+def assert_same_status(df):
+    description, color = classify_status(df)
+    expected_description, expected_color = row_wise_status(df)
+
+    assert description.astype(object).tolist() == expected_description.tolist()
+    assert color.astype(object).tolist() == expected_color.tolist()
+
+
+@pytest.mark.parametrize("seed", [0, 1, 2])
+def test_classify_status_parsed_dates(seed):
+    # as load_default_calcs runs it: None, "" and NaT all parse to NaT
+    df = parse_task_dates(generate_tasks(seed, [None, "", pd.NaT]))
+    assert df.task_real_start_date.isna().any()
+
+    assert_same_status(df)
+
+
+@pytest.mark.parametrize("seed", [0, 1, 2])
+def test_classify_status_unparsed_dates(seed):
+    # string dates compare as strings, an empty start date is falsy
+    df = generate_tasks(seed, [""])
+    assert (df.task_real_start_date == "").any()
+
+    assert_same_status(df)
+
+
+def test_classify_status_covers_every_branch():
+    # a parsed start date is never falsy, only the unparsed frames reach
+    # "Started | No Start Date"
+    parsed, _ = classify_status(parse_task_dates(generate_tasks(0, [None, "", pd.NaT])))
+    unparsed, _ = classify_status(generate_tasks(0, [""]))
+    assert set(parsed) | set(unparsed) == set(parsed.cat.categories)
+
+
+@pytest.mark.parametrize("column", TASK_DATE_COLUMNS)
+def test_format_dates(column):
+    df = parse_task_dates(generate_tasks(0, [None, "", pd.NaT]))
+    assert df[column].isna().any()
+
+    expected = df[column].apply(str_parse_date)
+    formatted = format_dates(df[column])
+
+    assert formatted.tolist() == expected.tolist()
+    assert formatted.index.equals(df.index)
+
+
+def test_format_dates_empty():
+    assert format_dates(pd.Series([], dtype="datetime64[ns]")).tolist() == []
+    assert format_dates(pd.Series([pd.NaT, None], dtype="datetime64[ns]")).tolist() == ["", ""]
@@ -0,0 +1,39 @@
+# -*- coding: utf-8 -*-
+
+# Projections serve their current frame while a newer one is being built.
+import threading
+
+import pandas as pd
+
+from datasets import Dataset, Projection
+
+
+def test_projection_select_does_not_wait_for_a_rebuild():
+    source = Dataset("test_source", None)
+    source.publish(pd.DataFrame({"project": ["A", "B"]}))
+
+    building = threading.Event()
+    release = threading.Event()
+
+    def builder(df):
+        if len(df) > 2:
+            building.set()
+            release.wait(10)
+        return df.copy()
+
+    projection = Projection("test_projection", source, builder)
+    assert len(projection.select(project=["A"])) == 1
+
+    # the source publishing rebuilds the projection on the publishing thread
+    publisher = threading.Thread(target=source.publish, args=(pd.DataFrame({"project": ["A", "B", "A"]}),))
+    publisher.start()
+    assert building.wait(10)
+
+    try:
+        assert len(projection.select(project=["A"])) == 1
+    finally:
+        release.set()
+        publisher.join(10)
+
+    assert len(projection.select(project=["A"])) == 2
+    assert projection.version == 2